@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Движок достижений для MSK SK8COOL
+"""
+
+from bisect import bisect_right
+from collections import deque
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Set
+
+import progress_snapshot
+
+# Метрики, от которых зависят правила достижений
+COUNT = "count"      # всего тренировок
+WEEKLY = "weekly"    # последние N тренировок попадают в последние 7 дней
+STREAK = "streak"    # лучшая серия недель подряд с тренировками
+
+
+def _week(ordinal: int) -> int:
+    """Номер недели (с понедельника) по порядковому номеру дня"""
+    return (ordinal - 1) // 7
+
+
+def _date_ordinal(value) -> Optional[int]:
+    try:
+        return date.fromisoformat(value).toordinal()
+    except (TypeError, ValueError):
+        return None
+
+
+class UserStats:
+    """Накопленное состояние пользователя для проверки достижений"""
+
+    __slots__ = ("count", "recent_dates", "weeks", "best_streak")
+
+    def __init__(self, window: int):
+        self.count = 0
+        self.recent_dates = deque(maxlen=window)
+        self.weeks: Set[int] = set()
+        self.best_streak = 0
+
+
+class AchievementEngine:
+    """
+    Проверка достижений по накопленному состоянию пользователя.
+
+    Правило достижения - пара (метрика, порог). При новой тренировке
+    состояние обновляется за O(1) (серия недель - за длину серии),
+    и проверяются только правила тех метрик, которые изменились.
+    """
+
+    def __init__(self, achievements: Dict[str, Dict]):
+        self.achievements = achievements
+
+        # Для каждой метрики - пороги по возрастанию и ID достижений
+        self._rules: Dict[str, List[tuple]] = {}
+        for achievement_id, achievement in achievements.items():
+            metric, threshold = achievement["rule"]
+            self._rules.setdefault(metric, []).append((threshold, achievement_id))
+        for rules in self._rules.values():
+            rules.sort()
+
+        weekly = self._rules.get(WEEKLY, [])
+        self.window = max((threshold for threshold, _ in weekly), default=1)
+
+    def new_stats(self, sessions: Iterable[Dict] = ()) -> UserStats:
+        """Строит состояние по уже имеющимся тренировкам"""
+        stats = UserStats(self.window)
+        for session in sessions:
+            self.observe(stats, session["date"])
+        return stats
+
+    def observe(self, stats: UserStats, session_date: str) -> Set[str]:
+        """Учитывает новую тренировку, возвращает изменившиеся метрики"""
+        stats.count += 1
+        changed = {COUNT}
+
+        ordinal = _date_ordinal(session_date)
+        if ordinal is None:
+            return changed
+
+        stats.recent_dates.append(ordinal)
+        changed.add(WEEKLY)
+
+        week = _week(ordinal)
+        if week not in stats.weeks:
+            stats.weeks.add(week)
+            # Серия, в которую попала новая неделя
+            start = week
+            while start - 1 in stats.weeks:
+                start -= 1
+            end = week
+            while end + 1 in stats.weeks:
+                end += 1
+            if end - start + 1 > stats.best_streak:
+                stats.best_streak = end - start + 1
+                changed.add(STREAK)
+
+        return changed
+
+    def _metric(self, metric: str, stats: UserStats, required: int, today: date) -> bool:
+        if metric == COUNT:
+            return stats.count >= required
+        if metric == STREAK:
+            return stats.best_streak >= required
+        if metric == WEEKLY:
+            week_ago = (today - timedelta(days=7)).toordinal()
+            recent = list(stats.recent_dates)[-required:]
+            return len(recent) >= required and all(ordinal > week_ago for ordinal in recent)
+        return False
+
+    def evaluate(self, stats: UserStats, earned: Iterable[str],
+                 changed: Iterable[str], today: Optional[date] = None) -> List[str]:
+        """Возвращает ID новых достижений по изменившимся метрикам"""
+        today = today or date.today()
+        earned = set(earned)
+        new_achievements = []
+
+        for metric in changed:
+            rules = self._rules.get(metric, [])
+            if metric == COUNT:
+                # Пороги отсортированы: выполнены все до текущего количества
+                rules = rules[:bisect_right(rules, (stats.count, chr(0x10ffff)))]
+            for threshold, achievement_id in rules:
+                if achievement_id not in earned and self._metric(metric, stats, threshold, today):
+                    new_achievements.append(achievement_id)
+                    earned.add(achievement_id)
+
+        # Порядок как в описании достижений
+        order = list(self.achievements)
+        return sorted(new_achievements, key=order.index)
+
+    def evaluate_all(self, progress_data: Dict[str, Dict],
+                     today: Optional[date] = None) -> Dict[str, List[str]]:
+        """
+        Пакетный пересчет: какие достижения выполнены у каждого пользователя.
+
+        Даты всех тренировок собираются в колонку порядковых номеров
+        (для упакованного снапшота они берутся из него без разбора строк),
+        после чего метрики считаются по срезам колонки.
+        """
+        today = today or date.today()
+        week_ago = (today - timedelta(days=7)).toordinal()
+        parsed: Dict[str, Optional[int]] = {}
+        result = {}
+
+        for user_id, user_data in progress_data.items():
+            sessions = user_data["sessions"]
+            if isinstance(sessions, progress_snapshot.PackedSessions) and sessions.packed:
+                ordinals = [code for code in sessions.date_codes() if code >= 0]
+            else:
+                ordinals = []
+                for session in sessions:
+                    value = session["date"]
+                    if value not in parsed:
+                        parsed[value] = _date_ordinal(value)
+                    if parsed[value] is not None:
+                        ordinals.append(parsed[value])
+
+            best_streak = streak = 0
+            previous = None
+            for week in sorted({_week(ordinal) for ordinal in ordinals}):
+                streak = streak + 1 if previous is not None and week == previous + 1 else 1
+                best_streak = max(best_streak, streak)
+                previous = week
+
+            metrics = {COUNT: len(sessions), STREAK: best_streak}
+            satisfied = []
+            for achievement_id, achievement in self.achievements.items():
+                metric, threshold = achievement["rule"]
+                if metric == WEEKLY:
+                    recent = ordinals[-threshold:]
+                    if len(recent) >= threshold and all(ordinal > week_ago for ordinal in recent):
+                        satisfied.append(achievement_id)
+                elif metrics.get(metric, 0) >= threshold:
+                    satisfied.append(achievement_id)
+            result[user_id] = satisfied
+
+        return result
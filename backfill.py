@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Пересчет уровней и достижений для MSK SK8COOL
+
+После изменения порогов в LEVELS или правил в ACHIEVEMENTS сохраненные
+level и achievements пользователей устаревают до их следующей тренировки.
+Этот скрипт пересчитывает их для всех пользователей сразу.
+
+progress.json читается потоково (по одному пользователю), пачки
+пользователей обрабатываются в пуле процессов, результат пишется
+во временный файл и заменяет исходный через os.replace. Запускать
+при остановленном боте: иначе бот перезапишет файл своими данными.
+
+Без --revoke достижения только добавляются (и удаляются те, которых
+больше нет в ACHIEVEMENTS). С --revoke снимаются и достижения, условия
+которых больше не выполняются, кроме правил за последнюю неделю:
+они зависят от текущей даты.
+
+Использование:
+    python backfill.py progress.json [--revoke] [--dry-run] [--workers N]
+"""
+
+import argparse
+import json
+import os
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Tuple
+
+from achievements import WEEKLY, AchievementEngine
+from progress import ACHIEVEMENTS, level_for
+
+BATCH_SIZE = 500
+_CHUNK_SIZE = 1 << 16
+
+
+def iter_users(path: str) -> Iterator[Tuple[str, Dict]]:
+    """Читает пары (user_id, данные) из progress.json, не загружая файл целиком"""
+    decoder = json.JSONDecoder()
+
+    with open(path, "r", encoding="utf-8") as f:
+        buffer = ""
+        pos = 0
+        eof = False
+
+        def skip(chars: str) -> str:
+            """Пропускает пробелы и один из ожидаемых символов"""
+            nonlocal buffer, pos, eof
+            while True:
+                while pos < len(buffer) and buffer[pos].isspace():
+                    pos += 1
+                if pos < len(buffer):
+                    char = buffer[pos]
+                    if char not in chars:
+                        raise ValueError(f"{path}: ожидался один из {chars!r}, найдено {char!r}")
+                    pos += 1
+                    return char
+                if eof:
+                    raise ValueError(f"{path}: неожиданный конец файла")
+                chunk = f.read(_CHUNK_SIZE)
+                eof = not chunk
+                buffer = buffer[pos:] + chunk
+                pos = 0
+
+        def value():
+            """Читает следующее JSON-значение, дочитывая файл при необходимости"""
+            nonlocal buffer, pos, eof
+            while True:
+                while pos < len(buffer) and buffer[pos].isspace():
+                    pos += 1
+                try:
+                    result, pos = decoder.raw_decode(buffer, pos)
+                    return result
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    chunk = f.read(_CHUNK_SIZE)
+                    eof = not chunk
+                    buffer = buffer[pos:] + chunk
+                    pos = 0
+
+        skip("{")
+        # Пустой объект
+        while pos < len(buffer) and buffer[pos].isspace():
+            pos += 1
+        if buffer[pos:pos + 1] == "}":
+            return
+
+        while True:
+            user_id = value()
+            skip(":")
+            yield user_id, value()
+            if skip(",}") == "}":
+                return
+
+
+def recompute_user(user_data: Dict, satisfied: List[str], revoke: bool) -> Dict:
+    """Возвращает данные пользователя с пересчитанными уровнем и достижениями"""
+    achievements = []
+    for achievement_id in user_data["achievements"]:
+        achievement = ACHIEVEMENTS.get(achievement_id)
+        if achievement is None:
+            continue
+        if revoke and achievement["rule"][0] != WEEKLY and achievement_id not in satisfied:
+            continue
+        achievements.append(achievement_id)
+    achievements.extend(a for a in satisfied if a not in achievements)
+
+    total_sessions = len(user_data["sessions"])
+    level = level_for(total_sessions) or user_data["level"]
+    return dict(user_data, total_sessions=total_sessions, level=level, achievements=achievements)
+
+
+def _process_batch(batch: List[Tuple[str, Dict]], revoke: bool,
+                   serialize: bool) -> List[Tuple[str, str, Dict]]:
+    """
+    Пересчитывает пачку пользователей (выполняется в процессе пула).
+
+    JSON с отступами строится чистым Python и стоит дороже пересчета,
+    поэтому пользователь сериализуется здесь же, а не в основном процессе.
+    """
+    satisfied = AchievementEngine(ACHIEVEMENTS).evaluate_all(dict(batch))
+
+    results = []
+    for user_id, user_data in batch:
+        updated = recompute_user(user_data, satisfied[user_id], revoke)
+        old_achievements = set(user_data["achievements"])
+        new_achievements = set(updated["achievements"])
+        diff = {
+            "level": (user_data["level"], updated["level"]) if user_data["level"] != updated["level"] else None,
+            "added": sorted(new_achievements - old_achievements),
+            "removed": sorted(old_achievements - new_achievements)
+        }
+
+        text = None
+        if serialize:
+            # Тот же формат, что и json.dump(..., indent=2) всего файла
+            body = json.dumps(updated, ensure_ascii=False, indent=2, default=list)
+            text = f"{json.dumps(user_id, ensure_ascii=False)}: {body.replace(chr(10), chr(10) + '  ')}"
+        results.append((user_id, text, diff))
+    return results
+
+
+def _batches(users: Iterator[Tuple[str, Dict]], size: int) -> Iterator[List[Tuple[str, Dict]]]:
+    batch = []
+    for user in users:
+        batch.append(user)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _results(path: str, revoke: bool, serialize: bool,
+             workers: int) -> Iterator[Tuple[str, str, Dict]]:
+    """Результаты по пользователям в исходном порядке"""
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Ограничиваем число пачек в работе, чтобы не держать в памяти весь файл
+        in_flight = deque()
+        for batch in _batches(iter_users(path), BATCH_SIZE):
+            in_flight.append(pool.submit(_process_batch, batch, revoke, serialize))
+            if len(in_flight) >= workers * 2:
+                yield from in_flight.popleft().result()
+        while in_flight:
+            yield from in_flight.popleft().result()
+
+
+def backfill(path: str, revoke: bool = False, dry_run: bool = False,
+             workers: int = None) -> Dict:
+    """Пересчитывает уровни и достижения в файле, возвращает отчет"""
+    started = time.perf_counter()
+    report = {
+        "users": 0,
+        "changed_users": 0,
+        "level_changes": Counter(),
+        "added": Counter(),
+        "removed": Counter()
+    }
+
+    tmp_path = f"{path}.tmp"
+    out = None if dry_run else open(tmp_path, "w", encoding="utf-8")
+    try:
+        if out is not None:
+            out.write("{")
+        workers = workers or os.cpu_count()
+        for user_id, text, diff in _results(path, revoke, not dry_run, workers):
+            if out is not None:
+                out.write(f"{',' if report['users'] else ''}\n  {text}")
+
+            report["users"] += 1
+            if diff["level"] or diff["added"] or diff["removed"]:
+                report["changed_users"] += 1
+            if diff["level"]:
+                report["level_changes"][diff["level"]] += 1
+            report["added"].update(diff["added"])
+            report["removed"].update(diff["removed"])
+
+        if out is not None:
+            out.write("\n}" if report["users"] else "}")
+            out.flush()
+            os.fsync(out.fileno())
+            out.close()
+            out = None
+            os.replace(tmp_path, path)
+    finally:
+        if out is not None:
+            out.close()
+            os.remove(tmp_path)
+
+    report["seconds"] = time.perf_counter() - started
+    return report
+
+
+def print_report(report: Dict):
+    """Печатает пропускную способность и сводку изменений"""
+    seconds = report["seconds"]
+    rate = report["users"] / seconds if seconds else 0.0
+    print(f"Пользователей: {report['users']} за {seconds:.2f} с ({rate:.0f} польз./с)")
+    print(f"Изменено: {report['changed_users']}")
+    for (old_level, new_level), count in report["level_changes"].most_common():
+        print(f"  уровень {old_level} -> {new_level}: {count}")
+    for achievement_id, count in report["added"].most_common():
+        print(f"  + {achievement_id}: {count}")
+    for achievement_id, count in report["removed"].most_common():
+        print(f"  - {achievement_id}: {count}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Пересчет уровней и достижений")
+    parser.add_argument("path", help="файл прогресса (JSON)")
+    parser.add_argument("--revoke", action="store_true", help="снимать невыполненные достижения")
+    parser.add_argument("--dry-run", action="store_true", help="только отчет, без записи")
+    parser.add_argument("--workers", type=int, default=None, help="число процессов")
+    args = parser.parse_args()
+
+    print_report(backfill(args.path, revoke=args.revoke, dry_run=args.dry_run, workers=args.workers))
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Массовые рассылки для MSK SK8COOL
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+from telegram.error import BadRequest, Forbidden
+
+from config import PARKS
+from send_queue import BULK, SendQueue
+from storage import JsonLogStorage
+
+logger = logging.getLogger(__name__)
+
+DELIVERED = "delivered"
+FAILED = "failed"
+BLOCKED = "blocked"
+
+# Служебная запись журнала с параметрами рассылки
+META_KEY = "__meta__"
+
+
+class BroadcastEngine:
+    """
+    Рассылка сообщения ученикам из базы прогресса и базы записей.
+
+    Получатели перебираются потоком и отправляются через общую очередь
+    сообщений с приоритетом BULK, поэтому лимиты Telegram соблюдаются,
+    а уведомления админу идут вперед рассылки. Одновременно в очереди
+    не больше window сообщений.
+
+    Каждый результат дописывается в журнал рассылки (JsonLogStorage
+    в каталоге directory). Журнал служит и контрольной точкой: при
+    повторном запуске той же рассылки (после сбоя или вручную) получатели,
+    которым сообщение уже доставлено или которые заблокировали бота,
+    пропускаются. Незавершенные рассылки продолжаются при запуске бота.
+    """
+
+    def __init__(self, send_queue: SendQueue, progress_system, booking_db,
+                 directory: str = "broadcasts", window: int = 100):
+        self.send_queue = send_queue
+        self.progress_system = progress_system
+        self.booking_db = booking_db
+        self.directory = directory
+        self.window = window
+        self._running: Dict[str, asyncio.Task] = {}
+
+    @staticmethod
+    def broadcast_id(text: str, park_id: Optional[str] = None, date: Optional[str] = None) -> str:
+        """ID рассылки: одинаковые текст и фильтры дают одну и ту же рассылку"""
+        key = json.dumps([text, park_id, date], ensure_ascii=False)
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()[:12]
+
+    def iter_recipients(self, park_id: Optional[str] = None,
+                        date: Optional[str] = None) -> Iterator[int]:
+        """
+        Перебирает ID учеников без повторов: сначала из прогресса, затем
+        из записей. С фильтрами - только тех, у кого была тренировка или
+        запись в указанном парке и/или в указанную дату.
+        """
+        park_name = PARKS[park_id]['name'] if park_id else None
+        seen = set()
+
+        def matches(record: Dict) -> bool:
+            return ((park_name is None or record.get('park') == park_name
+                     or record.get('park_name') == park_name)
+                    and (date is None or record.get('date') == date))
+
+        for user_id_str in list(self.progress_system.progress_data):
+            user_data = self.progress_system.progress_data.get(user_id_str)
+            if user_data is None:
+                continue
+            if park_name is None and date is None or any(matches(s) for s in user_data["sessions"]):
+                user_id = int(user_id_str)
+                if user_id not in seen:
+                    seen.add(user_id)
+                    yield user_id
+
+        for booking in self.booking_db.iter_bookings(date):
+            if booking.get('status') == 'rejected' or not matches(booking):
+                continue
+            user_id = int(booking['user_id'])
+            if user_id not in seen:
+                seen.add(user_id)
+                yield user_id
+
+    def start(self, text: str, park_id: Optional[str] = None,
+              date: Optional[str] = None) -> asyncio.Task:
+        """Запускает рассылку в фоне (повторный запуск той же рассылки возвращает ее задачу)"""
+        broadcast_id = self.broadcast_id(text, park_id, date)
+        task = self._running.get(broadcast_id)
+        if task is None or task.done():
+            task = asyncio.get_running_loop().create_task(self.run(text, park_id, date))
+            self._running[broadcast_id] = task
+        return task
+
+    async def run(self, text: str, park_id: Optional[str] = None,
+                  date: Optional[str] = None) -> Dict:
+        """Выполняет рассылку и возвращает отчет"""
+        broadcast_id = self.broadcast_id(text, park_id, date)
+        os.makedirs(self.directory, exist_ok=True)
+        storage = JsonLogStorage(os.path.join(self.directory, f"{broadcast_id}.json"))
+        # Чтение журнала и его закрытие (ожидание потока записи) идут вне event loop
+        log = await asyncio.to_thread(storage.load)
+
+        meta = log.get(META_KEY) or {
+            "text": text, "park_id": park_id, "date": date,
+            "started_at": datetime.now().isoformat(), "finished": False
+        }
+        log[META_KEY] = meta
+        storage.put(META_KEY, meta)
+
+        report = {"id": broadcast_id, "recipients": 0, DELIVERED: 0, FAILED: 0, BLOCKED: 0, "skipped": 0}
+        in_flight: Dict[asyncio.Future, int] = {}
+
+        def record(future: asyncio.Future, chat_id: int):
+            error = future.exception()
+            if error is None:
+                status = DELIVERED
+            elif isinstance(error, Forbidden) or (
+                    isinstance(error, BadRequest) and "chat not found" in str(error).lower()):
+                status = BLOCKED
+            else:
+                status = FAILED
+                logger.warning(f"Рассылка {broadcast_id}: ошибка отправки {chat_id}: {error}")
+            report[status] += 1
+            log[str(chat_id)] = {"status": status, "at": datetime.now().isoformat()}
+            storage.put(str(chat_id), log[str(chat_id)])
+            if storage.needs_compaction():
+                storage.compact(log)
+
+        async def wait_some(return_when):
+            done, _ = await asyncio.wait(in_flight, return_when=return_when)
+            for future in done:
+                record(future, in_flight.pop(future))
+
+        try:
+            for chat_id in self.iter_recipients(park_id, date):
+                report["recipients"] += 1
+                previous = log.get(str(chat_id))
+                if previous is not None and previous["status"] in (DELIVERED, BLOCKED):
+                    report["skipped"] += 1
+                    continue
+
+                # Текст админа уходит как есть: разметка в свободном тексте
+                # (например, одиночное "_") сломала бы отправку всем получателям
+                future = self.send_queue.submit(chat_id, text, BULK)
+                in_flight[future] = chat_id
+                if len(in_flight) >= self.window:
+                    await wait_some(asyncio.FIRST_COMPLETED)
+
+            if in_flight:
+                await wait_some(asyncio.ALL_COMPLETED)
+
+            meta = dict(meta, finished=True, finished_at=datetime.now().isoformat(), report=report)
+            storage.put(META_KEY, meta)
+            logger.info(f"Рассылка {broadcast_id} завершена: {report}")
+            return report
+        except asyncio.CancelledError:
+            # При остановке неотправленные сообщения снимаются с очереди,
+            # а уже отправляемые дожидаемся, чтобы каждая доставка попала в журнал.
+            # Завершенные, но еще не записанные доставки записываются сразу
+            for future in list(in_flight):
+                if future.done() and not future.cancelled():
+                    record(future, in_flight.pop(future))
+                elif not self.send_queue.is_sending(future):
+                    future.cancel()
+                    in_flight.pop(future)
+            if in_flight:
+                await wait_some(asyncio.ALL_COMPLETED)
+            raise
+        finally:
+            await asyncio.to_thread(storage.close)
+
+    async def stop(self):
+        """Прерывает идущие рассылки; они продолжатся при следующем запуске"""
+        tasks = [task for task in self._running.values() if not task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._running.clear()
+
+    def unfinished(self) -> List[Dict]:
+        """Параметры рассылок, прерванных до завершения"""
+        if not os.path.isdir(self.directory):
+            return []
+
+        result = []
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(".json.log"):
+                continue
+            storage = JsonLogStorage(os.path.join(self.directory, name[:-len(".log")]))
+            meta = storage.load().get(META_KEY)
+            storage.close()
+            if meta is not None and not meta.get("finished"):
+                result.append(meta)
+        return result
+
+    async def resume_unfinished(self) -> List[asyncio.Task]:
+        """Продолжает прерванные рассылки (вызывается при запуске бота)"""
+        tasks = []
+        # Журналы рассылок читаются в отдельном потоке, не блокируя event loop
+        for meta in await asyncio.to_thread(self.unfinished):
+            logger.info(f"Продолжение рассылки {self.broadcast_id(meta['text'], meta['park_id'], meta['date'])}")
+            tasks.append(self.start(meta["text"], meta["park_id"], meta["date"]))
+        return tasks
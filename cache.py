@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Кэш готовых сообщений для MSK SK8COOL
+"""
+
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional
+
+
+class RenderCache:
+    """
+    LRU-кэш с ограничением времени жизни и счетчиками попаданий.
+
+    Ключ должен включать все, от чего зависит результат (например, ID
+    пользователя и версию данных), тогда инвалидация сводится к смене версии.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get_or_render(self, key: Hashable, render: Callable[[], str]) -> str:
+        """Возвращает значение из кэша или строит его через render()"""
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is not None and (self.ttl is None or now - entry[0] < self.ttl):
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        value = render()
+        self._entries[key] = (now, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        """Очищает кэш"""
+        self._entries.clear()
+
+    def stats(self) -> Dict:
+        """Счетчики попаданий и промахов"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._entries),
+            "hit_rate": self.hits / total if total else 0.0
+        }
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Маршрутизация нажатий inline-кнопок для MSK SK8COOL
+
+Формат callback_data: "<действие>" или "<действие>:<поле>:<поле>...".
+Действие выбирает обработчик по словарю, поля разбираются один раз
+в типизированную структуру (NamedTuple) и передаются обработчику
+в context.payload. Последнее поле забирает остаток строки, поэтому
+значения вида "12:00" можно передавать последним полем.
+"""
+
+import argparse
+import re
+import time
+import typing
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple, Type
+
+from telegram import CallbackQuery, Update, User
+from telegram.ext import BaseHandler, CallbackQueryHandler
+
+SEP = ":"
+
+# Telegram ограничивает callback_data 64 байтами
+MAX_CALLBACK_DATA = 64
+
+
+class ParkChoice(NamedTuple):
+    park_id: str
+
+
+class DateChoice(NamedTuple):
+    days_ahead: int
+
+
+class PeriodChoice(NamedTuple):
+    period: str
+
+
+class TimeChoice(NamedTuple):
+    time: str
+
+
+class EquipmentChoice(NamedTuple):
+    choice: str
+
+
+class BookingRef(NamedTuple):
+    booking_id: str
+
+
+def callback_data(action: str, *fields) -> str:
+    """Кодирует действие и поля в callback_data"""
+    data = SEP.join((action, *map(str, fields)))
+    if len(data.encode("utf-8")) > MAX_CALLBACK_DATA:
+        raise ValueError(f"callback_data длиннее {MAX_CALLBACK_DATA} байт: {data!r}")
+    return data
+
+
+class Route(NamedTuple):
+    handler: Callable
+    payload_type: Optional[Type[NamedTuple]]
+    converters: Tuple[Callable[[str], Any], ...]
+
+
+class CallbackRouter(BaseHandler):
+    """
+    Один обработчик PTB для всех inline-кнопок.
+
+    Вместо цепочки CallbackQueryHandler с регулярными выражениями, которую
+    PTB перебирает по порядку для каждого нажатия, действие ищется в словаре
+    за O(1). Кнопки с неизвестным действием или неразбираемыми полями
+    (например, из старых сообщений) уходят в fallback.
+    """
+
+    def __init__(self, fallback: Callable):
+        super().__init__(fallback)
+        self._routes: Dict[str, Route] = {}
+
+    def add(self, action: str, handler: Callable, payload_type: Optional[Type[NamedTuple]] = None):
+        """Регистрирует обработчик действия; поля разбираются в payload_type"""
+        converters = ()
+        if payload_type is not None:
+            hints = typing.get_type_hints(payload_type)
+            converters = tuple(hints[field] for field in payload_type._fields)
+        self._routes[action] = Route(handler, payload_type, converters)
+
+    def decode(self, data: str) -> Optional[Tuple[Route, Optional[NamedTuple]]]:
+        """Маршрут и разобранные поля или None, если данные не подходят"""
+        action, _, rest = data.partition(SEP)
+        route = self._routes.get(action)
+        if route is None:
+            return None
+        if route.payload_type is None:
+            return (route, None) if not rest else None
+
+        fields = rest.split(SEP, len(route.converters) - 1) if rest else []
+        if len(fields) != len(route.converters):
+            return None
+        try:
+            return route, route.payload_type(*[convert(value) for convert, value in zip(route.converters, fields)])
+        except ValueError:
+            return None
+
+    def check_update(self, update: object) -> Optional[Tuple[Callable, Optional[NamedTuple]]]:
+        if not isinstance(update, Update) or update.callback_query is None:
+            return None
+        data = update.callback_query.data
+        if data is None:
+            return None
+        decoded = self.decode(data)
+        if decoded is None:
+            return self.callback, None
+        return decoded[0].handler, decoded[1]
+
+    async def handle_update(self, update: Update, application, check_result, context):
+        handler, payload = check_result
+        context.payload = payload
+        return await handler(update, context)
+
+
+# Бенчмарк: цепочка регулярных выражений из прежнего main.py против словаря
+
+_LEGACY_PATTERNS = [
+    "^training_info$", "^about_school$", "^contact_coach$", "^main_menu$", "^select_park$",
+    "^park_", "^confirm_park_", "^date_", "^period_", "^time_", "^equipment_(yes|no)$",
+    "^equipment_(protection|skateboard|both)$", "^final_confirm$", "^booking_cancel$",
+    "^admin_approve_", "^admin_reject_", "^my_progress$", "^leaderboard$", "^play_game$"
+]
+
+# Одинаковые нажатия в старом и новом форматах
+_BENCH_CLICKS = [
+    ("main_menu", "main_menu"),
+    ("park_park2", callback_data("park", "park2")),
+    ("confirm_park_park2", callback_data("confirm_park", "park2")),
+    ("date_3_days", callback_data("date", 3)),
+    ("period_evening", callback_data("period", "evening")),
+    ("time_20:00", callback_data("time", "20:00")),
+    ("equipment_both", callback_data("equipment", "both")),
+    ("final_confirm", "final_confirm"),
+    ("admin_approve_123456789_park2_2025-06-01_20:00",
+     callback_data("admin_approve", "booking_20250530_181502_123456789")),
+    ("play_game", "play_game"),
+]
+
+
+def _bench_update(data: str) -> Update:
+    user = User(id=123456789, first_name="Bench", is_bot=False)
+    return Update(update_id=1, callback_query=CallbackQuery(
+        id="1", from_user=user, chat_instance="bench", data=data))
+
+
+def bench(rounds: int = 20000):
+    """Сравнивает стоимость выбора обработчика для одного нажатия"""
+    async def noop(update, context):
+        pass
+
+    legacy = [CallbackQueryHandler(noop, pattern=pattern) for pattern in _LEGACY_PATTERNS]
+
+    router = CallbackRouter(noop)
+    for action in ("training_info", "about_school", "contact_coach", "main_menu", "select_park",
+                   "final_confirm", "booking_cancel", "my_progress", "leaderboard", "play_game"):
+        router.add(action, noop)
+    for action, payload_type in (("park", ParkChoice), ("confirm_park", ParkChoice),
+                                 ("date", DateChoice), ("period", PeriodChoice), ("time", TimeChoice),
+                                 ("equipment_check", EquipmentChoice), ("equipment", EquipmentChoice),
+                                 ("admin_approve", BookingRef), ("admin_reject", BookingRef)):
+        router.add(action, noop, payload_type)
+
+    legacy_updates = [_bench_update(old) for old, _ in _BENCH_CLICKS]
+    router_updates = [_bench_update(new) for _, new in _BENCH_CLICKS]
+
+    def legacy_dispatch(update: Update):
+        # Как Application.process_update: первый подходящий обработчик,
+        # после чего обработчик еще раз разбирает callback_data
+        for handler in legacy:
+            if handler.check_update(update):
+                parts = update.callback_query.data.split('_')
+                return handler, parts
+        return None
+
+    def run(dispatch, updates) -> float:
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for update in updates:
+                dispatch(update)
+        return (time.perf_counter() - start) / (rounds * len(updates)) * 1e6
+
+    # Разогрев кэша регулярных выражений
+    re.purge()
+    run(legacy_dispatch, legacy_updates[:1])
+
+    legacy_us = run(legacy_dispatch, legacy_updates)
+    router_us = run(router.check_update, router_updates)
+    print(f"Нажатий в выборке: {len(_BENCH_CLICKS)}, повторов: {rounds}")
+    print(f"Цепочка из {len(legacy)} CallbackQueryHandler: {legacy_us:.2f} мкс на нажатие")
+    print(f"CallbackRouter: {router_us:.2f} мкс на нажатие ({legacy_us / router_us:.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Маршрутизация inline-кнопок")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    bench_parser = subparsers.add_parser("bench", help="сравнить с цепочкой регулярных выражений")
+    bench_parser.add_argument("--rounds", type=int, default=20000)
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        bench(args.rounds)
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Вместимость групп на тренировках MSK SK8COOL
+"""
+
+import heapq
+import logging
+import threading
+import time
+from collections import Counter
+from datetime import date
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from config import SLOT_CAPACITY
+
+logger = logging.getLogger(__name__)
+
+# Слот тренировки: (park_id, дата YYYY-MM-DD, время HH:MM)
+Slot = Tuple[str, str, str]
+
+# Сколько держится место, пока пользователь заканчивает запись, с
+HOLD_TTL = 10 * 60
+
+# Статусы записей, которые не занимают место
+FREE_STATUSES = ("rejected", "cancelled", "expired")
+
+
+class SlotCapacity:
+    """
+    Учет мест в группах по слотам (парк × дата × время).
+
+    Для каждого слота хранятся два счетчика: подтвержденные места
+    (заявка отправлена тренеру или одобрена) и временные удержания.
+    Удержание ставится при выборе времени и держится hold_ttl секунд,
+    пока пользователь заканчивает запись; у пользователя не больше
+    одного удержания. Истекшие удержания снимаются лениво по куче
+    сроков при каждом обращении, поэтому проверка свободных мест - O(1)
+    плюс снятие уже истекших.
+
+    Проверка и занятие места выполняются под одной блокировкой, поэтому
+    одновременные нажатия на последнее место не продают его дважды.
+    """
+
+    def __init__(self, capacity: int = SLOT_CAPACITY, hold_ttl: float = HOLD_TTL,
+                 clock: Callable[[], float] = time.monotonic):
+        self.capacity = capacity
+        self.hold_ttl = hold_ttl
+        self.clock = clock
+
+        self._lock = threading.Lock()
+        self._booked: Counter = Counter()
+        self._held: Counter = Counter()
+        # user_id -> (слот, срок истечения)
+        self._holds: Dict[int, Tuple[Slot, float]] = {}
+        self._expiry: List[Tuple[float, int]] = []
+
+        self.counters = {"holds": 0, "expired": 0, "full": 0, "bookings": 0}
+
+    def load(self, bookings: Iterable[Dict], today: Optional[str] = None):
+        """Учитывает места, занятые существующими записями на сегодня и позже"""
+        today = today or date.today().isoformat()
+        with self._lock:
+            for booking in bookings:
+                if booking.get('status') in FREE_STATUSES or not booking.get('park_id'):
+                    continue
+                # Даты в формате YYYY-MM-DD сравниваются как строки
+                if (booking.get('date') or '') < today:
+                    continue
+                self._booked[(booking['park_id'], booking.get('date'), booking.get('time'))] += 1
+
+    def free(self, slot: Slot) -> int:
+        """Количество свободных мест в слоте"""
+        with self._lock:
+            self._expire()
+            return max(0, self._free(slot))
+
+    def hold(self, user_id: int, slot: Slot) -> bool:
+        """
+        Удерживает место за пользователем на hold_ttl секунд. Повторное
+        удержание того же слота продлевает срок, другого - переносит
+        удержание. False - свободных мест нет.
+        """
+        with self._lock:
+            self._expire()
+            current = self._holds.get(user_id)
+            if current is None or current[0] != slot:
+                if self._free(slot) <= 0:
+                    self.counters["full"] += 1
+                    return False
+                self._release(user_id)
+                self._held[slot] += 1
+                self.counters["holds"] += 1
+
+            expires_at = self.clock() + self.hold_ttl
+            self._holds[user_id] = (slot, expires_at)
+            heapq.heappush(self._expiry, (expires_at, user_id))
+            return True
+
+    def release(self, user_id: int) -> bool:
+        """Снимает удержание пользователя (отмена записи)"""
+        with self._lock:
+            return self._release(user_id)
+
+    def book(self, user_id: int, slot: Slot) -> bool:
+        """
+        Превращает удержание в занятое место. Если удержание уже истекло,
+        место занимается, только если оно еще свободно.
+        """
+        with self._lock:
+            self._expire()
+            current = self._holds.get(user_id)
+            if current is not None and current[0] == slot:
+                self._release(user_id)
+            elif self._free(slot) <= 0:
+                self.counters["full"] += 1
+                return False
+            self._booked[slot] += 1
+            self.counters["bookings"] += 1
+            return True
+
+    def unbook(self, slot: Slot):
+        """Освобождает занятое место (заявка отклонена или отменена)"""
+        with self._lock:
+            if self._booked[slot] > 0:
+                self._booked[slot] -= 1
+            if not self._booked[slot]:
+                del self._booked[slot]
+
+    def user_hold(self, user_id: int) -> Optional[Slot]:
+        """Слот, удерживаемый пользователем"""
+        with self._lock:
+            self._expire()
+            current = self._holds.get(user_id)
+            return current[0] if current else None
+
+    def stats(self) -> Dict:
+        """Занятые и удерживаемые места и счетчики"""
+        with self._lock:
+            self._expire()
+            return {
+                "booked": sum(self._booked.values()),
+                "held": len(self._holds),
+                "full_slots": sum(1 for slot in self._booked if self._free(slot) <= 0),
+                **self.counters
+            }
+
+    def _free(self, slot: Slot) -> int:
+        return self.capacity - self._booked[slot] - self._held[slot]
+
+    def _release(self, user_id: int) -> bool:
+        current = self._holds.pop(user_id, None)
+        if current is None:
+            return False
+        slot = current[0]
+        self._held[slot] -= 1
+        if not self._held[slot]:
+            del self._held[slot]
+        return True
+
+    def _expire(self):
+        """Снимает истекшие удержания (записи кучи от продленных удержаний пропускаются)"""
+        now = self.clock()
+        while self._expiry and self._expiry[0][0] <= now:
+            expires_at, user_id = heapq.heappop(self._expiry)
+            current = self._holds.get(user_id)
+            if current is not None and current[1] == expires_at:
+                self._release(user_id)
+                self.counters["expired"] += 1
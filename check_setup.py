@@ -161,8 +161,8 @@ def check_database():
             print("✅ Тестовая запись создана")
             
             # Удаляем тестовую запись
-            db.bookings.pop(test_booking, None)
-            db.save_bookings()
+            db.delete_booking(test_booking)
+            db.close()
             print("✅ Тестовая запись удалена")
         else:
             print("❌ Не удалось создать тестовую запись")
@@ -1,3 +1,4 @@
+import hashlib
 import os
 from dotenv import load_dotenv
 
@@ -7,6 +8,28 @@ load_dotenv()
 BOT_TOKEN = os.getenv('BOT_TOKEN')
 ADMIN_ID = int(os.getenv('ADMIN_ID', 0))
 
+# Хранилище записей и прогресса: json или sqlite
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'json')
+
+# Файл прогресса: .json или компактный бинарный снапшот .bin
+PROGRESS_FILE = os.getenv('PROGRESS_FILE', 'progress.json')
+
+# Напоминания, время которых прошло, пока бот был остановлен:
+# send - отправить сразу, если тренировка еще не началась; skip - пропустить
+REMINDER_CATCHUP = os.getenv('REMINDER_CATCHUP', 'send')
+
+# Адрес игры "Собака на Скейте" (Mini App)
+GAME_URL = os.getenv('GAME_URL', 'https://web-production-af17e.up.railway.app/game')
+
+# Веб-сервер (игра, API и webhook) слушает PORT.
+# Если задан WEBHOOK_URL (например, https://домен/webhook), бот получает
+# обновления через webhook; иначе - через polling (локальная разработка)
+PORT = int(os.getenv('PORT', 8080))
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')
+# Секрет в заголовке X-Telegram-Bot-Api-Secret-Token; по умолчанию выводится из токена
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET') or hashlib.sha256(
+    f"webhook:{BOT_TOKEN}".encode()).hexdigest()[:32]
+
 # Настройки парков
 PARKS = {
     'park1': {
@@ -27,6 +50,12 @@ PARKS = {
     }
 }
 
+# Мест в группе на одну тренировку (парк, дата, время)
+SLOT_CAPACITY = int(os.getenv('SLOT_CAPACITY', 4))
+
+# Сколько часов заявка ждет решения тренера, прежде чем истечь и освободить место
+PENDING_BOOKING_TTL_HOURS = int(os.getenv('PENDING_BOOKING_TTL_HOURS', 24))
+
 # Временные слоты (интервал 2 часа)
 TIME_SLOTS = [
     '12:00', '14:00', '16:00', '18:00', '20:00', '22:00'
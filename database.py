@@ -1,79 +1,178 @@
-import json
-import os
+import secrets
+from collections import defaultdict
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from config import STORAGE_BACKEND
+from storage import JsonLogStorage
+
+# Длина ID записи в байтах до кодирования: token_urlsafe(6) дает 8 символов,
+# поэтому ID помещается в callback_data кнопок вместе с действием
+BOOKING_ID_BYTES = 6
+
+# Допустимые переходы статусов записи: pending -> confirmed -> completed.
+# Отклонить или отменить можно только ожидающую заявку: подтверждение уже
+# засчитало тренировку в прогресс. Истекает заявка, на которую тренер
+# не ответил вовремя
+STATUS_TRANSITIONS = {
+    'pending': ('confirmed', 'rejected', 'cancelled', 'expired'),
+    'confirmed': ('completed',),
+}
 
 class BookingDatabase:
-    def __init__(self, db_file="bookings.json"):
+    def __init__(self, db_file="bookings.json", storage=None):
         self.db_file = db_file
+        self.storage = storage or JsonLogStorage(db_file)
         self.bookings = self.load_bookings()
+        
+        # Вторичные индексы: значение -> множество ID записей
+        self.by_user: Dict[int, Set[str]] = defaultdict(set)
+        self.by_status: Dict[str, Set[str]] = defaultdict(set)
+        self.by_slot: Dict[Tuple[str, str], Set[str]] = defaultdict(set)
+        for booking in self.bookings.values():
+            self._index(booking)
     
     def load_bookings(self) -> Dict:
-        """Загружает записи из файла"""
-        if os.path.exists(self.db_file):
-            try:
-                with open(self.db_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except:
-                return {}
-        return {}
+        """Загружает записи: снапшот из файла плюс журнал изменений"""
+        return self.storage.load()
     
     def save_bookings(self):
-        """Сохраняет записи в файл"""
-        with open(self.db_file, 'w', encoding='utf-8') as f:
-            json.dump(self.bookings, f, ensure_ascii=False, indent=2)
+        """Сохраняет все записи в снапшот и очищает журнал"""
+        self.storage.compact(self.bookings, background=False)
     
-    def add_booking(self, user_id: int, user_name: str, booking_data: Dict) -> str:
-        """Добавляет новую запись"""
-        booking_id = f"booking_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{user_id}"
+    def close(self):
+        """Сбрасывает журнал на диск и останавливает фоновые потоки"""
+        self.storage.close()
+    
+    def _persist(self, booking_id: str):
+        """Дописывает изменение записи в журнал"""
+        if booking_id in self.bookings:
+            self.storage.put(booking_id, self.bookings[booking_id])
+        else:
+            self.storage.delete(booking_id)
         
-        booking = {
+        if self.storage.needs_compaction():
+            self.storage.compact(self.bookings)
+    
+    def _index(self, booking: Dict):
+        """Добавляет запись во вторичные индексы"""
+        booking_id = booking['id']
+        self.by_user[booking['user_id']].add(booking_id)
+        self.by_status[booking['status']].add(booking_id)
+        self.by_slot[(booking.get('date'), booking.get('time'))].add(booking_id)
+    
+    def _unindex(self, booking: Dict):
+        """Убирает запись из вторичных индексов"""
+        booking_id = booking['id']
+        for index, key in ((self.by_user, booking['user_id']),
+                           (self.by_status, booking['status']),
+                           (self.by_slot, (booking.get('date'), booking.get('time')))):
+            ids = index.get(key)
+            if ids is not None:
+                ids.discard(booking_id)
+                if not ids:
+                    del index[key]
+    
+    def _new_booking(self, user_id: int, user_name: str, booking_data: Dict) -> Dict:
+        """Создает запись в статусе pending с новым, еще не занятым ID"""
+        booking_id = secrets.token_urlsafe(BOOKING_ID_BYTES)
+        while self.get_booking(booking_id) is not None:
+            booking_id = secrets.token_urlsafe(BOOKING_ID_BYTES)
+        
+        return {
             'id': booking_id,
             'user_id': user_id,
             'user_name': user_name,
-            'status': 'pending',  # pending, confirmed, rejected, completed
+            'status': 'pending',  # pending, confirmed, rejected, cancelled, expired, completed
             'created_at': datetime.now().isoformat(),
             'confirmed_at': None,
             'rejected_at': None,
             **booking_data
         }
+    
+    def add_booking(self, user_id: int, user_name: str, booking_data: Dict) -> str:
+        """Добавляет новую запись"""
+        booking = self._new_booking(user_id, user_name, booking_data)
+        booking_id = booking['id']
         
         self.bookings[booking_id] = booking
-        self.save_bookings()
+        self._index(booking)
+        self._persist(booking_id)
         return booking_id
     
     def get_booking(self, booking_id: str) -> Optional[Dict]:
         """Получает запись по ID"""
         return self.bookings.get(booking_id)
     
+    def _lookup(self, index: Dict, key) -> List[Dict]:
+        return [self.bookings[booking_id] for booking_id in index.get(key, ())]
+    
     def get_user_bookings(self, user_id: int) -> List[Dict]:
         """Получает все записи пользователя"""
-        return [booking for booking in self.bookings.values() if booking['user_id'] == user_id]
+        return self._lookup(self.by_user, user_id)
     
     def get_pending_bookings(self) -> List[Dict]:
         """Получает все ожидающие подтверждения записи"""
-        return [booking for booking in self.bookings.values() if booking['status'] == 'pending']
+        return self._lookup(self.by_status, 'pending')
     
-    def confirm_booking(self, booking_id: str):
-        """Подтверждает запись"""
+    def get_slot_bookings(self, date: str, time: str) -> List[Dict]:
+        """Получает все записи на указанные дату и время"""
+        return self._lookup(self.by_slot, (date, time))
+    
+    def iter_bookings(self, date: Optional[str] = None) -> Iterator[Dict]:
+        """Перебирает все записи (или записи на указанную дату)"""
+        for booking in list(self.bookings.values()):
+            if date is None or booking.get('date') == date:
+                yield booking
+    
+    def _update_booking(self, booking_id: str, **changes):
+        """Применяет изменения к записи и сохраняет ее"""
         if booking_id in self.bookings:
-            self.bookings[booking_id]['status'] = 'confirmed'
-            self.bookings[booking_id]['confirmed_at'] = datetime.now().isoformat()
-            self.save_bookings()
+            booking = self.bookings[booking_id]
+            self._unindex(booking)
+            booking.update(changes)
+            self._index(booking)
+            self._persist(booking_id)
+    
+    def delete_booking(self, booking_id: str):
+        """Удаляет запись"""
+        booking = self.bookings.pop(booking_id, None)
+        if booking is not None:
+            self._unindex(booking)
+            self._persist(booking_id)
+    
+    def set_status(self, booking_id: str, status: str, **changes) -> Optional[Dict]:
+        """
+        Переводит запись в новый статус, если переход допустим
+        (STATUS_TRANSITIONS). Возвращает обновленную запись или None,
+        если записи нет или она уже в другом статусе - например,
+        заявку повторно подтверждают или отменяют после отклонения.
+        """
+        booking = self.get_booking(booking_id)
+        if booking is None or status not in STATUS_TRANSITIONS.get(booking['status'], ()):
+            return None
+        self._update_booking(booking_id, status=status, **changes)
+        return self.get_booking(booking_id)
     
-    def reject_booking(self, booking_id: str, reason: str = ""):
+    def confirm_booking(self, booking_id: str) -> Optional[Dict]:
+        """Подтверждает запись"""
+        return self.set_status(booking_id, 'confirmed', confirmed_at=datetime.now().isoformat())
+    
+    def reject_booking(self, booking_id: str, reason: str = "") -> Optional[Dict]:
         """Отклоняет запись"""
-        if booking_id in self.bookings:
-            self.bookings[booking_id]['status'] = 'rejected'
-            self.bookings[booking_id]['rejected_at'] = datetime.now().isoformat()
-            self.bookings[booking_id]['rejection_reason'] = reason
-            self.save_bookings()
+        return self.set_status(booking_id, 'rejected', rejected_at=datetime.now().isoformat(),
+                               rejection_reason=reason)
+    
+    def cancel_booking(self, booking_id: str) -> Optional[Dict]:
+        """Отменяет запись по просьбе пользователя"""
+        return self.set_status(booking_id, 'cancelled', cancelled_at=datetime.now().isoformat())
+    
+    def expire_booking(self, booking_id: str) -> Optional[Dict]:
+        """Снимает заявку, на которую тренер не ответил вовремя"""
+        return self.set_status(booking_id, 'expired', expired_at=datetime.now().isoformat())
     
-    def complete_booking(self, booking_id: str):
+    def complete_booking(self, booking_id: str) -> Optional[Dict]:
         """Отмечает запись как завершенную"""
-        if booking_id in self.bookings:
-            self.bookings[booking_id]['status'] = 'completed'
-            self.save_bookings()
+        return self.set_status(booking_id, 'completed')
     
     def get_upcoming_bookings(self, hours_ahead: int = 2) -> List[Dict]:
         """Получает предстоящие записи через указанное количество часов"""
@@ -81,14 +180,13 @@ class BookingDatabase:
         target_time = now + timedelta(hours=hours_ahead)
         
         upcoming = []
-        for booking in self.bookings.values():
-            if booking['status'] == 'confirmed':
-                try:
-                    booking_datetime = datetime.fromisoformat(booking['date'] + 'T' + booking['time'])
-                    if now <= booking_datetime <= target_time:
-                        upcoming.append(booking)
-                except:
-                    continue
+        for booking in self._lookup(self.by_status, 'confirmed'):
+            try:
+                booking_datetime = datetime.fromisoformat(booking['date'] + 'T' + booking['time'])
+                if now <= booking_datetime <= target_time:
+                    upcoming.append(booking)
+            except:
+                continue
         
         return upcoming
     
@@ -106,23 +204,25 @@ class BookingDatabase:
                 continue
         
         for booking_id in old_bookings:
-            del self.bookings[booking_id]
-        
-        if old_bookings:
-            self.save_bookings()
+            self.delete_booking(booking_id)
     
     def get_statistics(self) -> Dict:
         """Получает статистику по записям"""
-        total = len(self.bookings)
-        pending = len([b for b in self.bookings.values() if b['status'] == 'pending'])
-        confirmed = len([b for b in self.bookings.values() if b['status'] == 'confirmed'])
-        rejected = len([b for b in self.bookings.values() if b['status'] == 'rejected'])
-        completed = len([b for b in self.bookings.values() if b['status'] == 'completed'])
-        
+        # Размеры множеств в индексе статусов и есть счетчики
         return {
-            'total': total,
-            'pending': pending,
-            'confirmed': confirmed,
-            'rejected': rejected,
-            'completed': completed
+            'total': len(self.bookings),
+            'pending': len(self.by_status.get('pending', ())),
+            'confirmed': len(self.by_status.get('confirmed', ())),
+            'rejected': len(self.by_status.get('rejected', ())),
+            'cancelled': len(self.by_status.get('cancelled', ())),
+            'expired': len(self.by_status.get('expired', ())),
+            'completed': len(self.by_status.get('completed', ()))
         }
+
+
+def create_booking_database() -> BookingDatabase:
+    """Создает базу записей с хранилищем из STORAGE_BACKEND"""
+    if STORAGE_BACKEND == 'sqlite':
+        from sqlite_backend import SQLiteBookingDatabase
+        return SQLiteBookingDatabase()
+    return BookingDatabase()
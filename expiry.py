@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Истечение заявок, на которые тренер не ответил, для MSK SK8COOL
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from capacity import SlotCapacity
+from config import PENDING_BOOKING_TTL_HOURS
+from send_queue import USER, SendQueue
+
+logger = logging.getLogger(__name__)
+
+PENDING_TTL = timedelta(hours=PENDING_BOOKING_TTL_HOURS)
+
+
+class BookingExpirer:
+    """
+    Снимает заявки, которые слишком долго ждут решения тренера.
+
+    Заявка в статусе pending держит место в группе (SlotCapacity), и без
+    срока брошенная заявка держала бы его вечно. Раз в interval секунд
+    ожидающие заявки (индекс по статусу) проверяются: заявка истекает
+    через ttl после создания или к началу тренировки, если оно раньше.
+    Истекшая заявка переводится в статус expired, место освобождается,
+    а пользователь получает уведомление.
+    """
+
+    def __init__(self, booking_db, slot_capacity: SlotCapacity, send_queue: SendQueue,
+                 ttl: timedelta = PENDING_TTL, interval: float = 60):
+        self.booking_db = booking_db
+        self.slot_capacity = slot_capacity
+        self.send_queue = send_queue
+        self.ttl = ttl
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self.counters = {"expired": 0}
+
+    def deadline(self, booking: Dict) -> datetime:
+        """Когда истекает заявка"""
+        deadline = datetime.fromisoformat(booking['created_at']) + self.ttl
+        try:
+            training = datetime.strptime(f"{booking['date']} {booking['time']}", "%Y-%m-%d %H:%M")
+        except (KeyError, TypeError, ValueError):
+            return deadline
+        return min(deadline, training)
+
+    def expire(self, now: Optional[datetime] = None) -> List[Dict]:
+        """Снимает истекшие заявки и освобождает их места, возвращает снятые"""
+        now = now or datetime.now()
+        expired = []
+        for booking in self.booking_db.get_pending_bookings():
+            if self.deadline(booking) > now:
+                continue
+            booking = self.booking_db.expire_booking(booking['id'])
+            if booking is None:
+                # Тренер успел ответить
+                continue
+            if booking.get('park_id'):
+                self.slot_capacity.unbook((booking['park_id'], booking['date'], booking['time']))
+            expired.append(booking)
+
+        if expired:
+            self.counters["expired"] += len(expired)
+            logger.info(f"Истекло заявок без решения тренера: {len(expired)}")
+        return expired
+
+    def start(self):
+        """Запускает проверку (внутри работающего event loop)"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Останавливает проверку"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                expired = self.expire()
+                await asyncio.gather(*(self._notify(booking) for booking in expired),
+                                     return_exceptions=True)
+            except Exception as e:
+                logger.error(f"Ошибка при снятии истекших заявок: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def _notify(self, booking: Dict):
+        """Сообщает пользователю, что заявка истекла"""
+        try:
+            await self.send_queue.send_message(
+                chat_id=booking['user_id'],
+                text=f"⌛ *Заявка не подтверждена*\n\n"
+                     f"Тренер не успел ответить на вашу заявку "
+                     f"на {booking.get('date_display', booking.get('date'))} в {booking.get('time')}, "
+                     f"поэтому место освобождено.\n\n"
+                     f"🔄 Попробуйте выбрать другое время или свяжитесь с тренером.",
+                priority=USER,
+                parse_mode='Markdown'
+            )
+        except Exception as e:
+            logger.error(f"Ошибка при уведомлении об истекшей заявке {booking['id']}: {e}")
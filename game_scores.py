@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Результаты игры "Собака на Скейте" для MSK SK8COOL
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+
+from progress import Leaderboard
+from storage import JsonLogStorage
+
+logger = logging.getLogger(__name__)
+
+GAMES = {"dog_skate"}
+
+# Счет растет на 1 за кадр: даже на экране 144 Гц это не больше ~150 очков
+# в секунду игры. SCORE_SLACK покрывает округление длительности на клиенте
+MAX_SCORE = 1_000_000
+MAX_SCORE_RATE = 150
+SCORE_SLACK = 100
+MAX_DURATION_MS = 3 * 60 * 60 * 1000
+# Допуск при проверке, что игры одного пользователя не пересекаются, с
+OVERLAP_SLACK = 2.0
+
+
+class InvalidScore(ValueError):
+    """Результат не прошел проверку"""
+
+
+def validate_score(payload: Dict) -> tuple:
+    """Проверяет данные результата от игры, возвращает (игра, счет, длительность в мс)"""
+    game = payload.get("game")
+    if game not in GAMES:
+        raise InvalidScore(f"неизвестная игра: {game!r}")
+
+    score = payload.get("score")
+    if not isinstance(score, int) or isinstance(score, bool) or not 0 <= score <= MAX_SCORE:
+        raise InvalidScore(f"некорректный счет: {score!r}")
+
+    duration = payload.get("game_duration")
+    if not isinstance(duration, (int, float)) or isinstance(duration, bool) \
+            or not 0 < duration <= MAX_DURATION_MS:
+        raise InvalidScore(f"некорректная длительность игры: {duration!r}")
+
+    if score > duration / 1000 * MAX_SCORE_RATE + SCORE_SLACK:
+        raise InvalidScore(f"счет {score} невозможен за {duration / 1000:.1f} с")
+
+    return game, score, int(duration)
+
+
+class GameScores:
+    """
+    Лучшие результаты игроков и таблица лидеров игры.
+
+    Для каждого пользователя хранится только лучший результат и число
+    сыгранных игр. Таблица лидеров (progress.Leaderboard) обновляется
+    только при новом рекорде, поэтому топ и место читаются без перебора
+    всех результатов. Изменения копятся в памяти и раз в save_delay
+    секунд дописываются пачкой в журнал JsonLogStorage.
+
+    Кроме проверки правдоподобия счета, игры одного пользователя не могут
+    пересекаться по времени: новая игра должна начаться не раньше, чем
+    пришел предыдущий результат.
+    """
+
+    def __init__(self, db_file: str = "game_scores.json", save_delay: float = 1.0):
+        self.storage = JsonLogStorage(db_file)
+        self.records: Dict[str, Dict] = self.storage.load()
+
+        # При равном счете выше тот, кто набрал его раньше: ничья разрешается
+        # по сохраненному времени рекорда, поэтому порядок не меняется после перезапуска
+        self.leaderboard = Leaderboard()
+        for user_id_str, record in self.records.items():
+            self.leaderboard.update(user_id_str, record["score"], tiebreak=self._best_at(record))
+
+        self.save_delay = save_delay
+        self._lock = threading.RLock()
+        self._dirty: Set[str] = set()
+        self._save_timer: Optional[threading.Timer] = None
+        self._last_submit: Dict[str, float] = {}
+
+        # Версия таблицы лидеров меняется при каждом новом рекорде
+        self.version = 0
+        self.counters = {"accepted": 0, "rejected": 0, "records": 0}
+
+    def submit(self, user_id: int, user_name: str, username: str, payload: Dict) -> Dict:
+        """
+        Принимает результат игры. Возвращает лучший счет, место и признак
+        нового рекорда; при непрошедшей проверке бросает InvalidScore.
+        """
+        user_id_str = str(user_id)
+        now = time.monotonic()
+
+        with self._lock:
+            try:
+                _, score, duration = validate_score(payload)
+                last = self._last_submit.get(user_id_str)
+                if last is not None and now - duration / 1000 < last - OVERLAP_SLACK:
+                    raise InvalidScore("игра пересекается с предыдущей")
+            except InvalidScore:
+                self.counters["rejected"] += 1
+                raise
+            self._last_submit[user_id_str] = now
+            self.counters["accepted"] += 1
+
+            record = self.records.get(user_id_str)
+            new_best = record is None or score > record["score"]
+            if record is None:
+                record = self.records[user_id_str] = {"score": score, "games": 0}
+            record.update(user_name=user_name, username=username, games=record["games"] + 1)
+            if new_best:
+                best_at = datetime.now().isoformat()
+                record.update(score=score, duration=duration, best_at=best_at, updated_at=best_at)
+                self.leaderboard.update(user_id_str, score, tiebreak=best_at)
+                self.version += 1
+                self.counters["records"] += 1
+            self._mark_dirty(user_id_str)
+
+            return {
+                "score": score,
+                "best": record["score"],
+                "new_best": new_best,
+                "rank": self.leaderboard.rank(user_id_str),
+                "players": len(self.leaderboard)
+            }
+
+    @staticmethod
+    def _best_at(record: Dict) -> str:
+        """Когда впервые набран лучший счет (в старых записях - updated_at)"""
+        return record.get("best_at") or record["updated_at"]
+
+    def best(self, user_id: int) -> Optional[int]:
+        """Лучший счет пользователя"""
+        record = self.records.get(str(user_id))
+        return record["score"] if record else None
+
+    def rank(self, user_id: int) -> Optional[int]:
+        """Место пользователя в таблице лидеров игры"""
+        with self._lock:
+            return self.leaderboard.rank(str(user_id))
+
+    def top(self, limit: int = 10) -> List[Dict]:
+        """Лучшие результаты"""
+        with self._lock:
+            return [
+                {
+                    "user_id": int(user_id_str),
+                    "user_name": self.records[user_id_str]["user_name"],
+                    "username": self.records[user_id_str]["username"],
+                    "score": self.records[user_id_str]["score"]
+                }
+                for user_id_str in self.leaderboard.top(limit)
+            ]
+
+    def format_leaderboard_message(self, limit: int = 10) -> str:
+        """Форматирует таблицу лидеров игры"""
+        top = self.top(limit)
+        if not top:
+            return "🏆 *Рекорды 'Собаки на Скейте'*\n\nПока никто не играл. Будь первым! 🐕🛹"
+
+        message = "🏆 *Рекорды 'Собаки на Скейте'*\n\n"
+        for i, entry in enumerate(top, 1):
+            medal = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else f"{i}."
+            message += f"{medal} {entry['user_name']} — {entry['score']}\n"
+        return message
+
+    def _mark_dirty(self, user_id_str: str):
+        """Помечает пользователя измененным и планирует отложенное сохранение"""
+        self._dirty.add(user_id_str)
+        if self._save_timer is None:
+            self._save_timer = threading.Timer(self.save_delay, self.flush)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def flush(self):
+        """Дописывает в журнал всех измененных пользователей"""
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            dirty, self._dirty = self._dirty, set()
+            for user_id_str in dirty:
+                self.storage.put(user_id_str, self.records[user_id_str])
+            if dirty and self.storage.needs_compaction():
+                self.storage.compact(self.records)
+
+    def close(self):
+        """Сохраняет изменения и закрывает журнал (вызывается при остановке бота)"""
+        self.flush()
+        self.storage.close()
@@ -3,17 +3,88 @@
 MSK SK8COOL - Обработчики команд бота
 """
 
+import json
 import logging
-import os
-from datetime import datetime, timedelta
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, WebAppInfo
+from datetime import datetime
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from config import PARKS, TIME_SLOTS, DAY_PERIODS, ADMIN_ID
-from reminders import ReminderSystem
-from progress import ProgressSystem
+from config import PARKS, DAY_PERIODS, ADMIN_ID
+from reminders import ReminderSystem, create_reminder_store
+from send_queue import ADMIN, BULK, SendQueue
+from progress import ProgressSystem, create_progress_system
+from database import BookingDatabase, create_booking_database
+from broadcast import BroadcastEngine
+from game_scores import GameScores, InvalidScore
+from capacity import SlotCapacity
+from callbacks import callback_data
+import keyboards
+from keyboards import EQUIPMENT_TEXT
 
 logger = logging.getLogger(__name__)
 
+BOOKING_NOT_FOUND_TEXT = "⚠️ Заявка не найдена или уже обработана."
+
+def get_progress_system(context: ContextTypes.DEFAULT_TYPE) -> ProgressSystem:
+    """Общая система прогресса из bot_data (создается один раз на процесс)"""
+    progress_system = context.bot_data.get('progress_system')
+    if progress_system is None:
+        progress_system = create_progress_system()
+        context.bot_data['progress_system'] = progress_system
+    return progress_system
+
+def get_send_queue(context: ContextTypes.DEFAULT_TYPE) -> SendQueue:
+    """Общая очередь исходящих сообщений из bot_data"""
+    send_queue = context.bot_data.get('send_queue')
+    if send_queue is None:
+        send_queue = SendQueue(context.bot)
+        context.bot_data['send_queue'] = send_queue
+    return send_queue
+
+def get_booking_database(context: ContextTypes.DEFAULT_TYPE) -> BookingDatabase:
+    """Общая база записей из bot_data"""
+    booking_db = context.bot_data.get('booking_db')
+    if booking_db is None:
+        booking_db = create_booking_database()
+        context.bot_data['booking_db'] = booking_db
+    return booking_db
+
+def get_broadcast_engine(context: ContextTypes.DEFAULT_TYPE) -> BroadcastEngine:
+    """Общий движок рассылок из bot_data"""
+    engine = context.bot_data.get('broadcast_engine')
+    if engine is None:
+        engine = BroadcastEngine(get_send_queue(context), get_progress_system(context),
+                                 get_booking_database(context))
+        context.bot_data['broadcast_engine'] = engine
+    return engine
+
+def get_reminder_system(context: ContextTypes.DEFAULT_TYPE) -> ReminderSystem:
+    """Общая система напоминаний из bot_data (создается один раз на процесс)"""
+    reminder_system = context.bot_data.get('reminder_system')
+    if reminder_system is None:
+        reminder_system = ReminderSystem(context.bot, create_reminder_store(),
+                                         send_queue=get_send_queue(context))
+        reminder_system.rehydrate()
+        reminder_system.start()
+        context.bot_data['reminder_system'] = reminder_system
+    return reminder_system
+
+def get_game_scores(context: ContextTypes.DEFAULT_TYPE) -> GameScores:
+    """Общие результаты игры из bot_data"""
+    game_scores = context.bot_data.get('game_scores')
+    if game_scores is None:
+        game_scores = GameScores()
+        context.bot_data['game_scores'] = game_scores
+    return game_scores
+
+def get_slot_capacity(context: ContextTypes.DEFAULT_TYPE) -> SlotCapacity:
+    """Общий учет мест в группах из bot_data (места существующих записей учитываются при создании)"""
+    slot_capacity = context.bot_data.get('slot_capacity')
+    if slot_capacity is None:
+        slot_capacity = SlotCapacity()
+        slot_capacity.load(get_booking_database(context).iter_bookings())
+        context.bot_data['slot_capacity'] = slot_capacity
+    return slot_capacity
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Приветствие и главное меню"""
     # Проверяем, есть ли параметр в команде start
@@ -67,43 +138,17 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     # Обычное приветствие
-    keyboard = [
-        [InlineKeyboardButton("🏂 Записаться на тренировку", callback_data="training_info")],
-        [InlineKeyboardButton("🎮 Играть в игру", callback_data="play_game")],
-        [InlineKeyboardButton("📊 Мой прогресс", callback_data="my_progress")],
-        [InlineKeyboardButton("🏆 Таблица лидеров", callback_data="leaderboard")],
-        [InlineKeyboardButton("🏫 О школе", callback_data="about_school")],
-        [InlineKeyboardButton("📞 Связаться с тренером", callback_data="contact_coach")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await update.message.reply_text(
-        "🛹 *Добро пожаловать в MSK SK8COOL!*\n\n"
-        "Мы - школа скейтбординга в Москве! 🏂\n"
-        "Выберите, что вас интересует:",
-        reply_markup=reply_markup,
-        parse_mode='Markdown'
-    )
+    screen = keyboards.get_screen('welcome')
+    await update.message.reply_text(screen.text, reply_markup=screen.reply_markup, parse_mode='Markdown')
 
 async def training_info(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Информация о тренировках"""
     await update.callback_query.answer()
     
-    keyboard = [
-        [InlineKeyboardButton("📍 Выбрать парк", callback_data="select_park")],
-        [InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
+    screen = keyboards.get_screen('training_info')
     await update.callback_query.edit_message_text(
-        "🏂 *Как проходят тренировки:*\n\n"
-        "• Групповые занятия 2-4 человека\n"
-        "• Индивидуальные тренировки\n"
-        "• Длительность: 1-1.5 часа\n"
-        "• Опытные тренеры с сертификатами\n"
-        "• Все уровни: от новичков до продвинутых\n\n"
-        "Давайте выберем парк для тренировки! 🎯",
-        reply_markup=reply_markup,
+        screen.text,
+        reply_markup=screen.reply_markup,
         parse_mode='Markdown'
     )
 
@@ -111,21 +156,10 @@ async def about_school(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Информация о школе"""
     await update.callback_query.answer()
     
-    keyboard = [
-        [InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
+    screen = keyboards.get_screen('about_school')
     await update.callback_query.edit_message_text(
-        "🏫 *О школе MSK SK8COOL:*\n\n"
-        "Мы обучаем скейтбордингу с 2020 года! 🎓\n\n"
-        "• Более 500 учеников\n"
-        "• 5+ опытных тренеров\n"
-        "• Занятия в лучших парках Москвы\n"
-        "• Безопасность превыше всего\n"
-        "• Индивидуальный подход к каждому\n\n"
-        "Присоединяйтесь к нашей команде! 🚀",
-        reply_markup=reply_markup,
+        screen.text,
+        reply_markup=screen.reply_markup,
         parse_mode='Markdown'
     )
 
@@ -133,19 +167,10 @@ async def contact_coach(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Контакты тренера"""
     await update.callback_query.answer()
     
-    keyboard = [
-        [InlineKeyboardButton("💬 Написать тренеру", url="https://t.me/wip_sxiueohd?start=msk_sk8cool")],
-        [InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
+    screen = keyboards.get_screen('contact_coach')
     await update.callback_query.edit_message_text(
-        "📞 *Связаться с тренером:*\n\n"
-        "Нажмите кнопку ниже, чтобы открыть чат с тренером!\n\n"
-        "⏰ *Время работы:* 9:00 - 21:00\n"
-        "⚡ *Ответим в течение 30 минут!*\n\n"
-        "При нажатии откроется чат с автоматическим приветственным сообщением! 🚀",
-        reply_markup=reply_markup,
+        screen.text,
+        reply_markup=screen.reply_markup,
         parse_mode='Markdown'
     )
 
@@ -153,20 +178,10 @@ async def main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Возврат в главное меню"""
     await update.callback_query.answer()
     
-    keyboard = [
-        [InlineKeyboardButton("🏂 Записаться на тренировку", callback_data="training_info")],
-        [InlineKeyboardButton("🎮 Играть в игру", callback_data="play_game")],
-        [InlineKeyboardButton("📊 Мой прогресс", callback_data="my_progress")],
-        [InlineKeyboardButton("🏆 Таблица лидеров", callback_data="leaderboard")],
-        [InlineKeyboardButton("🏫 О школе", callback_data="about_school")],
-        [InlineKeyboardButton("📞 Связаться с тренером", callback_data="contact_coach")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
+    screen = keyboards.get_screen('main_menu')
     await update.callback_query.edit_message_text(
-        "🛹 *MSK SK8COOL - Главное меню*\n\n"
-        "Выберите, что вас интересует:",
-        reply_markup=reply_markup,
+        screen.text,
+        reply_markup=screen.reply_markup,
         parse_mode='Markdown'
     )
 
@@ -174,20 +189,10 @@ async def select_park(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Выбор парка"""
     await update.callback_query.answer()
     
-    keyboard = []
-    for park_id, park_info in PARKS.items():
-        keyboard.append([InlineKeyboardButton(
-            f"📍 {park_info['name']}", 
-            callback_data=f"park_{park_id}"
-        )])
-    
-    keyboard.append([InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu")])
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
+    screen = keyboards.get_screen('select_park')
     await update.callback_query.edit_message_text(
-        "📍 *Выберите парк для тренировки:*\n\n"
-        "У нас есть несколько отличных локаций в разных районах Москвы! 🏞️",
-        reply_markup=reply_markup,
+        screen.text,
+        reply_markup=screen.reply_markup,
         parse_mode='Markdown'
     )
 
@@ -195,16 +200,9 @@ async def show_park_info(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показать информацию о парке"""
     await update.callback_query.answer()
     
-    park_id = update.callback_query.data.split('_')[1]
+    park_id = context.payload.park_id
     park_info = PARKS[park_id]
-    
-    keyboard = [
-        [InlineKeyboardButton("🗺️ Открыть карту", url=park_info['yandex_maps'])],
-        [InlineKeyboardButton("✅ Выбрать этот парк", callback_data=f"confirm_park_{park_id}")],
-        [InlineKeyboardButton("🔄 Выбрать другой парк", callback_data="select_park")],
-        [InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = keyboards.get_park_info_keyboard(park_id)
     
     await update.callback_query.edit_message_text(
         f"🏞️ *{park_info['name']}*\n\n"
@@ -217,57 +215,17 @@ async def confirm_park(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Подтверждение выбора парка"""
     await update.callback_query.answer()
     
-    park_id = update.callback_query.data.split('_')[2]
+    park_id = context.payload.park_id
     park_info = PARKS[park_id]
     
-    # Сохраняем выбранный парк в контексте пользователя
-    user_id = update.callback_query.from_user.id
-    if 'user_data' not in context.user_data:
-        context.user_data['user_data'] = {}
-    context.user_data['user_data']['park_id'] = park_id
-    context.user_data['user_data']['park_name'] = park_info['name']
-    
-    # Создаем кнопки для выбора даты (7 дней вперед)
-    keyboard = []
-    today = datetime.now()
-    
-    for i in range(1, 8):  # Следующие 7 дней
-        future_date = today + timedelta(days=i)
-        day_name = future_date.strftime("%A")
-        day_number = future_date.strftime("%d")
-        month_name = future_date.strftime("%B")
-        
-        # Перевод дней недели
-        day_translations = {
-            'Monday': 'Пн', 'Tuesday': 'Вт', 'Wednesday': 'Ср', 'Thursday': 'Чт',
-            'Friday': 'Пт', 'Saturday': 'Сб', 'Sunday': 'Вс'
-        }
-        month_translations = {
-            'January': 'янв', 'February': 'фев', 'March': 'мар', 'April': 'апр',
-            'May': 'май', 'June': 'июн', 'July': 'июл', 'August': 'авг',
-            'September': 'сен', 'October': 'окт', 'November': 'ноя', 'December': 'дек'
-        }
-        
-        day_ru = day_translations.get(day_name, day_name)
-        month_ru = month_translations.get(month_name, month_name)
-        
-        if i == 1:
-            emoji = "🎯"
-            label = "Завтра"
-        else:
-            emoji = "📋"
-            label = f"{day_ru}, {day_number} {month_ru}"
-        
-        keyboard.append([InlineKeyboardButton(
-            f"{emoji} {label}", 
-            callback_data=f"date_{i}_days"
-        )])
-    
-    keyboard.extend([
-        [InlineKeyboardButton("🔄 Другой парк", callback_data="select_park")],
-        [InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")]
-    ])
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    # Выбор парка начинает новую запись, поэтому прежнее состояние сбрасывается
+    context.user_data['user_data'] = {
+        'park_id': park_id,
+        'park_name': park_info['name']
+    }
+    
+    # Кнопки выбора даты (7 дней вперед) строятся один раз в день
+    reply_markup = keyboards.get_date_selection_keyboard()
     
     await update.callback_query.edit_message_text(
         f"🎯 *Парк выбран: {park_info['name']}*\n\n"
@@ -280,54 +238,21 @@ async def confirm_park(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def select_date(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Выбор даты"""
-    await update.callback_query.answer()
-    
-    # Парсим количество дней
-    parts = update.callback_query.data.split('_')
-    days_ahead = int(parts[1])
-    
-    # Вычисляем дату
-    today = datetime.now()
-    selected_date = today + timedelta(days=days_ahead)
-    
-    # Форматируем дату для отображения
-    day_name = selected_date.strftime("%A")
-    day_number = selected_date.strftime("%d")
-    month_name = selected_date.strftime("%B")
-    
-    # Перевод дней недели
-    day_translations = {
-        'Monday': 'Понедельник', 'Tuesday': 'Вторник', 'Wednesday': 'Среда', 'Thursday': 'Четверг',
-        'Friday': 'Пятница', 'Saturday': 'Суббота', 'Sunday': 'Воскресенье'
-    }
-    month_translations = {
-        'January': 'января', 'February': 'февраля', 'March': 'марта', 'April': 'апреля',
-        'May': 'мая', 'June': 'июня', 'July': 'июля', 'August': 'августа',
-        'September': 'сентября', 'October': 'октября', 'November': 'ноября', 'December': 'декабря'
-    }
-    
-    day_ru = day_translations.get(day_name, day_name)
-    month_ru = month_translations.get(month_name, month_name)
+    booking_day = keyboards.get_booking_day(context.payload.days_ahead)
+    if booking_day is None:
+        await stale_button(update, context)
+        return
     
-    if days_ahead == 1:
-        date_display = "Завтра"
-    else:
-        date_display = f"{day_ru}, {day_number} {month_ru}"
+    await update.callback_query.answer()
+    date_display = booking_day.display
     
     # Сохраняем выбранную дату
     if 'user_data' not in context.user_data:
         context.user_data['user_data'] = {}
-    context.user_data['user_data']['date'] = selected_date.strftime('%Y-%m-%d')
+    context.user_data['user_data']['date'] = booking_day.date
     context.user_data['user_data']['date_display'] = date_display
     
-    # Создаем кнопки для выбора периода дня
-    keyboard = [
-        [InlineKeyboardButton("☀️ День", callback_data="period_day")],
-        [InlineKeyboardButton("🌙 Вечер", callback_data="period_evening")],
-        [InlineKeyboardButton("🔄 Другая дата", callback_data="select_park")],
-        [InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = keyboards.get_period_keyboard()
     
     park_name = context.user_data['user_data'].get('park_name', 'Парк')
     
@@ -344,23 +269,18 @@ async def select_period(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Выбор периода дня"""
     await update.callback_query.answer()
     
-    period = update.callback_query.data.split('_')[1]
+    period = context.payload.period
     period_info = DAY_PERIODS[period]
     
-    # Создаем кнопки для выбора времени в выбранном периоде
-    keyboard = []
-    for time_slot in period_info['times']:
-        if period == 'day':
-            emoji = "☀️"
-        else:
-            emoji = "🌙"
-        keyboard.append([InlineKeyboardButton(f"{emoji} {time_slot}", callback_data=f"time_{time_slot}")])
+    user_data = context.user_data.get('user_data', {})
+    slot_capacity = get_slot_capacity(context)
     
-    keyboard.extend([
-        [InlineKeyboardButton("🔄 Другой период", callback_data="select_park")],
-        [InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")]
-    ])
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    # Клавиатура зависит только от периода и свободных мест, поэтому берется из кэша
+    free = tuple(
+        slot_capacity.free((user_data.get('park_id'), user_data.get('date'), time_slot))
+        for time_slot in period_info['times']
+    )
+    reply_markup = keyboards.get_time_selection_keyboard(period, free)
     
     park_name = context.user_data['user_data'].get('park_name', 'Парк')
     date_display = context.user_data['user_data'].get('date_display', 'Дата')
@@ -377,33 +297,25 @@ async def select_period(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def select_time(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Выбор времени"""
-    await update.callback_query.answer()
-    
-    callback_data = update.callback_query.data
-    if callback_data.startswith("time_header_"):
-        # Это заголовок, просто отвечаем без изменений
-        return
-    
-    time_slot = callback_data.split('_')[1]
+    time_slot = context.payload.time
     
-    # Сохраняем выбранное время
     if 'user_data' not in context.user_data:
         context.user_data['user_data'] = {}
-    context.user_data['user_data']['time'] = time_slot
+    user_data = context.user_data['user_data']
+    
+    # Место удерживается за пользователем, пока он заканчивает запись
+    slot = (user_data.get('park_id'), user_data.get('date'), time_slot)
+    if not get_slot_capacity(context).hold(update.callback_query.from_user.id, slot):
+        await update.callback_query.answer(
+            "😔 На это время мест нет. Выберите другое время.", show_alert=True
+        )
+        return
+    await update.callback_query.answer()
     
     # Сохраняем выбранное время
-    if 'user_data' not in context.user_data:
-        context.user_data['user_data'] = {}
-    context.user_data['user_data']['time'] = time_slot
+    user_data['time'] = time_slot
     
-    # Создаем кнопки для проверки оборудования
-    keyboard = [
-        [InlineKeyboardButton("✅ Да, у меня всё есть", callback_data="equipment_yes")],
-        [InlineKeyboardButton("❌ Нет, нужна помощь", callback_data="equipment_no")],
-        [InlineKeyboardButton("🔄 Другое время", callback_data="select_park")],
-        [InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = keyboards.get_equipment_check_keyboard()
     
     park_name = context.user_data['user_data'].get('park_name', 'Парк')
     date_display = context.user_data['user_data'].get('date_display', 'Дата')
@@ -425,7 +337,7 @@ async def equipment_check(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Проверка оборудования"""
     await update.callback_query.answer()
     
-    choice = update.callback_query.data.split('_')[1]
+    choice = context.payload.choice
     
     if choice == "yes":
         # У пользователя всё есть, сохраняем это и переходим к подтверждению записи
@@ -435,14 +347,7 @@ async def equipment_check(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await confirm_booking(update, context)
     elif choice == "no":
         # Пользователю нужна помощь с оборудованием
-        keyboard = [
-            [InlineKeyboardButton("🛡️ Защита", callback_data="equipment_protection")],
-            [InlineKeyboardButton("🛹 Скейтборд", callback_data="equipment_skateboard")],
-            [InlineKeyboardButton("🛡️🛹 Защита + Скейтборд", callback_data="equipment_both")],
-            [InlineKeyboardButton("🔄 Другое время", callback_data="select_park")],
-            [InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = keyboards.get_equipment_keyboard()
         
         park_name = context.user_data['user_data'].get('park_name', 'Парк')
         date_display = context.user_data['user_data'].get('date_display', 'Дата')
@@ -461,7 +366,7 @@ async def equipment_selection(update: Update, context: ContextTypes.DEFAULT_TYPE
     """Выбор оборудования"""
     await update.callback_query.answer()
     
-    equipment_type = update.callback_query.data.split('_')[1]
+    equipment_type = context.payload.choice
     
     # Сохраняем выбранное оборудование
     if 'user_data' not in context.user_data:
@@ -482,19 +387,8 @@ async def confirm_booking(update: Update, context: ContextTypes.DEFAULT_TYPE):
     equipment = user_data.get('equipment', 'none')
     
     # Определяем текст оборудования
-    equipment_text = {
-        'protection': '🛡️ Защита',
-        'skateboard': '🛹 Скейтборд',
-        'both': '🛡️🛹 Защита + Скейтборд',
-        'none': '✨ У меня всё есть'
-    }.get(equipment, '✨ У меня всё есть')
-    
-    keyboard = [
-        [InlineKeyboardButton("✅ Подтвердить запись", callback_data="final_confirm")],
-        [InlineKeyboardButton("❌ Отменить", callback_data="booking_cancel")],
-        [InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    equipment_text = EQUIPMENT_TEXT.get(equipment, EQUIPMENT_TEXT['none'])
+    reply_markup = keyboards.get_confirmation_keyboard()
     
     await update.callback_query.edit_message_text(
         f"🎯 *Подтверждение записи*\n\n"
@@ -518,7 +412,19 @@ async def final_booking_confirm(update: Update, context: ContextTypes.DEFAULT_TY
     
     user_data = context.user_data.get('user_data', {})
     logger.info(f"User data: {user_data}")
-    
+
+    # Заявка уже отправлена (повторное нажатие кнопки)
+    if user_data.get('booking_id'):
+        return
+
+    # Без парка, даты или времени тренеру ушли бы заглушки вместо заявки
+    if not all(user_data.get(key) for key in ('park_id', 'date', 'time')):
+        await update.callback_query.edit_message_text(
+            "⚠️ Данные записи не найдены. Пожалуйста, начните запись заново.",
+            reply_markup=keyboards.HOME_KEYBOARD
+        )
+        return
+
     park_name = user_data.get('park_name', 'Парк')
     date_display = user_data.get('date_display', 'Дата')
     time_slot = user_data.get('time', 'Время')
@@ -527,12 +433,7 @@ async def final_booking_confirm(update: Update, context: ContextTypes.DEFAULT_TY
     logger.info(f"Extracted data - Park: {park_name}, Date: {date_display}, Time: {time_slot}, Equipment: {equipment}")
     
     # Определяем текст оборудования
-    equipment_text = {
-        'protection': '🛡️ Защита',
-        'skateboard': '🛹 Скейтборд',
-        'both': '🛡️🛹 Защита + Скейтборд',
-        'none': '✨ У меня всё есть'
-    }.get(equipment, '✨ У меня всё есть')
+    equipment_text = EQUIPMENT_TEXT.get(equipment, EQUIPMENT_TEXT['none'])
     
     # Отправляем уведомление админу
     username = update.callback_query.from_user.username
@@ -555,26 +456,58 @@ async def final_booking_confirm(update: Update, context: ContextTypes.DEFAULT_TY
     training_date = user_data.get('date', '')
     training_time = user_data.get('time', '')
     
-    admin_keyboard = [
-        [InlineKeyboardButton("✅ Подтвердить", callback_data=f"admin_approve_{update.callback_query.from_user.id}_{park_id}_{training_date}_{training_time}")],
-        [InlineKeyboardButton("❌ Отклонить", callback_data=f"admin_reject_{update.callback_query.from_user.id}_{park_id}_{training_date}_{training_time}")]
-    ]
-    admin_reply_markup = InlineKeyboardMarkup(admin_keyboard)
+    # Удержанное место становится занятым; если удержание истекло,
+    # а места за это время закончились, заявка не отправляется
+    slot_capacity = get_slot_capacity(context)
+    slot = (park_id, training_date, training_time)
+    if not slot_capacity.book(update.callback_query.from_user.id, slot):
+        await update.callback_query.edit_message_text(
+            f"😔 *Места закончились*\n\n"
+            f"Пока вы оформляли запись, все места на {date_display} в {time_slot} заняли.\n"
+            f"Пожалуйста, выберите другое время.",
+            reply_markup=InlineKeyboardMarkup([
+                [InlineKeyboardButton("📅 Выбрать другое время", callback_data=callback_data("confirm_park", park_id))],
+                [InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")]
+            ]),
+            parse_mode='Markdown'
+        )
+        return
+    
+    # Заявка сохраняется в базе записей в статусе pending,
+    # в кнопки админа попадает только ее ID
+    park_info = PARKS.get(park_id, PARKS['park1'])
+    booking_db = get_booking_database(context)
+    booking_id = booking_db.add_booking(
+        update.callback_query.from_user.id,
+        update.callback_query.from_user.first_name,
+        {
+            'username': username,
+            'park_id': park_id,
+            'park_name': park_info['name'],
+            'park_link': park_info['yandex_maps'],
+            'date': training_date,
+            'date_display': date_display,
+            'time': training_time,
+            'equipment': equipment
+        }
+    )
+    admin_reply_markup = keyboards.get_admin_confirmation_keyboard(booking_id)
     
     try:
         # Отправляем сообщение админу с кнопками
-        await context.bot.send_message(
+        await get_send_queue(context).send_message(
             chat_id=ADMIN_ID,
             text=admin_message,
             reply_markup=admin_reply_markup,
-            parse_mode='Markdown'
+            parse_mode='Markdown',
+            priority=ADMIN
         )
         
+        # Состояние записи больше не нужно, остается только ID заявки
+        context.user_data['user_data'] = {'booking_id': booking_id}
+        
         # Подтверждаем пользователю
-        keyboard = [
-            [InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = keyboards.get_booking_cancel_keyboard(booking_id)
         
         await update.callback_query.edit_message_text(
             f"🎉 *Заявка отправлена!*\n\n"
@@ -591,11 +524,25 @@ async def final_booking_confirm(update: Update, context: ContextTypes.DEFAULT_TY
         
     except Exception as e:
         logger.error(f"Ошибка при отправке уведомления админу: {e}")
+        booking_db.delete_booking(booking_id)
+        slot_capacity.unbook(slot)
         await update.callback_query.edit_message_text(
             "❌ Произошла ошибка при отправке заявки. Попробуйте позже.",
             parse_mode='Markdown'
         )
 
+def reminder_data(booking: dict) -> dict:
+    """Данные напоминания из записи в базе"""
+    return {
+        'user_id': booking['user_id'],
+        'user_name': booking['user_name'],
+        'username': f"@{booking['username']}" if booking.get('username') else "Не указан",
+        'park_name': booking['park_name'],
+        'park_link': booking['park_link'],
+        'date': booking['date'],
+        'time': booking['time']
+    }
+
 async def admin_approve(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Админ подтверждает заявку"""
     await update.callback_query.answer()
@@ -605,17 +552,17 @@ async def admin_approve(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.callback_query.edit_message_text("❌ У вас нет прав для этого действия.")
         return
     
-    # Извлекаем данные из callback_data
-    parts = update.callback_query.data.split('_')
-    user_id = parts[2]
-    park_id = parts[3] if len(parts) > 3 else 'park1'
-    training_date = parts[4] if len(parts) > 4 else ''
-    training_time = parts[5] if len(parts) > 5 else ''
+    # Заявка по ID из кнопки; подтвердить можно только ожидающую
+    booking = get_booking_database(context).confirm_booking(context.payload.booking_id)
+    if booking is None:
+        await update.callback_query.edit_message_text(BOOKING_NOT_FOUND_TEXT)
+        return
     
-    # Получаем данные о парке
-    park_info = PARKS.get(park_id, PARKS['park1'])
-    park_name = park_info['name']
-    park_link = park_info['yandex_maps']
+    user_id = booking['user_id']
+    training_date = booking['date']
+    training_time = booking['time']
+    park_name = booking['park_name']
+    park_link = booking['park_link']
     
     # Обновляем сообщение админа
     await update.callback_query.edit_message_text(
@@ -629,7 +576,7 @@ async def admin_approve(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     # Отправляем уведомление пользователю
     try:
-        await context.bot.send_message(
+        await get_send_queue(context).send_message(
             chat_id=user_id,
             text=f"🎉 *Ваша заявка подтверждена!*\n\n"
                  f"✅ Тренер подтвердил вашу заявку на тренировку.\n"
@@ -645,37 +592,18 @@ async def admin_approve(update: Update, context: ContextTypes.DEFAULT_TYPE):
             disable_web_page_preview=True
         )
         
-        # Планируем напоминание за 2 часа до тренировки
-        reminder_system = ReminderSystem(context.bot, context.job_queue)
-        
-        # Собираем данные для напоминания
-        booking_data = {
-            'user_id': int(user_id),
-            'user_name': update.callback_query.from_user.first_name,
-            'username': f"@{update.callback_query.from_user.username}" if update.callback_query.from_user.username else "Не указан",
-            'park_name': park_name,
-            'park_link': park_link,
-            'date': training_date,
-            'time': training_time
-        }
-        
-        # Планируем напоминание
-        reminder_system.schedule_reminder(booking_data)
+        # Планируем напоминание за 2 часа до тренировки по данным записи
+        get_reminder_system(context).schedule_reminder(reminder_data(booking))
         
         # Обновляем прогресс пользователя
         try:
-            progress_system = ProgressSystem()
-            
-            # Получаем информацию о пользователе
-            user_info = await context.bot.get_chat(int(user_id))
-            user_name = user_info.first_name
-            username = user_info.username or "Не указан"
+            progress_system = get_progress_system(context)
             
             # Добавляем тренировку в прогресс
             progress_result = progress_system.add_session(
-                user_id=int(user_id),
-                user_name=user_name,
-                username=username,
+                user_id=user_id,
+                user_name=booking['user_name'],
+                username=booking['username'] or "Не указан",
                 park_name=park_name,
                 session_date=training_date,
                 session_time=training_time
@@ -688,17 +616,17 @@ async def admin_approve(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     for achievement in progress_result['new_achievements']
                 ])
                 
-                await context.bot.send_message(
-                    chat_id=int(user_id),
+                await get_send_queue(context).send_message(
+                    chat_id=user_id,
                     text=f"🎉 *Новые достижения!*\n\n{achievements_text}\n\n"
                          f"Продолжайте в том же духе! 🚀",
                     parse_mode='Markdown'
                 )
             
             # Отправляем обновленный прогресс
-            progress_message = progress_system.format_progress_message(int(user_id))
-            await context.bot.send_message(
-                chat_id=int(user_id),
+            progress_message = progress_system.format_progress_message(user_id)
+            await get_send_queue(context).send_message(
+                chat_id=user_id,
                 text=progress_message,
                 parse_mode='Markdown'
             )
@@ -718,16 +646,17 @@ async def admin_reject(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.callback_query.edit_message_text("❌ У вас нет прав для этого действия.")
         return
     
-    # Извлекаем данные из callback_data
-    parts = update.callback_query.data.split('_')
-    user_id = parts[2]
-    park_id = parts[3] if len(parts) > 3 else 'park1'
-    training_date = parts[4] if len(parts) > 4 else ''
-    training_time = parts[5] if len(parts) > 5 else ''
+    # Заявка по ID из кнопки; отклонить можно только ожидающую
+    booking = get_booking_database(context).reject_booking(context.payload.booking_id)
+    if booking is None:
+        await update.callback_query.edit_message_text(BOOKING_NOT_FOUND_TEXT)
+        return
     
-    # Получаем данные о парке
-    park_info = PARKS.get(park_id, PARKS['park1'])
-    park_name = park_info['name']
+    user_id = booking['user_id']
+    park_name = booking['park_name']
+    
+    # Место в группе освобождается
+    get_slot_capacity(context).unbook((booking['park_id'], booking['date'], booking['time']))
     
     # Обновляем сообщение админа
     await update.callback_query.edit_message_text(
@@ -741,7 +670,7 @@ async def admin_reject(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     # Отправляем уведомление пользователю
     try:
-        await context.bot.send_message(
+        await get_send_queue(context).send_message(
             chat_id=user_id,
             text="❌ *Заявка отклонена*\n\n"
                  "К сожалению, ваша заявка на тренировку была отклонена.\n"
@@ -759,32 +688,69 @@ async def booking_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Отмена записи"""
     await update.callback_query.answer()
     
-    keyboard = [
-        [InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    # Удержанное место возвращается в группу
+    get_slot_capacity(context).release(update.callback_query.from_user.id)
     
-    await update.callback_query.edit_message_text(
-        "❌ Запись отменена.\n\n"
-        "Можете начать заново или вернуться в главное меню.",
-        reply_markup=reply_markup
-    )
+    screen = keyboards.get_screen('booking_cancelled')
+    await update.callback_query.edit_message_text(screen.text, reply_markup=screen.reply_markup)
+
+async def cancel_booking(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Пользователь отменяет отправленную заявку, пока тренер ее не подтвердил"""
+    await update.callback_query.answer()
+    
+    booking_db = get_booking_database(context)
+    booking_id = context.payload.booking_id
+    booking = booking_db.get_booking(booking_id)
+    if booking is None or booking['user_id'] != update.callback_query.from_user.id:
+        await update.callback_query.edit_message_text(BOOKING_NOT_FOUND_TEXT, reply_markup=keyboards.HOME_KEYBOARD)
+        return
+    
+    # Подтвержденная тренировка уже засчитана в прогресс, ее отменяет только тренер
+    if booking['status'] == 'confirmed':
+        await update.callback_query.edit_message_text(
+            "✅ Заявка уже подтверждена тренером.\n\n"
+            "Чтобы отменить тренировку, свяжитесь с тренером.",
+            reply_markup=keyboards.HOME_KEYBOARD
+        )
+        return
+    
+    booking = booking_db.cancel_booking(booking_id)
+    if booking is None:
+        await update.callback_query.edit_message_text(BOOKING_NOT_FOUND_TEXT, reply_markup=keyboards.HOME_KEYBOARD)
+        return
+    
+    # Место возвращается в группу
+    get_slot_capacity(context).unbook((booking['park_id'], booking['date'], booking['time']))
+    
+    screen = keyboards.get_screen('booking_cancelled')
+    await update.callback_query.edit_message_text(screen.text, reply_markup=screen.reply_markup)
+    
+    try:
+        await get_send_queue(context).send_message(
+            chat_id=ADMIN_ID,
+            text=f"🚫 *Заявка отменена пользователем*\n\n"
+                 f"👤 *Пользователь:* {booking['user_name']}\n"
+                 f"🆔 *ID:* {booking['user_id']}\n"
+                 f"🏞️ *Парк:* {booking['park_name']}\n"
+                 f"📅 *Дата:* {booking.get('date_display', booking['date'])}\n"
+                 f"⏰ *Время:* {booking['time']}",
+            parse_mode='Markdown',
+            priority=ADMIN
+        )
+    except Exception as e:
+        logger.error(f"Ошибка при отправке уведомления админу: {e}")
 
 async def my_progress(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показать прогресс пользователя"""
     await update.callback_query.answer()
     
     try:
-        progress_system = ProgressSystem()
+        progress_system = get_progress_system(context)
         user_id = update.callback_query.from_user.id
         
         progress_message = progress_system.format_progress_message(user_id)
         
-        keyboard = [
-            [InlineKeyboardButton("🏆 Таблица лидеров", callback_data="leaderboard")],
-            [InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = keyboards.PROGRESS_KEYBOARD
         
         await update.callback_query.edit_message_text(
             progress_message,
@@ -796,9 +762,7 @@ async def my_progress(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.error(f"Ошибка при получении прогресса: {e}")
         await update.callback_query.edit_message_text(
             "❌ Ошибка при получении прогресса. Попробуйте позже.",
-            reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu")
-            ]])
+            reply_markup=keyboards.BACK_TO_MENU_KEYBOARD
         )
 
 async def leaderboard(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -806,14 +770,10 @@ async def leaderboard(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.callback_query.answer()
     
     try:
-        progress_system = ProgressSystem()
+        progress_system = get_progress_system(context)
         leaderboard_message = progress_system.format_leaderboard_message(5)
         
-        keyboard = [
-            [InlineKeyboardButton("📊 Мой прогресс", callback_data="my_progress")],
-            [InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = keyboards.LEADERBOARD_KEYBOARD
         
         await update.callback_query.edit_message_text(
             leaderboard_message,
@@ -825,53 +785,23 @@ async def leaderboard(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.error(f"Ошибка при получении таблицы лидеров: {e}")
         await update.callback_query.edit_message_text(
             "❌ Ошибка при получении таблицы лидеров. Попробуйте позже.",
-            reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu")
-            ]])
+            reply_markup=keyboards.BACK_TO_MENU_KEYBOARD
         )
 
 async def coach_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Команда для быстрого доступа к тренеру"""
-    keyboard = [
-        [InlineKeyboardButton("💬 Написать тренеру", url="https://t.me/wip_sxiueohd?start=msk_sk8cool")],
-        [InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await update.message.reply_text(
-        "📞 *Связаться с тренером:*\n\n"
-        "Нажмите кнопку ниже, чтобы открыть чат с тренером!\n\n"
-        "⏰ *Время работы:* 9:00 - 21:00\n"
-        "⚡ *Ответим в течение 30 минут!*\n\n"
-        "При нажатии откроется чат с автоматическим приветственным сообщением! 🚀",
-        reply_markup=reply_markup,
-        parse_mode='Markdown'
-    )
+    screen = keyboards.get_screen('coach_command')
+    await update.message.reply_text(screen.text, reply_markup=screen.reply_markup, parse_mode='Markdown')
 
 async def play_game(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Запуск игры 'Собака на Скейте'"""
     await update.callback_query.answer()
     
-    # Получаем URL для игры (локально или на сервере)
-    game_url = os.getenv('GAME_URL', 'https://web-production-af17e.up.railway.app/game')
-    
-    keyboard = [
-        [InlineKeyboardButton("🎮 Играть!", web_app=WebAppInfo(url=game_url))],
-        [InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
+    # Адрес игры берется из GAME_URL при запуске
+    screen = keyboards.get_screen('play_game')
     await update.callback_query.edit_message_text(
-        "🎮 *Игра 'Собака на Скейте'*\n\n"
-        "🐕 Управляй собакой на скейтборде!\n"
-        "🛹 Прыгай через препятствия!\n"
-        "🏆 Устанавливай рекорды!\n\n"
-        "🎯 *Как играть:*\n"
-        "• Нажми ПРОБЕЛ или кликни для прыжка\n"
-        "• Избегай препятствий\n"
-        "• Собирай очки!\n\n"
-        "Нажми кнопку ниже, чтобы начать игру! 🚀",
-        reply_markup=reply_markup,
+        screen.text,
+        reply_markup=screen.reply_markup,
         parse_mode='Markdown'
     )
 
@@ -888,9 +818,10 @@ async def create_channel_post(update: Update, context: ContextTypes.DEFAULT_TYPE
     # Сначала проверим, может ли бот отправить сообщение в канал
     try:
         test_message = "🧪 Тест отправки сообщения"
-        await context.bot.send_message(
+        await get_send_queue(context).send_message(
             chat_id=channel_id,
-            text=test_message
+            text=test_message,
+            priority=BULK
         )
         await update.message.reply_text("✅ Бот может отправлять сообщения в канал!")
     except Exception as e:
@@ -925,17 +856,166 @@ async def create_channel_post(update: Update, context: ContextTypes.DEFAULT_TYPE
 """
     
     try:
-        await context.bot.send_message(
+        await get_send_queue(context).send_message(
             chat_id=channel_id,
             text=post_text,
             reply_markup=reply_markup,
-            parse_mode='Markdown'
+            parse_mode='Markdown',
+            priority=BULK
         )
         await update.message.reply_text("✅ Пост успешно отправлен в канал!")
     except Exception as e:
         logger.error(f"Ошибка при отправке поста в канал: {e}")
         await update.message.reply_text(f"❌ Ошибка: {e}")
 
+async def broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Рассылка сообщения ученикам: /broadcast [park_id] [ГГГГ-ММ-ДД] текст"""
+    if update.message.from_user.id != ADMIN_ID:
+        await update.message.reply_text("❌ У вас нет прав для этого действия.")
+        return
+    
+    # Текст берем из сообщения целиком, чтобы сохранить переносы строк
+    parts = update.message.text.split(maxsplit=1)
+    text = parts[1] if len(parts) > 1 else ""
+    
+    park_id = date = None
+    first, _, rest = text.partition(" ")
+    if first in PARKS:
+        park_id, text = first, rest.lstrip()
+        first, _, rest = text.partition(" ")
+    try:
+        datetime.strptime(first, "%Y-%m-%d")
+        date, text = first, rest.lstrip()
+    except ValueError:
+        pass
+    
+    if not text:
+        await update.message.reply_text(
+            "📢 *Рассылка ученикам*\n\n"
+            "`/broadcast [park_id] [ГГГГ-ММ-ДД] текст`\n\n"
+            "Без фильтров сообщение получат все ученики, с фильтрами - те, "
+            "у кого была тренировка или запись в этом парке и/или в этот день.\n"
+            "Повтор той же команды продолжит рассылку и пропустит тех, кто уже получил сообщение.",
+            parse_mode='Markdown'
+        )
+        return
+    
+    engine = get_broadcast_engine(context)
+    broadcast_id = engine.broadcast_id(text, park_id, date)
+    task = engine.start(text, park_id, date)
+    await update.message.reply_text(f"📢 Рассылка {broadcast_id} запущена")
+    
+    async def report_when_done():
+        parse_mode = 'Markdown'
+        try:
+            report = await task
+            message = (
+                f"📢 *Рассылка {broadcast_id} завершена*\n\n"
+                f"• Получателей: {report['recipients']}\n"
+                f"• Доставлено: {report['delivered']}\n"
+                f"• Заблокировали бота: {report['blocked']}\n"
+                f"• Ошибок: {report['failed']}\n"
+                f"• Пропущено (уже получили): {report['skipped']}"
+            )
+        except Exception as e:
+            logger.error(f"Ошибка рассылки {broadcast_id}: {e}")
+            message = f"❌ Рассылка {broadcast_id} прервана: {e}"
+            # Текст ошибки может содержать символы разметки
+            parse_mode = None
+        await get_send_queue(context).send_message(
+            chat_id=ADMIN_ID,
+            text=message,
+            priority=ADMIN,
+            parse_mode=parse_mode
+        )
+    
+    context.application.create_task(report_when_done())
+
+async def web_app_data(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Данные из игры 'Собака на Скейте' (Telegram.WebApp.sendData)"""
+    message = update.effective_message
+    user = update.effective_user
+    
+    try:
+        payload = json.loads(message.web_app_data.data)
+        action = payload.get('action')
+    except (ValueError, AttributeError):
+        logger.warning(f"Некорректные данные из игры от {user.id}")
+        return
+    
+    game_scores = get_game_scores(context)
+    
+    if action == 'game_score':
+        try:
+            result = game_scores.submit(user.id, user.first_name, user.username or "Не указан", payload)
+        except InvalidScore as e:
+            logger.warning(f"Результат игры от {user.id} отклонен: {e}")
+            await message.reply_text("🤔 Не получилось засчитать результат. Попробуй сыграть еще раз!")
+            return
+        
+        if result['new_best']:
+            text = f"🎉 *Новый рекорд: {result['best']}!*\n\n"
+        else:
+            text = f"🐕🛹 *Результат: {result['score']}*\n🏅 Твой рекорд: {result['best']}\n\n"
+        text += f"🏆 Место в таблице: {result['rank']} из {result['players']}"
+        await message.reply_text(text, parse_mode='Markdown')
+    
+    elif action == 'show_leaderboard':
+        await message.reply_text(game_scores.format_leaderboard_message(), parse_mode='Markdown')
+    
+    elif action == 'share_result':
+        best = game_scores.best(user.id)
+        await message.reply_text(
+            f"🐕🛹 Мой рекорд в игре 'Собака на Скейте' от MSK SK8COOL: *{best or payload.get('score', 0)}*!\n"
+            f"Сможешь больше? 😎",
+            parse_mode='Markdown'
+        )
+
+async def admin_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Служебная статистика бота для админа"""
+    if update.message.from_user.id != ADMIN_ID:
+        await update.message.reply_text("❌ У вас нет прав для этого действия.")
+        return
+    
+    cache_stats = get_progress_system(context).render_cache.stats()
+    reminder_stats = get_reminder_system(context).stats()
+    queue_stats = get_send_queue(context).stats()
+    capacity_stats = get_slot_capacity(context).stats()
+    booking_stats = get_booking_database(context).get_statistics()
+    
+    await update.message.reply_text(
+        f"📈 *Статистика бота*\n\n"
+        f"🗂️ *Кэш сообщений прогресса:*\n"
+        f"• Попадания: {cache_stats['hits']}\n"
+        f"• Промахи: {cache_stats['misses']}\n"
+        f"• Доля попаданий: {cache_stats['hit_rate']:.0%}\n"
+        f"• Записей в кэше: {cache_stats['size']}\n\n"
+        f"⏰ *Напоминания:*\n"
+        f"• Запланировано сейчас: {reminder_stats['live']}\n"
+        f"• Ближайшее: {reminder_stats['next_fire'] or '—'}\n"
+        f"• Отправлено: {reminder_stats['sent']}, ошибок: {reminder_stats['failed']}\n"
+        f"• Дубли отклонены: {reminder_stats['duplicates']}, отменено: {reminder_stats['cancelled']}\n\n"
+        f"📤 *Очередь сообщений:*\n"
+        f"• В очереди: {sum(queue_stats['depth'].values())} "
+        f"(админ {queue_stats['depth']['admin']}, пользователи {queue_stats['depth']['user']}, "
+        f"рассылки {queue_stats['depth']['bulk']})\n"
+        f"• Отправлено: {queue_stats['sent']}, повторов: {queue_stats['retried']}, "
+        f"ошибок: {queue_stats['failed']}\n\n"
+        f"👥 *Места в группах:*\n"
+        f"• Занято: {capacity_stats['booked']}, удерживается: {capacity_stats['held']}\n"
+        f"• Заполненных групп: {capacity_stats['full_slots']}, отказов из-за нехватки мест: {capacity_stats['full']}\n\n"
+        f"📝 *Записи:*\n"
+        f"• Всего: {booking_stats['total']}, ждут решения: {booking_stats['pending']}\n"
+        f"• Подтверждено: {booking_stats['confirmed']}, отклонено: {booking_stats['rejected']}, "
+        f"отменено: {booking_stats['cancelled']}, истекло: {booking_stats['expired']}",
+        parse_mode='Markdown'
+    )
+
+async def stale_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Кнопка из старого сообщения или с неизвестными данными"""
+    # Сообщение не меняется: в старых заявках у админа текст заявки - единственная ее копия
+    await update.callback_query.answer("Кнопка устарела. Откройте меню заново: /start", show_alert=True)
+
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик ошибок"""
     logger.error(f"Ошибка при обработке обновления {update}: {context.error}")
@@ -1,112 +1,310 @@
-from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-from config import PARKS, TIME_SLOTS
+"""
+Клавиатуры и статичные экраны бота
 
-def get_main_keyboard():
+Все, что зависит только от PARKS, TIME_SLOTS и DAY_PERIODS, строится один
+раз при импорте модуля, и обработчики получают готовые объекты. Клавиатура
+выбора даты строится один раз на календарный день, клавиатура выбора
+времени - один раз на каждое сочетание свободных мест.
+"""
+
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, WebAppInfo
+
+from callbacks import callback_data
+from config import DAY_PERIODS, GAME_URL, PARKS
+
+# Сколько дней вперед доступна запись
+BOOKING_DAYS = 7
+
+DAY_NAMES = ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота', 'Воскресенье']
+DAY_SHORT_NAMES = ['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс']
+MONTH_NAMES = ['января', 'февраля', 'марта', 'апреля', 'мая', 'июня',
+               'июля', 'августа', 'сентября', 'октября', 'ноября', 'декабря']
+MONTH_SHORT_NAMES = ['янв', 'фев', 'мар', 'апр', 'май', 'июн',
+                     'июл', 'авг', 'сен', 'окт', 'ноя', 'дек']
+
+EQUIPMENT_TEXT = {
+    'protection': '🛡️ Защита',
+    'skateboard': '🛹 Скейтборд',
+    'both': '🛡️🛹 Защита + Скейтборд',
+    'none': '✨ У меня всё есть'
+}
+
+
+class Screen(NamedTuple):
+    """Готовый экран: текст в Markdown и клавиатура"""
+    text: str
+    reply_markup: InlineKeyboardMarkup
+
+
+def _markup(*rows: List[InlineKeyboardButton]) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(list(rows))
+
+
+MAIN_MENU_BUTTON = [InlineKeyboardButton("🔙 Главное меню", callback_data="main_menu")]
+HOME_BUTTON = [InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")]
+
+BACK_TO_MENU_KEYBOARD = _markup(MAIN_MENU_BUTTON)
+HOME_KEYBOARD = _markup(HOME_BUTTON)
+
+MAIN_KEYBOARD = _markup(
+    [InlineKeyboardButton("🏂 Записаться на тренировку", callback_data="training_info")],
+    [InlineKeyboardButton("🎮 Играть в игру", callback_data="play_game")],
+    [InlineKeyboardButton("📊 Мой прогресс", callback_data="my_progress")],
+    [InlineKeyboardButton("🏆 Таблица лидеров", callback_data="leaderboard")],
+    [InlineKeyboardButton("🏫 О школе", callback_data="about_school")],
+    [InlineKeyboardButton("📞 Связаться с тренером", callback_data="contact_coach")]
+)
+
+PARK_SELECTION_KEYBOARD = _markup(
+    *[[InlineKeyboardButton(f"📍 {park_info['name']}", callback_data=callback_data("park", park_id))]
+      for park_id, park_info in PARKS.items()],
+    MAIN_MENU_BUTTON
+)
+
+PARK_INFO_KEYBOARDS: Dict[str, InlineKeyboardMarkup] = {
+    park_id: _markup(
+        [InlineKeyboardButton("🗺️ Открыть карту", url=park_info['yandex_maps'])],
+        [InlineKeyboardButton("✅ Выбрать этот парк", callback_data=callback_data("confirm_park", park_id))],
+        [InlineKeyboardButton("🔄 Выбрать другой парк", callback_data="select_park")],
+        MAIN_MENU_BUTTON
+    )
+    for park_id, park_info in PARKS.items()
+}
+
+PERIOD_KEYBOARD = _markup(
+    [InlineKeyboardButton("☀️ День", callback_data=callback_data("period", "day"))],
+    [InlineKeyboardButton("🌙 Вечер", callback_data=callback_data("period", "evening"))],
+    [InlineKeyboardButton("🔄 Другая дата", callback_data="select_park")],
+    HOME_BUTTON
+)
+
+EQUIPMENT_CHECK_KEYBOARD = _markup(
+    [InlineKeyboardButton("✅ Да, у меня всё есть", callback_data=callback_data("equipment_check", "yes"))],
+    [InlineKeyboardButton("❌ Нет, нужна помощь", callback_data=callback_data("equipment_check", "no"))],
+    [InlineKeyboardButton("🔄 Другое время", callback_data="select_park")],
+    HOME_BUTTON
+)
+
+EQUIPMENT_KEYBOARD = _markup(
+    [InlineKeyboardButton("🛡️ Защита", callback_data=callback_data("equipment", "protection"))],
+    [InlineKeyboardButton("🛹 Скейтборд", callback_data=callback_data("equipment", "skateboard"))],
+    [InlineKeyboardButton("🛡️🛹 Защита + Скейтборд", callback_data=callback_data("equipment", "both"))],
+    [InlineKeyboardButton("🔄 Другое время", callback_data="select_park")],
+    HOME_BUTTON
+)
+
+CONFIRMATION_KEYBOARD = _markup(
+    [InlineKeyboardButton("✅ Подтвердить запись", callback_data="final_confirm")],
+    [InlineKeyboardButton("❌ Отменить", callback_data="booking_cancel")],
+    HOME_BUTTON
+)
+
+PROGRESS_KEYBOARD = _markup(
+    [InlineKeyboardButton("🏆 Таблица лидеров", callback_data="leaderboard")],
+    MAIN_MENU_BUTTON
+)
+
+LEADERBOARD_KEYBOARD = _markup(
+    [InlineKeyboardButton("📊 Мой прогресс", callback_data="my_progress")],
+    MAIN_MENU_BUTTON
+)
+
+SCREENS: Dict[str, Screen] = {
+    'welcome': Screen(
+        "🛹 *Добро пожаловать в MSK SK8COOL!*\n\n"
+        "Мы - школа скейтбординга в Москве! 🏂\n"
+        "Выберите, что вас интересует:",
+        MAIN_KEYBOARD
+    ),
+    'main_menu': Screen(
+        "🛹 *MSK SK8COOL - Главное меню*\n\n"
+        "Выберите, что вас интересует:",
+        MAIN_KEYBOARD
+    ),
+    'training_info': Screen(
+        "🏂 *Как проходят тренировки:*\n\n"
+        "• Групповые занятия 2-4 человека\n"
+        "• Индивидуальные тренировки\n"
+        "• Длительность: 1-1.5 часа\n"
+        "• Опытные тренеры с сертификатами\n"
+        "• Все уровни: от новичков до продвинутых\n\n"
+        "Давайте выберем парк для тренировки! 🎯",
+        _markup([InlineKeyboardButton("📍 Выбрать парк", callback_data="select_park")], MAIN_MENU_BUTTON)
+    ),
+    'about_school': Screen(
+        "🏫 *О школе MSK SK8COOL:*\n\n"
+        "Мы обучаем скейтбордингу с 2020 года! 🎓\n\n"
+        "• Более 500 учеников\n"
+        "• 5+ опытных тренеров\n"
+        "• Занятия в лучших парках Москвы\n"
+        "• Безопасность превыше всего\n"
+        "• Индивидуальный подход к каждому\n\n"
+        "Присоединяйтесь к нашей команде! 🚀",
+        BACK_TO_MENU_KEYBOARD
+    ),
+    'contact_coach': Screen(
+        "📞 *Связаться с тренером:*\n\n"
+        "Нажмите кнопку ниже, чтобы открыть чат с тренером!\n\n"
+        "⏰ *Время работы:* 9:00 - 21:00\n"
+        "⚡ *Ответим в течение 30 минут!*\n\n"
+        "При нажатии откроется чат с автоматическим приветственным сообщением! 🚀",
+        _markup(
+            [InlineKeyboardButton("💬 Написать тренеру", url="https://t.me/wip_sxiueohd?start=msk_sk8cool")],
+            MAIN_MENU_BUTTON
+        )
+    ),
+    'coach_command': Screen(
+        "📞 *Связаться с тренером:*\n\n"
+        "Нажмите кнопку ниже, чтобы открыть чат с тренером!\n\n"
+        "⏰ *Время работы:* 9:00 - 21:00\n"
+        "⚡ *Ответим в течение 30 минут!*\n\n"
+        "При нажатии откроется чат с автоматическим приветственным сообщением! 🚀",
+        _markup(
+            [InlineKeyboardButton("💬 Написать тренеру", url="https://t.me/wip_sxiueohd?start=msk_sk8cool")],
+            HOME_BUTTON
+        )
+    ),
+    'select_park': Screen(
+        "📍 *Выберите парк для тренировки:*\n\n"
+        "У нас есть несколько отличных локаций в разных районах Москвы! 🏞️",
+        PARK_SELECTION_KEYBOARD
+    ),
+    'play_game': Screen(
+        "🎮 *Игра 'Собака на Скейте'*\n\n"
+        "🐕 Управляй собакой на скейтборде!\n"
+        "🛹 Прыгай через препятствия!\n"
+        "🏆 Устанавливай рекорды!\n\n"
+        "🎯 *Как играть:*\n"
+        "• Нажми ПРОБЕЛ или кликни для прыжка\n"
+        "• Избегай препятствий\n"
+        "• Собирай очки!\n\n"
+        "Нажми кнопку ниже, чтобы начать игру! 🚀",
+        _markup([InlineKeyboardButton("🎮 Играть!", web_app=WebAppInfo(url=GAME_URL))], MAIN_MENU_BUTTON)
+    ),
+    'booking_cancelled': Screen(
+        "❌ Запись отменена.\n\n"
+        "Можете начать заново или вернуться в главное меню.",
+        HOME_KEYBOARD
+    ),
+}
+
+
+def get_screen(name: str) -> Screen:
+    """Статичный экран по имени"""
+    return SCREENS[name]
+
+
+def get_main_keyboard() -> InlineKeyboardMarkup:
     """Главная клавиатура"""
-    keyboard = [
-        [InlineKeyboardButton("🏃‍♂️ Как проходят тренировки", callback_data="training_info")],
-        [InlineKeyboardButton("📍 Выбрать парк", callback_data="select_park")],
-        [InlineKeyboardButton("📅 Записаться на тренировку", callback_data="book_training")],
-        [InlineKeyboardButton("ℹ️ О скейтшколе", callback_data="about_school")],
-        [InlineKeyboardButton("📞 Связаться с тренером", callback_data="contact_coach")]
-    ]
-    return InlineKeyboardMarkup(keyboard)
-
-def get_park_selection_keyboard():
+    return MAIN_KEYBOARD
+
+
+def get_park_selection_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура выбора парка"""
-    keyboard = []
-    for park_id, park_info in PARKS.items():
-        keyboard.append([
-            InlineKeyboardButton(
-                f"{park_info['name']}", 
-                callback_data=f"park_{park_id}"
-            )
-        ])
-    keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data="main_menu")])
-    return InlineKeyboardMarkup(keyboard)
-
-def get_park_info_keyboard(park_id):
+    return PARK_SELECTION_KEYBOARD
+
+
+def get_park_info_keyboard(park_id: str) -> InlineKeyboardMarkup:
     """Клавиатура с информацией о парке"""
-    keyboard = [
-        [InlineKeyboardButton("🗺️ Открыть в Яндекс.Картах", url=PARKS[park_id]['yandex_maps'])],
-        [InlineKeyboardButton("✅ Выбрать этот парк", callback_data=f"confirm_park_{park_id}")],
-        [InlineKeyboardButton("🔄 Выбрать другой парк", callback_data="select_park")],
-        [InlineKeyboardButton("🔙 Назад", callback_data="main_menu")]
-    ]
-    return InlineKeyboardMarkup(keyboard)
-
-def get_date_selection_keyboard():
-    """Клавиатура выбора даты"""
-    from datetime import datetime, timedelta
-    
-    keyboard = []
-    today = datetime.now()
-    
-    # Показываем следующие 7 дней
-    for i in range(1, 8):
-        date = today + timedelta(days=i)
-        day_name = date.strftime("%A")
-        date_str = date.strftime("%d.%m")
-        
-        # Переводим дни недели на русский
-        day_translations = {
-            'Monday': 'Пн', 'Tuesday': 'Вт', 'Wednesday': 'Ср',
-            'Thursday': 'Чт', 'Friday': 'Пт', 'Saturday': 'Сб', 'Sunday': 'Вс'
-        }
-        
-        day_ru = day_translations.get(day_name, day_name)
-        keyboard.append([
-            InlineKeyboardButton(
-                f"{day_ru} {date_str}", 
-                callback_data=f"date_{date.strftime('%Y-%m-%d')}"
-            )
-        ])
-    
-    keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data="select_park")])
-    return InlineKeyboardMarkup(keyboard)
-
-def get_time_selection_keyboard():
-    """Клавиатура выбора времени"""
-    keyboard = []
-    row = []
-    
-    for i, time in enumerate(TIME_SLOTS):
-        row.append(InlineKeyboardButton(time, callback_data=f"time_{time}"))
-        if len(row) == 3:  # 3 времени в ряд
-            keyboard.append(row)
-            row = []
-    
-    if row:  # Добавляем оставшиеся
-        keyboard.append(row)
-    
-    keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data="select_date")])
-    return InlineKeyboardMarkup(keyboard)
-
-def get_equipment_keyboard():
+    return PARK_INFO_KEYBOARDS[park_id]
+
+
+class BookingDay(NamedTuple):
+    """День, доступный для записи"""
+    date: str       # YYYY-MM-DD
+    label: str      # подпись кнопки
+    display: str    # название дня в тексте сообщений
+
+
+@lru_cache(maxsize=2)
+def _booking_days(today: date) -> Tuple[Tuple[BookingDay, ...], InlineKeyboardMarkup]:
+    """Дни записи и клавиатура выбора даты, построенные для одного календарного дня"""
+    days = []
+    rows = []
+    for i in range(1, BOOKING_DAYS + 1):
+        day = today + timedelta(days=i)
+        if i == 1:
+            label = "🎯 Завтра"
+            display = "Завтра"
+        else:
+            label = f"📋 {DAY_SHORT_NAMES[day.weekday()]}, {day:%d} {MONTH_SHORT_NAMES[day.month - 1]}"
+            display = f"{DAY_NAMES[day.weekday()]}, {day:%d} {MONTH_NAMES[day.month - 1]}"
+        days.append(BookingDay(day.isoformat(), label, display))
+        rows.append([InlineKeyboardButton(label, callback_data=callback_data("date", i))])
+
+    rows.append([InlineKeyboardButton("🔄 Другой парк", callback_data="select_park")])
+    rows.append(HOME_BUTTON)
+    return tuple(days), InlineKeyboardMarkup(rows)
+
+
+def get_date_selection_keyboard() -> InlineKeyboardMarkup:
+    """Клавиатура выбора даты (строится один раз в день)"""
+    return _booking_days(date.today())[1]
+
+
+def get_booking_day(days_ahead: int) -> Optional[BookingDay]:
+    """
+    Дата и ее название для кнопки date_<days_ahead>_days или None, если
+    такой кнопки нет в клавиатуре (старая или подделанная кнопка)
+    """
+    days = _booking_days(date.today())[0]
+    if not 1 <= days_ahead <= len(days):
+        return None
+    return days[days_ahead - 1]
+
+
+@lru_cache(maxsize=512)
+def get_time_selection_keyboard(period: str, free: Tuple[int, ...]) -> InlineKeyboardMarkup:
+    """
+    Клавиатура выбора времени в периоде дня; free - свободные места по
+    слотам периода в порядке DAY_PERIODS[period]['times']
+    """
+    emoji = "☀️" if period == 'day' else "🌙"
+    rows = []
+    for time_slot, seats in zip(DAY_PERIODS[period]['times'], free):
+        label = f"{emoji} {time_slot} · мест: {seats}" if seats > 0 else f"🚫 {time_slot} · мест нет"
+        rows.append([InlineKeyboardButton(label, callback_data=callback_data("time", time_slot))])
+
+    rows.append([InlineKeyboardButton("🔄 Другой период", callback_data="select_park")])
+    rows.append(HOME_BUTTON)
+    return InlineKeyboardMarkup(rows)
+
+
+def get_period_keyboard() -> InlineKeyboardMarkup:
+    """Клавиатура выбора периода дня"""
+    return PERIOD_KEYBOARD
+
+
+def get_equipment_check_keyboard() -> InlineKeyboardMarkup:
+    """Клавиатура вопроса о наличии оборудования"""
+    return EQUIPMENT_CHECK_KEYBOARD
+
+
+def get_equipment_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура выбора оборудования"""
-    keyboard = [
-        [InlineKeyboardButton("🛡️ Да, нужна защита", callback_data="equipment_protection")],
-        [InlineKeyboardButton("🛹 Да, нужен скейт", callback_data="equipment_skateboard")],
-        [InlineKeyboardButton("🛡️🛹 Нужно и то, и другое", callback_data="equipment_both")],
-        [InlineKeyboardButton("❌ Ничего не нужно", callback_data="equipment_none")],
-        [InlineKeyboardButton("🔙 Назад", callback_data="select_time")]
-    ]
-    return InlineKeyboardMarkup(keyboard)
-
-def get_confirmation_keyboard():
+    return EQUIPMENT_KEYBOARD
+
+
+def get_confirmation_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура подтверждения записи"""
-    keyboard = [
-        [InlineKeyboardButton("✅ Подтвердить запись", callback_data="confirm_booking")],
-        [InlineKeyboardButton("❌ Отменить", callback_data="cancel_booking")],
-        [InlineKeyboardButton("🔙 Назад", callback_data="select_equipment")]
-    ]
-    return InlineKeyboardMarkup(keyboard)
-
-def get_admin_confirmation_keyboard(user_id, booking_data):
-    """Клавиатура для админа подтверждения записи"""
-    keyboard = [
-        [InlineKeyboardButton("✅ Подтвердить", callback_data=f"admin_confirm_{user_id}")],
-        [InlineKeyboardButton("❌ Отклонить", callback_data=f"admin_reject_{user_id}")],
-        [InlineKeyboardButton("📞 Связаться", callback_data=f"admin_contact_{user_id}")]
-    ]
-    return InlineKeyboardMarkup(keyboard)
+    return CONFIRMATION_KEYBOARD
+
+
+def get_admin_confirmation_keyboard(booking_id: str) -> InlineKeyboardMarkup:
+    """Клавиатура для админа подтверждения записи (данные заявки хранятся в BookingDatabase)"""
+    return _markup(
+        [InlineKeyboardButton("✅ Подтвердить", callback_data=callback_data("admin_approve", booking_id))],
+        [InlineKeyboardButton("❌ Отклонить", callback_data=callback_data("admin_reject", booking_id))]
+    )
+
+
+def get_booking_cancel_keyboard(booking_id: str) -> InlineKeyboardMarkup:
+    """Клавиатура пользователя для отмены отправленной заявки"""
+    return _markup(
+        [InlineKeyboardButton("❌ Отменить заявку", callback_data=callback_data("cancel_booking", booking_id))],
+        HOME_BUTTON
+    )
@@ -3,56 +3,219 @@
 MSK SK8COOL - Минимальный тестовый бот
 """
 
+import asyncio
 import logging
-import os
+import signal
 from telegram import Update
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler
-from config import BOT_TOKEN, ADMIN_ID
-from handlers import start, training_info, about_school, contact_coach, main_menu, select_park, show_park_info, confirm_park, select_date, select_period, select_time, equipment_check, equipment_selection, confirm_booking, final_booking_confirm, booking_cancel, admin_approve, admin_reject, my_progress, leaderboard, coach_command, play_game, create_channel_post, error_handler
-from web_server import start_web_server
+from telegram.ext import Application, CommandHandler, MessageHandler, filters
+from config import BOT_TOKEN, ADMIN_ID, PORT, WEBHOOK_URL, WEBHOOK_SECRET
+from progress import create_progress_system
+from reminders import ReminderSystem, create_reminder_store
+from send_queue import SendQueue
+from database import create_booking_database
+from broadcast import BroadcastEngine
+from game_scores import GameScores
+from capacity import SlotCapacity
+from expiry import BookingExpirer
+from persistence import UserStatePersistence
+from callbacks import BookingRef, CallbackRouter, DateChoice, EquipmentChoice, ParkChoice, PeriodChoice, TimeChoice
+from handlers import start, training_info, about_school, contact_coach, main_menu, select_park, show_park_info, confirm_park, select_date, select_period, select_time, equipment_check, equipment_selection, confirm_booking, final_booking_confirm, booking_cancel, cancel_booking, admin_approve, admin_reject, my_progress, leaderboard, coach_command, play_game, create_channel_post, admin_stats, broadcast, web_app_data, stale_button, error_handler
+from web_server import Request, Response, add_score_routes, create_web_server
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+async def post_init(application: Application):
+    """Запускает веб-сервер и очередь сообщений, восстанавливает и запускает напоминания"""
+    await application.bot_data['web_server'].start()
+    application.bot_data['send_queue'].start()
+    reminder_system = application.bot_data['reminder_system']
+    reminder_system.rehydrate()
+    reminder_system.start()
+    
+    # Заявки без решения тренера истекают и освобождают места
+    application.bot_data['booking_expirer'].start()
+    
+    # Рассылки, прерванные остановкой бота, продолжаются с места остановки
+    await application.bot_data['broadcast_engine'].resume_unfinished()
+
+
+async def post_stop(application: Application):
+    """
+    Останавливает отправку сообщений. Вызывается после Application.stop(),
+    но до shutdown(), пока HTTP-клиент бота еще открыт: сообщения,
+    оставшиеся в очереди, успевают уйти
+    """
+    # Сначала перестаем принимать HTTP-запросы, чтобы они не шли в закрытые хранилища
+    web_server = application.bot_data.get('web_server')
+    if web_server is not None:
+        await web_server.stop()
+    
+    reminder_system = application.bot_data.get('reminder_system')
+    if reminder_system is not None:
+        await reminder_system.stop()
+    
+    booking_expirer = application.bot_data.get('booking_expirer')
+    if booking_expirer is not None:
+        await booking_expirer.stop()
+    
+    broadcast_engine = application.bot_data.get('broadcast_engine')
+    if broadcast_engine is not None:
+        await broadcast_engine.stop()
+    
+    send_queue = application.bot_data.get('send_queue')
+    if send_queue is not None:
+        await send_queue.stop()
+        logger.info(f"Очередь сообщений: {send_queue.stats()}")
+
+
+async def post_shutdown(application: Application):
+    """Сохраняет отложенные изменения и закрывает хранилища при остановке бота"""
+    progress_system = application.bot_data.get('progress_system')
+    if progress_system is not None:
+        logger.info(f"Кэш сообщений прогресса: {progress_system.render_cache.stats()}")
+        await progress_system.aflush()
+        progress_system.close()
+    
+    reminder_system = application.bot_data.get('reminder_system')
+    if reminder_system is not None:
+        reminder_system.close()
+    
+    booking_db = application.bot_data.get('booking_db')
+    if booking_db is not None:
+        booking_db.close()
+    
+    game_scores = application.bot_data.get('game_scores')
+    if game_scores is not None:
+        game_scores.close()
+
+
+def add_webhook_route(web_server, application: Application):
+    """POST /webhook: обновления от Telegram передаются в очередь обновлений приложения"""
+    
+    async def webhook(request: Request) -> Response:
+        if request.headers.get('x-telegram-bot-api-secret-token') != WEBHOOK_SECRET:
+            return Response.error(403)
+        if not application.running:
+            return Response.error(503)
+        try:
+            update = Update.de_json(request.json(), application.bot)
+        except ValueError:
+            return Response.error(400)
+        # Обработка идет в фоне; Telegram получает ответ сразу
+        await application.update_queue.put(update)
+        return Response(200)
+    
+    web_server.add_route("POST", "/webhook", webhook)
+
+
+async def run_webhook(application: Application):
+    """
+    Работа через webhook: обновления приходят на веб-сервер бота,
+    поэтому игра, API и webhook обслуживаются одним портом и одним event loop
+    """
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+    
+    await application.initialize()
+    try:
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+        await application.bot.set_webhook(
+            url=WEBHOOK_URL, secret_token=WEBHOOK_SECRET, allowed_updates=Update.ALL_TYPES
+        )
+        logger.info(f"🔗 Webhook: {WEBHOOK_URL}")
+        await stop_event.wait()
+    finally:
+        if application.running:
+            await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
 
 def main():
     """Основная функция"""
     logger.info("🚀 Запуск бота MSK SK8COOL с игрой...")
     
-    # Запускаем веб-сервер для игры
-    port = int(os.getenv('PORT', 8080))
-    start_web_server(port=port)
-    
     # Создаем приложение
-    application = Application.builder().token(BOT_TOKEN).build()
+    # Состояние записи на тренировку (context.user_data) переживает перезапуск
+    application = (
+        Application.builder().token(BOT_TOKEN).persistence(UserStatePersistence())
+        .post_init(post_init).post_stop(post_stop).post_shutdown(post_shutdown).build()
+    )
+    
+    # Веб-сервер игры работает в event loop бота и запускается в post_init
+    web_server = create_web_server(PORT)
+    application.bot_data['web_server'] = web_server
+    if WEBHOOK_URL:
+        add_webhook_route(web_server, application)
+    
+    # Общая система прогресса на весь процесс
+    application.bot_data['progress_system'] = create_progress_system()
+    
+    # Напоминания хранятся на диске и восстанавливаются в post_init
+    # Все исходящие сообщения идут через общую очередь с ограничением частоты
+    application.bot_data['send_queue'] = SendQueue(application.bot)
+    application.bot_data['reminder_system'] = ReminderSystem(
+        application.bot, create_reminder_store(), send_queue=application.bot_data['send_queue']
+    )
+    application.bot_data['booking_db'] = create_booking_database()
+    application.bot_data['broadcast_engine'] = BroadcastEngine(
+        application.bot_data['send_queue'], application.bot_data['progress_system'],
+        application.bot_data['booking_db']
+    )
+    application.bot_data['game_scores'] = GameScores()
+    # Места в группах: занятые существующими записями и временные удержания
+    application.bot_data['slot_capacity'] = SlotCapacity()
+    application.bot_data['slot_capacity'].load(application.bot_data['booking_db'].iter_bookings())
+    application.bot_data['booking_expirer'] = BookingExpirer(
+        application.bot_data['booking_db'], application.bot_data['slot_capacity'],
+        application.bot_data['send_queue']
+    )
+    add_score_routes(web_server, application.bot_data['game_scores'], BOT_TOKEN)
     
     # Добавляем обработчики команд
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("coach", coach_command))
     application.add_handler(CommandHandler("post", create_channel_post))
+    application.add_handler(CommandHandler("stats", admin_stats))
+    application.add_handler(CommandHandler("broadcast", broadcast))
+    
+    # Все inline-кнопки разбирает один маршрутизатор: действие ищется в словаре,
+    # а поля из callback_data передаются обработчику в context.payload
+    router = CallbackRouter(fallback=stale_button)
+    router.add("training_info", training_info)
+    router.add("about_school", about_school)
+    router.add("contact_coach", contact_coach)
+    router.add("main_menu", main_menu)
+    router.add("select_park", select_park)
+    router.add("park", show_park_info, ParkChoice)
+    router.add("confirm_park", confirm_park, ParkChoice)
+    router.add("date", select_date, DateChoice)
+    router.add("period", select_period, PeriodChoice)
+    router.add("time", select_time, TimeChoice)
+    router.add("equipment_check", equipment_check, EquipmentChoice)
+    router.add("equipment", equipment_selection, EquipmentChoice)
+    router.add("final_confirm", final_booking_confirm)
+    router.add("booking_cancel", booking_cancel)
+    router.add("admin_approve", admin_approve, BookingRef)
+    router.add("admin_reject", admin_reject, BookingRef)
+    router.add("cancel_booking", cancel_booking, BookingRef)
+    router.add("my_progress", my_progress)
+    router.add("leaderboard", leaderboard)
+    router.add("play_game", play_game)
+    application.add_handler(router)
     
-    # Добавляем обработчики callback-запросов
-    application.add_handler(CallbackQueryHandler(training_info, pattern="^training_info$"))
-    application.add_handler(CallbackQueryHandler(about_school, pattern="^about_school$"))
-    application.add_handler(CallbackQueryHandler(contact_coach, pattern="^contact_coach$"))
-    application.add_handler(CallbackQueryHandler(main_menu, pattern="^main_menu$"))
-    application.add_handler(CallbackQueryHandler(select_park, pattern="^select_park$"))
-    application.add_handler(CallbackQueryHandler(show_park_info, pattern="^park_"))
-    application.add_handler(CallbackQueryHandler(confirm_park, pattern="^confirm_park_"))
-    application.add_handler(CallbackQueryHandler(select_date, pattern="^date_"))
-    application.add_handler(CallbackQueryHandler(select_period, pattern="^period_"))
-    application.add_handler(CallbackQueryHandler(select_time, pattern="^time_"))
-    application.add_handler(CallbackQueryHandler(equipment_check, pattern="^equipment_(yes|no)$"))
-    application.add_handler(CallbackQueryHandler(equipment_selection, pattern="^equipment_(protection|skateboard|both)$"))
-    application.add_handler(CallbackQueryHandler(final_booking_confirm, pattern="^final_confirm$"))
-    application.add_handler(CallbackQueryHandler(booking_cancel, pattern="^booking_cancel$"))
-    application.add_handler(CallbackQueryHandler(admin_approve, pattern="^admin_approve_"))
-    application.add_handler(CallbackQueryHandler(admin_reject, pattern="^admin_reject_"))
-    application.add_handler(CallbackQueryHandler(my_progress, pattern="^my_progress$"))
-    application.add_handler(CallbackQueryHandler(leaderboard, pattern="^leaderboard$"))
-    application.add_handler(CallbackQueryHandler(play_game, pattern="^play_game$"))
+    # Результаты и события из игры
+    application.add_handler(MessageHandler(filters.StatusUpdate.WEB_APP_DATA, web_app_data))
     
     # Обработчик ошибок
     application.add_error_handler(error_handler)
@@ -61,7 +224,10 @@ def main():
     logger.info("✅ Бот запущен!")
     
     try:
-        application.run_polling()
+        if WEBHOOK_URL:
+            asyncio.run(run_webhook(application))
+        else:
+            application.run_polling()
     except Exception as e:
         logger.error(f"❌ Ошибка: {e}")
 
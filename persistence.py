@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Сохранение состояния пользователей между перезапусками MSK SK8COOL
+"""
+
+import json
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Optional, Set
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from sqlite_backend import connect
+
+logger = logging.getLogger(__name__)
+
+# Как часто PTB передает измененные user_data, с
+PERSISTENCE_INTERVAL = 5
+
+
+class UserStatePersistence(BasePersistence):
+    """
+    Persistence для PTB, которое хранит только context.user_data в SQLite.
+
+    В user_data живет состояние записи на тренировку (парк, дата, время),
+    и без сохранения перезапуск посреди записи терял его. bot_data не
+    сохраняется: там общие объекты процесса (очереди, хранилища, веб-сервер).
+
+    - При запуске ничего не читается: get_user_data возвращает пустой
+      словарь, а данные пользователя подгружаются одним запросом по
+      первичному ключу в refresh_user_data, когда от него приходит первое
+      обновление.
+    - PTB раз в update_interval секунд передает user_data пользователей,
+      чьи обновления обрабатывались. В базу попадают только записи,
+      которые действительно изменились: сериализованное значение
+      сравнивается с последним сохраненным.
+    - Изменения копятся в памяти и раз в save_delay секунд пишутся
+      одной транзакцией из потока таймера, не блокируя event loop.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS user_state (
+            user_id INTEGER PRIMARY KEY,
+            data TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, db_file: str = "user_state.db", update_interval: float = PERSISTENCE_INTERVAL,
+                 save_delay: float = 1.0):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        self.save_delay = save_delay
+        # _lock защищает накопленные изменения и таймер и держится недолго;
+        # _conn_lock - соединение, которое используется и из потока таймера
+        self._lock = threading.Lock()
+        self._conn_lock = threading.Lock()
+        self.conn = connect(db_file)
+        self.conn.executescript(self.SCHEMA)
+
+        # Пользователи, чьи данные уже подгружены, и последнее сохраненное значение
+        self._loaded: Set[int] = set()
+        self._stored: Dict[int, str] = {}
+        # user_id -> новое значение или None для удаления
+        self._dirty: Dict[int, Optional[str]] = {}
+        self._save_timer: Optional[threading.Timer] = None
+
+        self.counters = {"loaded": 0, "written": 0, "unchanged": 0}
+
+    async def get_user_data(self) -> Dict[int, Dict]:
+        # Данные подгружаются по одному пользователю в refresh_user_data
+        return {}
+
+    async def refresh_user_data(self, user_id: int, user_data: Dict):
+        if user_id in self._loaded:
+            return
+        self._loaded.add(user_id)
+
+        with self._conn_lock:
+            row = self.conn.execute("SELECT data FROM user_state WHERE user_id = ?", (user_id,)).fetchone()
+        if row is None:
+            return
+        self._stored[user_id] = row['data']
+        # Данные из базы не перетирают то, что уже успели записать в памяти
+        for key, value in json.loads(row['data']).items():
+            user_data.setdefault(key, value)
+        self.counters["loaded"] += 1
+
+    async def update_user_data(self, user_id: int, data: Dict):
+        try:
+            serialized = json.dumps(data, ensure_ascii=False, sort_keys=True)
+        except (TypeError, ValueError) as e:
+            logger.error(f"user_data пользователя {user_id} не сериализуется в JSON: {e}")
+            return
+
+        if self._stored.get(user_id) == serialized:
+            self.counters["unchanged"] += 1
+            return
+        self._stored[user_id] = serialized
+        self._mark_dirty(user_id, serialized)
+
+    async def drop_user_data(self, user_id: int):
+        self._stored.pop(user_id, None)
+        self._mark_dirty(user_id, None)
+
+    async def flush(self):
+        """Пишет накопленные изменения и закрывает соединение (вызывается PTB при остановке)"""
+        self.save()
+        with self._conn_lock:
+            self.conn.close()
+
+    def save(self):
+        """
+        Пишет в базу всех измененных пользователей одной транзакцией.
+
+        Изменения забираются под _lock, а запись идет уже без него, поэтому
+        update_user_data в event loop не ждет SQLite. Сохранения выполняются
+        по очереди под _conn_lock, и более старое не перезапишет более новое
+        """
+        with self._conn_lock:
+            with self._lock:
+                if self._save_timer is not None:
+                    self._save_timer.cancel()
+                    self._save_timer = None
+                dirty, self._dirty = self._dirty, {}
+            if not dirty:
+                return
+
+            updated_at = datetime.now().isoformat()
+            try:
+                with self.conn:
+                    self.conn.executemany(
+                        "INSERT OR REPLACE INTO user_state (user_id, data, updated_at) VALUES (?, ?, ?)",
+                        [(user_id, data, updated_at) for user_id, data in dirty.items() if data is not None]
+                    )
+                    self.conn.executemany(
+                        "DELETE FROM user_state WHERE user_id = ?",
+                        [(user_id,) for user_id, data in dirty.items() if data is None]
+                    )
+                self.counters["written"] += len(dirty)
+            except Exception as e:
+                logger.error(f"Ошибка сохранения состояния пользователей: {e}")
+
+    def _mark_dirty(self, user_id: int, data: Optional[str]):
+        """Запоминает изменение и планирует отложенное сохранение"""
+        with self._lock:
+            self._dirty[user_id] = data
+            if self._save_timer is None:
+                self._save_timer = threading.Timer(self.save_delay, self.save)
+                self._save_timer.daemon = True
+                self._save_timer.start()
+
+    # Остальные данные не сохраняются (store_data), PTB эти методы не вызывает
+
+    async def get_chat_data(self) -> Dict:
+        return {}
+
+    async def get_bot_data(self) -> Dict:
+        return {}
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def get_conversations(self, name: str) -> Dict:
+        return {}
+
+    async def update_chat_data(self, chat_id: int, data: Dict):
+        pass
+
+    async def update_bot_data(self, data: Dict):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def update_conversation(self, name: str, key, new_state):
+        pass
+
+    async def drop_chat_data(self, chat_id: int):
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Dict):
+        pass
+
+    async def refresh_bot_data(self, bot_data: Dict):
+        pass
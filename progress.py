@@ -5,124 +5,262 @@
 
 import json
 import logging
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+import threading
+from bisect import bisect_left, insort
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set
+from achievements import COUNT, STREAK, WEEKLY, AchievementEngine, UserStats
+from cache import RenderCache
+import progress_snapshot
+from config import PROGRESS_FILE, STORAGE_BACKEND
+from storage import atomic_write_bytes, default_writer
 
 logger = logging.getLogger(__name__)
 
+# Уровни и их требования
+LEVELS = {
+    "novice": {"name": "🥉 Новичок", "min_sessions": 0, "max_sessions": 5},
+    "amateur": {"name": "🥈 Любитель", "min_sessions": 6, "max_sessions": 15},
+    "pro": {"name": "🥇 Профи", "min_sessions": 16, "max_sessions": 30},
+    "master": {"name": "👑 Мастер", "min_sessions": 31, "max_sessions": 999}
+}
+
+# Достижения
+ACHIEVEMENTS = {
+    "first_session": {
+        "name": "🎯 Первая тренировка",
+        "description": "Записался на первую тренировку!",
+        "icon": "🎯",
+        "rule": (COUNT, 1)
+    },
+    "beginner": {
+        "name": "🔥 Начинающий",
+        "description": "5 тренировок - ты на пути к успеху!",
+        "icon": "🔥",
+        "rule": (COUNT, 5)
+    },
+    "regular": {
+        "name": "⚡ Регулярный",
+        "description": "10 тренировок - ты настоящий скейтер!",
+        "icon": "⚡",
+        "rule": (COUNT, 10)
+    },
+    "champion": {
+        "name": "🏆 Чемпион",
+        "description": "25 тренировок - ты мастер скейтборда!",
+        "icon": "🏆",
+        "rule": (COUNT, 25)
+    },
+    "speed_progress": {
+        "name": "🚀 Скоростной прогресс",
+        "description": "3 тренировки за неделю - впечатляюще!",
+        "icon": "🚀",
+        "rule": (WEEKLY, 3)
+    },
+    "consistent": {
+        "name": "📅 Постоянный",
+        "description": "Тренируешься 3 недели подряд!",
+        "icon": "📅",
+        "rule": (STREAK, 3)
+    }
+}
+
+
+def level_for(total_sessions: int, levels: Dict[str, Dict] = LEVELS) -> Optional[str]:
+    """ID уровня для указанного количества тренировок"""
+    for level_id, level_info in levels.items():
+        if level_info["min_sessions"] <= total_sessions <= level_info["max_sessions"]:
+            return level_id
+    return None
+
+
+class Leaderboard:
+    """
+    Таблица лидеров, которая обновляется при каждой тренировке.
+
+    Ключи (-total_sessions, seq, user_id) хранятся в отсортированном списке:
+    место пользователя ищется бинарным поиском, топ-N - срез списка.
+    seq - порядок появления пользователя, он разрешает ничьи так же,
+    как раньше это делала стабильная сортировка. Вместо него можно
+    передать свой tiebreak (например, время достижения результата),
+    чтобы порядок при равенстве не зависел от порядка загрузки.
+    """
+
+    def __init__(self):
+        self._keys = []
+        self._key_by_user: Dict[str, tuple] = {}
+        self._next_seq = 0
+
+    def update(self, user_id_str: str, total_sessions: int, tiebreak=None):
+        """Обновляет количество тренировок пользователя"""
+        old_key = self._key_by_user.get(user_id_str)
+        if old_key is not None:
+            del self._keys[bisect_left(self._keys, old_key)]
+            seq = old_key[1]
+        else:
+            seq = self._next_seq
+            self._next_seq += 1
+        if tiebreak is not None:
+            seq = tiebreak
+
+        key = (-total_sessions, seq, user_id_str)
+        insort(self._keys, key)
+        self._key_by_user[user_id_str] = key
+
+    def top(self, limit: int) -> List[str]:
+        """ID пользователей с наибольшим количеством тренировок"""
+        return [key[2] for key in self._keys[:limit]]
+
+    def rank(self, user_id_str: str) -> Optional[int]:
+        """Место пользователя в таблице (с 1) или None"""
+        key = self._key_by_user.get(user_id_str)
+        if key is None:
+            return None
+        return bisect_left(self._keys, key) + 1
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
 class ProgressSystem:
-    def __init__(self, db_file: str = "progress.json"):
+    def __init__(self, db_file: str = "progress.json", save_delay: float = 1.0):
         self.db_file = db_file
         self.progress_data = self._load_progress()
         
+        # Версия данных меняется при каждой тренировке и входит в ключ кэша
+        self.data_version = 0
+        self.render_cache = RenderCache()
+        
+        self.leaderboard = Leaderboard()
+        for user_id_str, user_data in self.progress_data.items():
+            self.leaderboard.update(user_id_str, user_data["total_sessions"])
+        
+        # Изменившиеся пользователи сохраняются не чаще раза в save_delay секунд
+        self.save_delay = save_delay
+        # Запись на диск идет через общий поток записи, а не в обработчиках
+        self.writer = default_writer
+        self._data_lock = threading.RLock()
+        self._dirty: Set[str] = set()
+        self._save_timer: Optional[threading.Timer] = None
+        # Копии пользователей на момент последнего сохранения: файл пишется
+        # из них, поэтому при сохранении копируются только изменившиеся.
+        # Заполняется при первом сохранении
+        self._snapshot: Optional[Dict[str, Dict]] = None
+        
         # Уровни и их требования
-        self.levels = {
-            "novice": {"name": "🥉 Новичок", "min_sessions": 0, "max_sessions": 5},
-            "amateur": {"name": "🥈 Любитель", "min_sessions": 6, "max_sessions": 15},
-            "pro": {"name": "🥇 Профи", "min_sessions": 16, "max_sessions": 30},
-            "master": {"name": "👑 Мастер", "min_sessions": 31, "max_sessions": 999}
-        }
+        self.levels = LEVELS
         
         # Достижения
-        self.achievements = {
-            "first_session": {
-                "name": "🎯 Первая тренировка",
-                "description": "Записался на первую тренировку!",
-                "icon": "🎯",
-                "condition": lambda sessions: len(sessions) >= 1
-            },
-            "beginner": {
-                "name": "🔥 Начинающий",
-                "description": "5 тренировок - ты на пути к успеху!",
-                "icon": "🔥",
-                "condition": lambda sessions: len(sessions) >= 5
-            },
-            "regular": {
-                "name": "⚡ Регулярный",
-                "description": "10 тренировок - ты настоящий скейтер!",
-                "icon": "⚡",
-                "condition": lambda sessions: len(sessions) >= 10
-            },
-            "champion": {
-                "name": "🏆 Чемпион",
-                "description": "25 тренировок - ты мастер скейтборда!",
-                "icon": "🏆",
-                "condition": lambda sessions: len(sessions) >= 25
-            },
-            "speed_progress": {
-                "name": "🚀 Скоростной прогресс",
-                "description": "3 тренировки за неделю - впечатляюще!",
-                "icon": "🚀",
-                "condition": lambda sessions: self._check_weekly_progress(sessions, 3)
-            },
-            "consistent": {
-                "name": "📅 Постоянный",
-                "description": "Тренируешься 3 недели подряд!",
-                "icon": "📅",
-                "condition": lambda sessions: self._check_consecutive_weeks(sessions, 3)
-            }
-        }
+        self.achievements = ACHIEVEMENTS
+        
+        # Правила проверяются по накопленному состоянию пользователя,
+        # которое строится при первой тренировке после запуска
+        self.achievement_engine = AchievementEngine(self.achievements)
+        self._achievement_stats: Dict[str, UserStats] = {}
+
+    def _is_binary(self) -> bool:
+        return self.db_file.endswith(progress_snapshot.BINARY_SUFFIX)
 
     def _load_progress(self) -> Dict:
-        """Загружает данные прогресса из файла"""
+        """Загружает данные прогресса из файла (JSON или бинарный снапшот)"""
         try:
+            if self._is_binary():
+                return progress_snapshot.load(self.db_file)
             with open(self.db_file, 'r', encoding='utf-8') as f:
                 return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
+        except FileNotFoundError:
+            return {}
+        except (json.JSONDecodeError, ValueError) as e:
+            logger.error(f"Ошибка чтения прогресса: {e}")
             return {}
 
-    def _save_progress(self):
-        """Сохраняет данные прогресса в файл"""
+    def _save_progress(self, user_ids: Optional[Iterable[str]] = None):
+        """
+        Ставит сохранение в очередь записи (файл всегда пишется целиком).
+
+        Под блокировкой данных обновляются только копии изменившихся
+        пользователей в снимке (упакованные тренировки копируются без
+        распаковки) и копируется словарь ссылок на них;
+        сериализация всего файла идет уже в потоке записи и не держит
+        блокировку, которую берут обработчики в event loop.
+        """
+        with self._data_lock:
+            if self._snapshot is None:
+                self._snapshot = {}
+                user_ids = None
+            for user_id_str in (user_ids if user_ids is not None else list(self.progress_data)):
+                user_data = self.progress_data.get(user_id_str)
+                if user_data is None:
+                    self._snapshot.pop(user_id_str, None)
+                else:
+                    sessions = user_data["sessions"]
+                    if isinstance(sessions, progress_snapshot.PackedSessions):
+                        # Тренировки из бинарного снапшота копируются без распаковки
+                        sessions = sessions.copy()
+                    else:
+                        sessions = list(sessions)
+                    self._snapshot[user_id_str] = dict(
+                        user_data,
+                        sessions=sessions,
+                        achievements=list(user_data["achievements"])
+                    )
+            self.writer.submit(self._write_file, dict(self._snapshot))
+
+    def _write_file(self, snapshot: Dict):
+        """Сериализует и атомарно записывает файл прогресса (выполняется в потоке записи)"""
         try:
-            with open(self.db_file, 'w', encoding='utf-8') as f:
-                json.dump(self.progress_data, f, ensure_ascii=False, indent=2)
+            if self._is_binary():
+                content = progress_snapshot.encode(snapshot)
+            else:
+                content = json.dumps(snapshot, ensure_ascii=False, indent=2, default=list).encode('utf-8')
+            atomic_write_bytes(self.db_file, content)
         except Exception as e:
             logger.error(f"Ошибка сохранения прогресса: {e}")
 
-    def _check_weekly_progress(self, sessions: List, required_count: int) -> bool:
-        """Проверяет количество тренировок за последнюю неделю"""
-        if len(sessions) < required_count:
-            return False
-            
-        week_ago = datetime.now() - timedelta(days=7)
-        recent_sessions = [
-            session for session in sessions[-required_count:]
-            if datetime.fromisoformat(session['date']) >= week_ago
-        ]
-        return len(recent_sessions) >= required_count
-
-    def _check_consecutive_weeks(self, sessions: List, required_weeks: int) -> bool:
-        """Проверяет тренировки в течение нескольких недель подряд"""
-        if len(sessions) < required_weeks:
-            return False
-            
-        # Группируем тренировки по неделям
-        weeks = {}
-        for session in sessions:
-            session_date = datetime.fromisoformat(session['date'])
-            week_start = session_date - timedelta(days=session_date.weekday())
-            week_key = week_start.strftime('%Y-%m-%d')
-            if week_key not in weeks:
-                weeks[week_key] = []
-            weeks[week_key].append(session)
-        
-        # Проверяем последние недели
-        sorted_weeks = sorted(weeks.keys(), reverse=True)
-        consecutive_weeks = 0
-        
-        for i, week in enumerate(sorted_weeks[:required_weeks]):
-            if weeks[week]:  # Если в неделе были тренировки
-                consecutive_weeks += 1
-            else:
-                break
-                
-        return consecutive_weeks >= required_weeks
+    def _mark_dirty(self, user_id_str: str):
+        """Помечает пользователя измененным и планирует отложенное сохранение"""
+        with self._data_lock:
+            self._dirty.add(user_id_str)
+            if self._save_timer is None:
+                self._save_timer = threading.Timer(self.save_delay, self.flush, kwargs={'wait': False})
+                self._save_timer.daemon = True
+                self._save_timer.start()
+
+    def flush(self, wait: bool = True):
+        """Сохраняет всех измененных пользователей"""
+        # Снимок и постановка в очередь идут под блокировкой данных,
+        # поэтому более старое состояние не перезапишет более новое
+        with self._data_lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            dirty, self._dirty = self._dirty, set()
+            if dirty:
+                self._save_progress(dirty)
+
+        if wait:
+            self.writer.flush()
+
+    async def aflush(self):
+        """Сохраняет изменения, не блокируя event loop"""
+        self.flush(wait=False)
+        await self.writer.aflush()
+
+    def close(self):
+        """Сохраняет несохраненные изменения (вызывается при остановке бота)"""
+        self.flush()
 
     def add_session(self, user_id: int, user_name: str, username: str, 
                    park_name: str, session_date: str, session_time: str) -> Dict:
         """Добавляет новую тренировку и обновляет прогресс"""
         user_id_str = str(user_id)
         
+        with self._data_lock:
+            return self._add_session(user_id_str, user_name, username,
+                                     park_name, session_date, session_time)
+
+    def _add_session(self, user_id_str: str, user_name: str, username: str,
+                     park_name: str, session_date: str, session_time: str) -> Dict:
+        """Добавляет тренировку (вызывается под блокировкой данных)"""
         if user_id_str not in self.progress_data:
             self.progress_data[user_id_str] = {
                 "user_name": user_name,
@@ -144,7 +282,16 @@ class ProgressSystem:
         }
         
         self.progress_data[user_id_str]["sessions"].append(session_info)
+        
+        stats = self._achievement_stats.get(user_id_str)
+        if stats is None:
+            stats = self.achievement_engine.new_stats(self.progress_data[user_id_str]["sessions"])
+            self._achievement_stats[user_id_str] = stats
+            changed = {COUNT, WEEKLY, STREAK}
+        else:
+            changed = self.achievement_engine.observe(stats, session_date)
         self.progress_data[user_id_str]["total_sessions"] = len(self.progress_data[user_id_str]["sessions"])
+        self.leaderboard.update(user_id_str, self.progress_data[user_id_str]["total_sessions"])
         
         # Обновляем первую и последнюю тренировку
         if not self.progress_data[user_id_str]["first_session"]:
@@ -155,10 +302,11 @@ class ProgressSystem:
         self._update_level(user_id_str)
         
         # Проверяем достижения
-        new_achievements = self._check_achievements(user_id_str)
+        new_achievements = self._check_achievements(user_id_str, changed)
         
-        # Сохраняем данные
-        self._save_progress()
+        # Сохранение откладывается и выполняется в фоне
+        self.data_version += 1
+        self._mark_dirty(user_id_str)
         
         return {
             "new_achievements": new_achievements,
@@ -168,34 +316,52 @@ class ProgressSystem:
 
     def _update_level(self, user_id_str: str):
         """Обновляет уровень пользователя"""
-        total_sessions = self.progress_data[user_id_str]["total_sessions"]
-        
-        for level_id, level_info in self.levels.items():
-            if level_info["min_sessions"] <= total_sessions <= level_info["max_sessions"]:
-                self.progress_data[user_id_str]["level"] = level_id
-                break
+        level_id = level_for(self.progress_data[user_id_str]["total_sessions"], self.levels)
+        if level_id is not None:
+            self.progress_data[user_id_str]["level"] = level_id
 
-    def _check_achievements(self, user_id_str: str) -> List[Dict]:
-        """Проверяет и добавляет новые достижения"""
+    def _check_achievements(self, user_id_str: str, changed: Set[str]) -> List[Dict]:
+        """Проверяет и добавляет новые достижения по изменившимся метрикам"""
         user_data = self.progress_data[user_id_str]
-        sessions = user_data["sessions"]
-        current_achievements = set(user_data["achievements"])
-        new_achievements = []
+        new_ids = self.achievement_engine.evaluate(
+            self._achievement_stats[user_id_str], user_data["achievements"], changed
+        )
         
-        for achievement_id, achievement in self.achievements.items():
-            if (achievement_id not in current_achievements and 
-                achievement["condition"](sessions)):
-                
-                user_data["achievements"].append(achievement_id)
-                new_achievements.append({
-                    "id": achievement_id,
-                    "name": achievement["name"],
-                    "description": achievement["description"],
-                    "icon": achievement["icon"]
-                })
+        new_achievements = []
+        for achievement_id in new_ids:
+            achievement = self.achievements[achievement_id]
+            user_data["achievements"].append(achievement_id)
+            new_achievements.append({
+                "id": achievement_id,
+                "name": achievement["name"],
+                "description": achievement["description"],
+                "icon": achievement["icon"]
+            })
         
         return new_achievements
 
+    def recompute_achievements(self) -> Dict[str, List[str]]:
+        """
+        Пересчитывает достижения всех пользователей (например, после
+        изменения правил). Возвращает новые достижения по пользователям.
+        """
+        with self._data_lock:
+            satisfied = self.achievement_engine.evaluate_all(self.progress_data)
+            added = {}
+            for user_id_str, achievement_ids in satisfied.items():
+                user_data = self.progress_data[user_id_str]
+                new_ids = [a for a in achievement_ids if a not in user_data["achievements"]]
+                if new_ids:
+                    user_data["achievements"].extend(new_ids)
+                    added[user_id_str] = new_ids
+                    self._mark_dirty(user_id_str)
+            
+            # Состояние по новым правилам строится заново
+            self._achievement_stats.clear()
+            if added:
+                self.data_version += 1
+        return added
+
     def get_user_progress(self, user_id: int) -> Optional[Dict]:
         """Получает прогресс пользователя"""
         user_id_str = str(user_id)
@@ -237,6 +403,7 @@ class ProgressSystem:
             "achievements": user_achievements,
             "first_session": user_data["first_session"],
             "last_session": user_data["last_session"],
+            "rank": self.leaderboard.rank(user_id_str),
             "sessions": user_data["sessions"][-5:]  # Последние 5 тренировок
         }
 
@@ -244,21 +411,32 @@ class ProgressSystem:
         """Получает таблицу лидеров"""
         users = []
         
-        for user_id, user_data in self.progress_data.items():
-            users.append({
-                "user_name": user_data["user_name"],
-                "username": user_data["username"],
-                "total_sessions": user_data["total_sessions"],
-                "level": self.levels[user_data["level"]]["name"],
-                "achievements_count": len(user_data["achievements"])
-            })
+        with self._data_lock:
+            for user_id_str in self.leaderboard.top(limit):
+                user_data = self.progress_data[user_id_str]
+                users.append({
+                    "user_name": user_data["user_name"],
+                    "username": user_data["username"],
+                    "total_sessions": user_data["total_sessions"],
+                    "level": self.levels[user_data["level"]]["name"],
+                    "achievements_count": len(user_data["achievements"])
+                })
         
-        # Сортируем по количеству тренировок
-        users.sort(key=lambda x: x["total_sessions"], reverse=True)
-        return users[:limit]
+        return users
+
+    def get_user_rank(self, user_id: int) -> Optional[int]:
+        """Получает место пользователя в таблице лидеров"""
+        with self._data_lock:
+            return self.leaderboard.rank(str(user_id))
 
     def format_progress_message(self, user_id: int) -> str:
         """Форматирует сообщение с прогрессом пользователя"""
+        return self.render_cache.get_or_render(
+            ("progress", user_id, self.data_version),
+            lambda: self._render_progress_message(user_id)
+        )
+
+    def _render_progress_message(self, user_id: int) -> str:
         progress = self.get_user_progress(user_id)
         
         if not progress:
@@ -279,6 +457,7 @@ class ProgressSystem:
 • Всего тренировок: {progress['total_sessions']}
 • Первая тренировка: {progress['first_session']}
 • Последняя тренировка: {progress['last_session']}
+• Место в рейтинге: {progress['rank']} из {len(self.leaderboard)}
 
 🏆 *Достижения:* {len(progress['achievements'])}/{len(self.achievements)}
 """
@@ -308,6 +487,12 @@ class ProgressSystem:
 
     def format_leaderboard_message(self, limit: int = 5) -> str:
         """Форматирует сообщение с таблицей лидеров"""
+        return self.render_cache.get_or_render(
+            ("leaderboard", limit, self.data_version),
+            lambda: self._render_leaderboard_message(limit)
+        )
+
+    def _render_leaderboard_message(self, limit: int) -> str:
         leaderboard = self.get_leaderboard(limit)
         
         if not leaderboard:
@@ -321,3 +506,11 @@ class ProgressSystem:
             message += f"   {user['level']} • {user['total_sessions']} тренировок • {user['achievements_count']} достижений\n\n"
         
         return message
+
+
+def create_progress_system() -> ProgressSystem:
+    """Создает систему прогресса с хранилищем из STORAGE_BACKEND"""
+    if STORAGE_BACKEND == 'sqlite':
+        from sqlite_backend import SQLiteProgressSystem
+        return SQLiteProgressSystem()
+    return ProgressSystem(PROGRESS_FILE)
@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""
+Компактный бинарный снапшот прогресса для MSK SK8COOL
+
+Формат: заголовок JSON (таблица строк и данные пользователей без тренировок)
+и четыре колонки тренировок всех пользователей подряд, упакованные в array:
+дата как порядковый номер дня, время в минутах, ID парка в таблице строк
+и timestamp в микросекундах. Значение, которое не восстанавливается из
+числа байт в байт (пустая строка, нестандартный формат), кладется в таблицу
+строк, а в колонку пишется отрицательный номер: -(ID + 1). Поэтому
+преобразование JSON -> bin -> JSON не теряет данных.
+
+После загрузки тренировки пользователя остаются упакованными (PackedSessions)
+и превращаются в список словарей только при первом обращении, а при
+сохранении нетронутые пользователи копируются срезами колонок.
+
+Конвертер:
+    python progress_snapshot.py to-bin progress.json progress.bin
+    python progress_snapshot.py to-json progress.bin progress.json
+    python progress_snapshot.py bench
+"""
+
+import json
+import os
+import struct
+import sys
+import tempfile
+import time
+from array import array
+from collections.abc import MutableSequence
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+MAGIC = b"SK8P"
+VERSION = 1
+BINARY_SUFFIX = ".bin"
+
+_HEADER = struct.Struct("<4sBI")
+_MICROSECONDS_PER_DAY = 86_400_000_000
+_EPOCH = datetime(1, 1, 1)
+
+
+class _StringTable:
+    """Таблица интернированных строк"""
+
+    def __init__(self, strings: Optional[List[str]] = None):
+        self.strings: List[str] = list(strings or [])
+        self._ids: Dict[str, int] = {value: i for i, value in enumerate(self.strings)}
+
+    def intern(self, value: str) -> int:
+        string_id = self._ids.get(value)
+        if string_id is None:
+            string_id = self._ids[value] = len(self.strings)
+            self.strings.append(value)
+        return string_id
+
+    def escape(self, value: str) -> int:
+        """Код для значения, которое нельзя упаковать в число"""
+        return -self.intern(value) - 1
+
+
+def _encode_date(value: str, strings: _StringTable) -> int:
+    try:
+        day = date.fromisoformat(value)
+        if day.isoformat() == value:
+            return day.toordinal()
+    except (TypeError, ValueError):
+        pass
+    return strings.escape(value)
+
+
+def _encode_time(value: str, strings: _StringTable) -> int:
+    try:
+        hours, minutes = value.split(':')
+        code = int(hours) * 60 + int(minutes)
+        if f"{code // 60:02d}:{code % 60:02d}" == value:
+            return code
+    except (AttributeError, ValueError):
+        pass
+    return strings.escape(value)
+
+
+def _encode_timestamp(value: str, strings: _StringTable) -> int:
+    try:
+        moment = datetime.fromisoformat(value)
+        if moment.tzinfo is None and moment.isoformat() == value:
+            return (moment.toordinal() * _MICROSECONDS_PER_DAY
+                    + ((moment.hour * 60 + moment.minute) * 60 + moment.second) * 1_000_000
+                    + moment.microsecond)
+    except (TypeError, ValueError):
+        pass
+    return strings.escape(value)
+
+
+class _Columns:
+    """Колонки тренировок, прочитанные из одного снапшота"""
+
+    def __init__(self, strings: List[str], dates: array, times: array,
+                 parks: array, timestamps: array):
+        self.strings = strings
+        self.dates = dates
+        self.times = times
+        self.parks = parks
+        self.timestamps = timestamps
+
+    def _string(self, code: int) -> str:
+        return self.strings[-code - 1]
+
+    def session(self, i: int) -> Dict:
+        date_code, time_code, timestamp = self.dates[i], self.times[i], self.timestamps[i]
+        return {
+            "date": date.fromordinal(date_code).isoformat() if date_code >= 0 else self._string(date_code),
+            "time": f"{time_code // 60:02d}:{time_code % 60:02d}" if time_code >= 0 else self._string(time_code),
+            "park": self.strings[self.parks[i]],
+            "timestamp": (
+                (_EPOCH + timedelta(microseconds=timestamp - _MICROSECONDS_PER_DAY)).isoformat()
+                if timestamp >= 0 else self._string(timestamp)
+            )
+        }
+
+
+class PackedSessions(MutableSequence):
+    """
+    Тренировки пользователя, лежащие в колонках снапшота.
+
+    Ведет себя как список словарей; список строится при первом обращении
+    к элементам, а len() работает и без этого.
+    """
+
+    def __init__(self, columns: _Columns, start: int, count: int):
+        self._columns = columns
+        self._start = start
+        self._count = count
+        self._items: Optional[List[Dict]] = None
+
+    @property
+    def packed(self) -> bool:
+        """Тренировки еще не распакованы"""
+        return self._items is None
+
+    def _materialize(self) -> List[Dict]:
+        if self._items is None:
+            self._items = [
+                self._columns.session(i) for i in range(self._start, self._start + self._count)
+            ]
+        return self._items
+
+    def date_codes(self) -> array:
+        """Колонка дат (порядковые номера дней) без распаковки тренировок"""
+        return self._columns.dates[self._start:self._start + self._count]
+
+    def copy(self) -> "PackedSessions":
+        """
+        Независимая копия для сохранения: упакованные тренировки не
+        распаковываются, копия ссылается на те же колонки снапшота
+        """
+        copy = PackedSessions(self._columns, self._start, self._count)
+        if self._items is not None:
+            copy._items = list(self._items)
+        return copy
+
+    def __len__(self) -> int:
+        return self._count if self._items is None else len(self._items)
+
+    def __getitem__(self, index):
+        return self._materialize()[index]
+
+    def __setitem__(self, index, value):
+        self._materialize()[index] = value
+
+    def __delitem__(self, index):
+        del self._materialize()[index]
+
+    def insert(self, index, value):
+        self._materialize().insert(index, value)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (list, PackedSessions)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return repr(self._materialize())
+
+
+def _little_endian(column: array) -> bytes:
+    if sys.byteorder == "big":
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column.tobytes()
+
+
+def encode(progress_data: Dict) -> bytes:
+    """Упаковывает данные прогресса в бинарный снапшот"""
+    # Таблица строк продолжает таблицу исходного снапшота,
+    # чтобы упакованные тренировки можно было копировать без перекодирования
+    source = next(
+        (user_data["sessions"]._columns for user_data in progress_data.values()
+         if isinstance(user_data["sessions"], PackedSessions)),
+        None
+    )
+    strings = _StringTable(source.strings if source is not None else None)
+    dates, times, parks = array("i"), array("i"), array("i")
+    timestamps = array("q")
+    users = []
+
+    for user_id, user_data in progress_data.items():
+        sessions = user_data["sessions"]
+        # Место ключа sessions сохраняется, чтобы не менять порядок полей
+        meta = {key: (None if key == "sessions" else value) for key, value in user_data.items()}
+        users.append([user_id, meta, len(sessions)])
+
+        if isinstance(sessions, PackedSessions) and sessions.packed and sessions._columns is source:
+            end = sessions._start + sessions._count
+            dates.extend(source.dates[sessions._start:end])
+            times.extend(source.times[sessions._start:end])
+            parks.extend(source.parks[sessions._start:end])
+            timestamps.extend(source.timestamps[sessions._start:end])
+            continue
+
+        for session in sessions:
+            dates.append(_encode_date(session["date"], strings))
+            times.append(_encode_time(session["time"], strings))
+            parks.append(strings.intern(session["park"]))
+            timestamps.append(_encode_timestamp(session["timestamp"], strings))
+
+    header = json.dumps(
+        {"strings": strings.strings, "users": users},
+        ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+
+    return b"".join([
+        _HEADER.pack(MAGIC, VERSION, len(header)),
+        header,
+        _little_endian(dates),
+        _little_endian(times),
+        _little_endian(parks),
+        _little_endian(timestamps),
+    ])
+
+
+def _read_column(data: memoryview, offset: int, typecode: str, count: int):
+    column = array(typecode)
+    size = column.itemsize * count
+    column.frombytes(data[offset:offset + size])
+    if sys.byteorder == "big":
+        column.byteswap()
+    return column, offset + size
+
+
+def decode(data: bytes) -> Dict:
+    """Распаковывает бинарный снапшот в словарь прогресса"""
+    magic, version, header_len = _HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Неизвестный формат снапшота прогресса")
+
+    offset = _HEADER.size
+    header = json.loads(bytes(data[offset:offset + header_len]).decode("utf-8"))
+    offset += header_len
+
+    strings = header["strings"]
+    total = sum(user[2] for user in header["users"])
+    view = memoryview(data)
+    dates, offset = _read_column(view, offset, "i", total)
+    times, offset = _read_column(view, offset, "i", total)
+    parks, offset = _read_column(view, offset, "i", total)
+    timestamps, offset = _read_column(view, offset, "q", total)
+
+    columns = _Columns(strings, dates, times, parks, timestamps)
+    progress_data = {}
+    position = 0
+    for user_id, meta, count in header["users"]:
+        meta["sessions"] = PackedSessions(columns, position, count)
+        position += count
+        progress_data[user_id] = meta
+
+    return progress_data
+
+
+def load(path: str) -> Dict:
+    """Читает бинарный снапшот из файла"""
+    with open(path, "rb") as f:
+        return decode(f.read())
+
+
+def convert(source: str, target: str):
+    """Конвертирует снапшот между JSON и бинарным форматом по расширениям"""
+    if source.endswith(BINARY_SUFFIX):
+        progress_data = load(source)
+    else:
+        with open(source, "r", encoding="utf-8") as f:
+            progress_data = json.load(f)
+
+    if target.endswith(BINARY_SUFFIX):
+        with open(target, "wb") as f:
+            f.write(encode(progress_data))
+    else:
+        with open(target, "w", encoding="utf-8") as f:
+            json.dump(progress_data, f, ensure_ascii=False, indent=2, default=list)
+
+
+def _generate(users: int, sessions_per_user: int) -> Dict:
+    parks = ["Скейт-парк у м. Новопеределкино 🏞️", "Скейт-парк у м. Тропарево 🌅",
+             "Скейт-парк у м. Академика Янгеля 🌆", "Скейт-парк у м. Сокольники ❄️"]
+    times = ["12:00", "14:00", "16:00", "18:00", "20:00", "22:00"]
+    start = date(2025, 1, 1).toordinal()
+    progress_data = {}
+    for user in range(users):
+        sessions = [
+            {
+                "date": date.fromordinal(start + (user + i * 3) % 365).isoformat(),
+                "time": times[(user + i) % len(times)],
+                "park": parks[(user * 7 + i) % len(parks)],
+                "timestamp": datetime.fromordinal(start + i).replace(
+                    hour=i % 24, minute=user % 60, microsecond=user * 50 + i + 1
+                ).isoformat()
+            }
+            for i in range(sessions_per_user)
+        ]
+        progress_data[str(100000000 + user)] = {
+            "user_name": f"Скейтер {user}",
+            "username": f"skater{user}",
+            "sessions": sessions,
+            "achievements": ["first_session", "beginner", "regular", "champion"],
+            "level": "master",
+            "total_sessions": sessions_per_user,
+            "first_session": sessions[0]["date"],
+            "last_session": sessions[-1]["date"]
+        }
+    return progress_data
+
+
+def benchmark(users: int = 10_000, sessions_per_user: int = 50):
+    """Сравнивает размер и время загрузки JSON и бинарного снапшота"""
+    progress_data = _generate(users, sessions_per_user)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, "progress.json")
+        bin_path = os.path.join(tmp, "progress.bin")
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(progress_data, f, ensure_ascii=False, indent=2)
+        with open(bin_path, "wb") as f:
+            f.write(encode(progress_data))
+
+        started = time.perf_counter()
+        with open(json_path, "r", encoding="utf-8") as f:
+            from_json = json.load(f)
+        json_load = time.perf_counter() - started
+
+        started = time.perf_counter()
+        from_bin = load(bin_path)
+        bin_load = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for user_data in from_bin.values():
+            user_data["sessions"][:1]
+        bin_unpack = time.perf_counter() - started
+
+        untouched = load(bin_path)
+        started = time.perf_counter()
+        encode(untouched)
+        bin_save = time.perf_counter() - started
+
+        # Без потерь: совпадают и данные, и порядок полей
+        assert from_json == from_bin == progress_data
+        assert json.dumps(from_bin, ensure_ascii=False, default=list) == \
+            json.dumps(progress_data, ensure_ascii=False)
+
+        print(f"{users} пользователей x {sessions_per_user} тренировок")
+        print(f"JSON: {os.path.getsize(json_path) / 1e6:.1f} МБ, загрузка {json_load:.2f} с")
+        print(f"bin:  {os.path.getsize(bin_path) / 1e6:.1f} МБ, загрузка {bin_load:.2f} с, "
+              f"распаковка всех тренировок {bin_unpack:.2f} с, "
+              f"сохранение без изменений {bin_save:.2f} с")
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] in ("to-bin", "to-json"):
+        convert(sys.argv[2], sys.argv[3])
+    elif len(sys.argv) == 2 and sys.argv[1] == "bench":
+        benchmark()
+    else:
+        print(__doc__)
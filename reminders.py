@@ -3,20 +3,272 @@
 Система напоминаний для MSK SK8COOL
 """
 
+import asyncio
+import heapq
 import logging
 from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
 from telegram import Bot
-from config import ADMIN_ID
+from config import ADMIN_ID, REMINDER_CATCHUP, STORAGE_BACKEND
+from send_queue import ADMIN, USER, SendQueue
+from storage import JsonLogStorage
 
 logger = logging.getLogger(__name__)
 
+# За сколько до тренировки отправляется напоминание
+REMINDER_ADVANCE = timedelta(hours=2)
+
+
+class ReminderStore:
+    """
+    Запланированные напоминания на диске: ID задачи -> время и данные записи.
+
+    Хранится в журнале JsonLogStorage, поэтому напоминания переживают
+    перезапуск бота, а добавление и удаление стоят одну строку журнала.
+    """
+
+    def __init__(self, db_file: str = "reminders.json", storage=None):
+        self.storage = storage or JsonLogStorage(db_file)
+        self.reminders = self.storage.load()
+
+    def add(self, job_id: str, fire_at: datetime, booking_data: Dict):
+        """Сохраняет напоминание"""
+        self.reminders[job_id] = {"fire_at": fire_at.isoformat(), "booking": booking_data}
+        self.storage.put(job_id, self.reminders[job_id])
+        self._compact_if_needed()
+
+    def remove(self, job_id: str):
+        """Удаляет напоминание, если оно есть"""
+        if self.reminders.pop(job_id, None) is not None:
+            self.storage.delete(job_id)
+            self._compact_if_needed()
+
+    def all(self) -> Dict[str, Dict]:
+        """Все сохраненные напоминания"""
+        return dict(self.reminders)
+
+    def close(self):
+        """Сбрасывает журнал на диск"""
+        self.storage.close()
+
+    def _compact_if_needed(self):
+        if self.storage.needs_compaction():
+            self.storage.compact(self.reminders)
+
+
+class ReminderDispatcher:
+    """
+    Очередь напоминаний на min-куче по времени отправки.
+
+    Одна корутина просыпается к ближайшему напоминанию (но не реже раза
+    в tick секунд), забирает все наступившие и передает их одной пачкой
+    в send_batch. Напоминания индексируются словарем по ID, поэтому отмена
+    и перенос стоят O(1): устаревшая запись в куче пропускается при
+    извлечении, а когда таких записей больше половины, куча пересобирается.
+    """
+
+    def __init__(self, send_batch: Callable[[List[Tuple[str, Dict]]], Awaitable],
+                 tick: float = 30.0):
+        self.send_batch = send_batch
+        self.tick = tick
+        self._heap: List[Tuple[datetime, str]] = []
+        self._pending: Dict[str, Tuple[datetime, Dict]] = {}
+        self._stale = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def __contains__(self, job_id: str) -> bool:
+        return job_id in self._pending
+
+    @property
+    def heap_size(self) -> int:
+        """Размер кучи вместе с устаревшими записями"""
+        return len(self._heap)
+
+    def next_fire(self) -> Optional[datetime]:
+        """Время ближайшего напоминания"""
+        while self._heap:
+            fire_at, job_id = self._heap[0]
+            pending = self._pending.get(job_id)
+            if pending is not None and pending[0] == fire_at:
+                return fire_at
+            heapq.heappop(self._heap)
+            self._stale -= 1
+        return None
+
+    def push(self, job_id: str, fire_at: datetime, booking_data: Dict):
+        """Добавляет напоминание (или переносит уже добавленное)"""
+        if job_id in self._pending:
+            self._stale += 1
+        self._pending[job_id] = (fire_at, booking_data)
+        heapq.heappush(self._heap, (fire_at, job_id))
+        if self._heap[0][1] == job_id and self._wakeup is not None:
+            self._wakeup.set()
+
+    def push_many(self, reminders: Iterable[Tuple[str, datetime, Dict]]):
+        """Добавляет много напоминаний за один heapify"""
+        for job_id, fire_at, booking_data in reminders:
+            if job_id in self._pending:
+                self._stale += 1
+            self._pending[job_id] = (fire_at, booking_data)
+            self._heap.append((fire_at, job_id))
+        heapq.heapify(self._heap)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def cancel(self, job_id: str) -> bool:
+        """Отменяет напоминание, возвращает True, если оно было"""
+        if self._pending.pop(job_id, None) is None:
+            return False
+        self._stale += 1
+        if self._stale > len(self._heap) // 2:
+            self._compact()
+        return True
+
+    def _compact(self):
+        """Пересобирает кучу без отмененных и перенесенных записей"""
+        self._heap = [(fire_at, job_id) for job_id, (fire_at, _) in self._pending.items()]
+        heapq.heapify(self._heap)
+        self._stale = 0
+
+    def pop_due(self, now: datetime) -> List[Tuple[str, Dict]]:
+        """Извлекает все напоминания, время которых наступило"""
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            fire_at, job_id = heapq.heappop(self._heap)
+            pending = self._pending.get(job_id)
+            # Отмененные и перенесенные напоминания пропускаем
+            if pending is not None and pending[0] == fire_at:
+                del self._pending[job_id]
+                due.append((job_id, pending[1]))
+            else:
+                self._stale -= 1
+        return due
+
+    def start(self):
+        """Запускает цикл отправки в текущем event loop"""
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Останавливает цикл отправки"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            due = self.pop_due(datetime.now())
+            if due:
+                try:
+                    await self.send_batch(due)
+                except Exception as e:
+                    logger.error(f"Ошибка при отправке напоминаний: {e}")
+
+            timeout = self.tick
+            next_fire = self.next_fire()
+            if next_fire is not None:
+                timeout = min(timeout, max(0.0, (next_fire - datetime.now()).total_seconds()))
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+
 class ReminderSystem:
-    def __init__(self, bot: Bot, job_queue):
+    # Длина одного сообщения-сводки для админа (лимит Telegram 4096)
+    DIGEST_LIMIT = 4000
+
+    def __init__(self, bot: Bot, store: Optional[ReminderStore] = None,
+                 catchup: str = REMINDER_CATCHUP, send_queue: Optional[SendQueue] = None):
         self.bot = bot
-        self.job_queue = job_queue
+        self.store = store
+        self.catchup = catchup
+        # Сообщения уходят через общую очередь с ограничением частоты
+        self.send_queue = send_queue or SendQueue(bot)
+        self.dispatcher = ReminderDispatcher(self._send_batch)
+        
+        # Счетчики для статистики
+        self.counters = {"scheduled": 0, "duplicates": 0, "rescheduled": 0,
+                         "cancelled": 0, "sent": 0, "failed": 0}
+    
+    @staticmethod
+    def reminder_id(user_id, training_date: str, training_time: str) -> str:
+        """ID напоминания по ключу (user_id, date, time)"""
+        return f"reminder_{int(user_id)}_{training_date}_{training_time}"
     
-    def schedule_reminder(self, booking_data: dict):
-        """Планирует напоминание за 2 часа до тренировки"""
+    def stats(self) -> Dict:
+        """Количество живых напоминаний и счетчики операций"""
+        next_fire = self.dispatcher.next_fire()
+        return {
+            "live": len(self.dispatcher),
+            "heap_size": self.dispatcher.heap_size,
+            "next_fire": next_fire.isoformat() if next_fire else None,
+            **self.counters
+        }
+    
+    def start(self):
+        """Запускает отправку напоминаний (внутри работающего event loop)"""
+        self.dispatcher.start()
+    
+    async def stop(self):
+        """Останавливает отправку (до закрытия HTTP-клиента бота)"""
+        await self.dispatcher.stop()
+    
+    def close(self):
+        """Сбрасывает хранилище на диск и закрывает его"""
+        if self.store is not None:
+            self.store.close()
+    
+    def rehydrate(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """
+        Восстанавливает напоминания из хранилища одним проходом при запуске.
+
+        Будущие напоминания снова попадают в очередь. Напоминания, время
+        которых прошло во время простоя, при политике send отправляются
+        сразу, если тренировка еще не началась; остальные удаляются.
+        """
+        counts = {"scheduled": 0, "caught_up": 0, "dropped": 0}
+        if self.store is None:
+            return counts
+        
+        now = now or datetime.now()
+        restored = []
+        for job_id, reminder in self.store.all().items():
+            fire_at = datetime.fromisoformat(reminder["fire_at"])
+            booking_data = reminder["booking"]
+            
+            if fire_at > now:
+                restored.append((job_id, fire_at, booking_data))
+                counts["scheduled"] += 1
+            elif self.catchup == "send" and fire_at + REMINDER_ADVANCE > now:
+                restored.append((job_id, now, booking_data))
+                counts["caught_up"] += 1
+            else:
+                self.store.remove(job_id)
+                counts["dropped"] += 1
+        
+        self.dispatcher.push_many(restored)
+        logger.info(f"Напоминания восстановлены: {counts}")
+        return counts
+    
+    def schedule_reminder(self, booking_data: dict) -> bool:
+        """
+        Планирует напоминание за 2 часа до тренировки.
+
+        Повторный вызов для того же (user_id, date, time) ничего не делает,
+        поэтому повторное подтверждение не создает дубль. Возвращает True,
+        если напоминание запланировано.
+        """
         try:
             # Парсим дату и время тренировки
             training_date_str = booking_data.get('date')
@@ -24,104 +276,145 @@ class ReminderSystem:
             
             if not training_date_str or not training_time_str:
                 logger.error("Не удалось получить дату или время тренировки")
-                return
+                return False
             
             # Создаем datetime объект для времени тренировки
             training_datetime = datetime.strptime(f"{training_date_str} {training_time_str}", "%Y-%m-%d %H:%M")
             
             # Время напоминания (за 2 часа до тренировки)
-            reminder_time = training_datetime - timedelta(hours=2)
+            reminder_time = training_datetime - REMINDER_ADVANCE
             
             # Проверяем, что напоминание не в прошлом
             if reminder_time <= datetime.now():
                 logger.warning(f"Время напоминания в прошлом: {reminder_time}")
-                return
+                return False
             
-            # Создаем уникальный ID для задачи
-            job_id = f"reminder_{booking_data.get('user_id')}_{training_date_str}_{training_time_str}"
+            job_id = self.reminder_id(booking_data.get('user_id'), training_date_str, training_time_str)
+            if job_id in self.dispatcher:
+                self.counters["duplicates"] += 1
+                logger.info(f"Напоминание уже запланировано: {job_id}")
+                return False
+            
+            # Сначала сохраняем, чтобы напоминание пережило перезапуск
+            if self.store is not None:
+                self.store.add(job_id, reminder_time, booking_data)
             
             # Планируем напоминание
-            self.job_queue.run_once(
-                self.send_reminder,
-                reminder_time,
-                data=booking_data,
-                name=job_id
-            )
+            self.dispatcher.push(job_id, reminder_time, booking_data)
             
+            self.counters["scheduled"] += 1
             logger.info(f"Напоминание запланировано на {reminder_time} для тренировки {training_datetime}")
+            return True
             
         except Exception as e:
             logger.error(f"Ошибка при планировании напоминания: {e}")
+            return False
     
-    async def send_reminder(self, context):
-        """Отправляет напоминания пользователю и админу"""
+    def reschedule_reminder(self, user_id: int, old_date: str, old_time: str,
+                            booking_data: dict) -> bool:
+        """Переносит напоминание, когда тренировка переносится на другие дату или время"""
+        self.cancel_reminder(user_id, old_date, old_time)
+        scheduled = self.schedule_reminder(booking_data)
+        if scheduled:
+            self.counters["rescheduled"] += 1
+        return scheduled
+    
+    async def _send_batch(self, batch: List[Tuple[str, Dict]]):
+        """Отправляет наступившие напоминания: пользователям параллельно через очередь, админу - сводку"""
+        results = await asyncio.gather(
+            *(self._send_user_reminder(booking_data) for _, booking_data in batch),
+            return_exceptions=True
+        )
+        for (job_id, booking_data), result in zip(batch, results):
+            if isinstance(result, Exception):
+                self.counters["failed"] += 1
+                logger.error(f"Ошибка при отправке напоминания {job_id}: {result}")
+            else:
+                self.counters["sent"] += 1
+        
         try:
-            booking_data = context.job.data
-            
-            user_id = booking_data.get('user_id')
-            park_name = booking_data.get('park_name')
-            park_link = booking_data.get('park_link')
-            training_time = booking_data.get('time')
-            user_name = booking_data.get('user_name')
-            username = booking_data.get('username')
-            
-            # Сообщение для пользователя
-            user_message = (
-                f"⏰ *Напоминание о тренировке!*\n\n"
-                f"🏂 Через 2 часа у вас тренировка!\n\n"
-                f"🏞️ *Место:* {park_name}\n"
-                f"⏰ *Время:* {training_time}\n"
-                f"🗺️ [Открыть на карте]({park_link})\n\n"
-                f"📋 Не забудьте:\n"
-                f"• Удобную одежду\n"
-                f"• Воду\n"
-                f"• Хорошее настроение!\n\n"
-                f"🚀 Удачной тренировки!"
-            )
-            
-            # Сообщение для админа
-            admin_message = (
-                f"⏰ *Напоминание о тренировке!*\n\n"
-                f"🏂 Через 2 часа тренировка!\n\n"
-                f"👤 *Ученик:* {user_name}\n"
-                f"📱 *Username:* {username}\n"
-                f"🏞️ *Парк:* {park_name}\n"
-                f"⏰ *Время:* {training_time}\n\n"
-                f"🗺️ [Открыть на карте]({park_link})"
-            )
-            
-            # Отправляем напоминания
-            await self.bot.send_message(
-                chat_id=user_id,
-                text=user_message,
-                parse_mode='Markdown',
-                disable_web_page_preview=True
-            )
-            
-            await self.bot.send_message(
+            await self._send_admin_digest([booking_data for _, booking_data in batch])
+        except Exception as e:
+            logger.error(f"Ошибка при отправке сводки напоминаний: {e}")
+        
+        # Напоминание отправляется один раз, даже если отправка не удалась
+        if self.store is not None:
+            for job_id, _ in batch:
+                self.store.remove(job_id)
+        
+        logger.info(f"Напоминания отправлены: {len(batch)}")
+    
+    async def _send_user_reminder(self, booking_data: Dict):
+        """Отправляет напоминание пользователю"""
+        user_message = (
+            f"⏰ *Напоминание о тренировке!*\n\n"
+            f"🏂 Через 2 часа у вас тренировка!\n\n"
+            f"🏞️ *Место:* {booking_data.get('park_name')}\n"
+            f"⏰ *Время:* {booking_data.get('time')}\n"
+            f"🗺️ [Открыть на карте]({booking_data.get('park_link')})\n\n"
+            f"📋 Не забудьте:\n"
+            f"• Удобную одежду\n"
+            f"• Воду\n"
+            f"• Хорошее настроение!\n\n"
+            f"🚀 Удачной тренировки!"
+        )
+        
+        await self.send_queue.send_message(
+            chat_id=booking_data.get('user_id'),
+            text=user_message,
+            priority=USER,
+            parse_mode='Markdown',
+            disable_web_page_preview=True
+        )
+    
+    async def _send_admin_digest(self, bookings: List[Dict]):
+        """Отправляет админу одну сводку по всем наступившим тренировкам"""
+        header = f"⏰ *Напоминание о тренировках!*\n\n🏂 Через 2 часа тренировок: {len(bookings)}\n\n"
+        entries = [
+            f"👤 *Ученик:* {booking_data.get('user_name')} ({booking_data.get('username')})\n"
+            f"🏞️ *Парк:* {booking_data.get('park_name')}\n"
+            f"⏰ *Время:* {booking_data.get('time')}\n"
+            f"🗺️ [Открыть на карте]({booking_data.get('park_link')})\n\n"
+            for booking_data in sorted(bookings, key=lambda b: (b.get('time') or '', b.get('park_name') or ''))
+        ]
+        
+        # Длинная сводка делится на несколько сообщений
+        messages = [header]
+        for entry in entries:
+            if len(messages[-1]) + len(entry) > self.DIGEST_LIMIT:
+                messages.append("")
+            messages[-1] += entry
+        
+        for message in messages:
+            await self.send_queue.send_message(
                 chat_id=ADMIN_ID,
-                text=admin_message,
+                text=message,
+                priority=ADMIN,
                 parse_mode='Markdown',
                 disable_web_page_preview=True
             )
-            
-            logger.info(f"Напоминания отправлены для тренировки в {training_time}")
-            
-        except Exception as e:
-            logger.error(f"Ошибка при отправке напоминания: {e}")
     
-    def cancel_reminder(self, user_id: int, training_date: str, training_time: str):
-        """Отменяет запланированное напоминание"""
+    def cancel_reminder(self, user_id: int, training_date: str, training_time: str) -> bool:
+        """Отменяет запланированное напоминание, возвращает True, если оно было"""
         try:
-            job_id = f"reminder_{user_id}_{training_date}_{training_time}"
-            self.job_queue.get_jobs_by_name(job_id)
-            
-            # Удаляем все задачи с таким именем
-            jobs = self.job_queue.get_jobs_by_name(job_id)
-            for job in jobs:
-                job.schedule_removal()
+            job_id = self.reminder_id(user_id, training_date, training_time)
+            if not self.dispatcher.cancel(job_id):
+                return False
+            if self.store is not None:
+                self.store.remove(job_id)
             
+            self.counters["cancelled"] += 1
             logger.info(f"Напоминание отменено: {job_id}")
+            return True
             
         except Exception as e:
             logger.error(f"Ошибка при отмене напоминания: {e}")
+            return False
+
+
+def create_reminder_store() -> ReminderStore:
+    """Создает хранилище напоминаний из STORAGE_BACKEND"""
+    if STORAGE_BACKEND == 'sqlite':
+        from sqlite_backend import SQLiteReminderStore
+        return SQLiteReminderStore()
+    return ReminderStore()
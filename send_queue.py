@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Очередь исходящих сообщений для MSK SK8COOL
+"""
+
+import asyncio
+import itertools
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Set
+
+from telegram import Bot
+from telegram.error import RetryAfter
+
+from ratelimit import AsyncRateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты: меньше - раньше
+ADMIN = 0   # уведомления админу
+USER = 1    # ответы и уведомления пользователям
+BULK = 2    # посты в канал и рассылки
+
+LANES = {ADMIN: "admin", USER: "user", BULK: "bulk"}
+
+
+class _Chat:
+    """Очередь сообщений одного чата и его корзина токенов"""
+
+    __slots__ = ("messages", "limiter", "busy", "scheduled")
+
+    def __init__(self, limiter: AsyncRateLimiter):
+        # (приоритет, seq, элемент) в порядке постановки
+        self.messages: Deque[tuple] = deque()
+        self.limiter = limiter
+        # Сообщение чата сейчас отправляется
+        self.busy = False
+        # Чат стоит в очереди готовых или ждет токен по таймеру
+        self.scheduled = False
+
+    @property
+    def idle(self) -> bool:
+        return not (self.messages or self.busy or self.scheduled)
+
+
+class SendQueue:
+    """
+    Общая очередь send_message для всего бота.
+
+    У каждого чата своя очередь сообщений (FIFO) и своя корзина токенов
+    (Telegram: не больше ~1 сообщения в секунду в личный чат и 20 в минуту
+    в группу или канал). В общую очередь готовых попадает только чат,
+    у которого есть токен, - с приоритетом и seq первого сообщения.
+    Чат без токена ставится в нее по таймеру, когда токен появится,
+    поэтому корутины отправки никогда не ждут лимит одного чата,
+    и серия сообщений в один чат (например, админу) не задерживает
+    остальные. Общая корзина (~30 сообщений в секунду на бота)
+    проверяется уже при отправке.
+
+    Из каждого чата одновременно отправляется одно сообщение, поэтому
+    порядок сообщений чата сохраняется. При RetryAfter отправка ставится
+    на паузу на указанное время, а сообщение возвращается в начало
+    очереди своего чата.
+    """
+
+    MAX_CHATS = 10_000
+
+    def __init__(self, bot: Bot, workers: int = 8, global_rate: float = 25,
+                 chat_rate: float = 1.0, group_rate: float = 20 / 60,
+                 chat_burst: int = 3, max_retries: int = 3):
+        self.bot = bot
+        self.workers = workers
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.global_limiter = AsyncRateLimiter(global_rate, burst=int(global_rate))
+
+        # Готовые к отправке чаты: (приоритет, seq, chat_id, чат)
+        self._ready: "asyncio.PriorityQueue" = asyncio.PriorityQueue()
+        self._seq = itertools.count()
+        self._chats: "OrderedDict[int, _Chat]" = OrderedDict()
+        self._resume_at = 0.0
+        self._tasks: List[asyncio.Task] = []
+        self._sending: Set[asyncio.Future] = set()
+        # Сообщения, которые еще не отправлены и не завершились ошибкой
+        self._unfinished = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+        # Метрики
+        self.depth = {lane: 0 for lane in LANES}
+        self.in_flight = 0
+        self.counters = {"sent": 0, "retried": 0, "failed": 0}
+
+    def start(self):
+        """Запускает отправку в текущем event loop"""
+        if not self._tasks:
+            loop = asyncio.get_running_loop()
+            self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = 10.0):
+        """Дожидается отправки очереди (не дольше timeout) и останавливается"""
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Очередь сообщений не разобрана при остановке: {self.stats()}")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, chat_id: int, text: str, priority: int = USER, **kwargs) -> asyncio.Future:
+        """Ставит сообщение в очередь, возвращает future с отправленным сообщением"""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        kwargs["text"] = text
+        self._unfinished += 1
+        self._idle.clear()
+
+        chat = self._chat(chat_id)
+        chat.messages.append((priority, next(self._seq), (future, chat_id, kwargs, 0)))
+        self.depth[priority] += 1
+        self._schedule(chat_id, chat)
+        return future
+
+    async def send_message(self, chat_id: int, text: str, priority: int = USER, **kwargs):
+        """Отправляет сообщение через очередь и ждет результата"""
+        return await self.submit(chat_id, text, priority, **kwargs)
+
+    def is_sending(self, future: asyncio.Future) -> bool:
+        """Сообщение уже передано в Telegram, и отменить его нельзя"""
+        return future in self._sending
+
+    def stats(self) -> Dict:
+        """Глубина очереди по приоритетам и счетчики отправки"""
+        return {
+            "depth": {LANES[lane]: count for lane, count in self.depth.items()},
+            "in_flight": self.in_flight,
+            "paused_for": max(0.0, self._resume_at - time.monotonic()),
+            **self.counters
+        }
+
+    def _chat(self, chat_id: int) -> _Chat:
+        """Очередь и корзина чата; давно не использованные простаивающие чаты вытесняются"""
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            rate = self.group_rate if chat_id < 0 else self.chat_rate
+            chat = self._chats[chat_id] = _Chat(AsyncRateLimiter(rate, burst=self.chat_burst))
+            if len(self._chats) > self.MAX_CHATS:
+                for old_id, old_chat in self._chats.items():
+                    if old_chat.idle:
+                        del self._chats[old_id]
+                        break
+        else:
+            self._chats.move_to_end(chat_id)
+        return chat
+
+    def _schedule(self, chat_id: int, chat: _Chat):
+        """Ставит чат в очередь готовых, если у него есть сообщения и токен"""
+        if chat.busy or chat.scheduled or not chat.messages:
+            return
+        chat.scheduled = True
+        wait = chat.limiter.try_acquire()
+        if wait > 0:
+            asyncio.get_running_loop().call_later(wait, self._wake, chat_id, chat)
+            return
+        priority, seq, _ = chat.messages[0]
+        self._ready.put_nowait((priority, seq, chat_id, chat))
+
+    def _wake(self, chat_id: int, chat: _Chat):
+        """В корзине чата появился токен"""
+        chat.scheduled = False
+        self._schedule(chat_id, chat)
+
+    async def _worker(self):
+        while True:
+            _, _, chat_id, chat = await self._ready.get()
+            chat.scheduled = False
+            chat.busy = True
+            priority, seq, item = chat.messages.popleft()
+            self.depth[priority] -= 1
+            self.in_flight += 1
+            try:
+                await self._send(priority, seq, item, chat)
+            except Exception as e:
+                logger.error(f"Ошибка в очереди сообщений: {e}")
+                self._fail(item[0], e)
+            finally:
+                self.in_flight -= 1
+                chat.busy = False
+                self._schedule(chat_id, chat)
+
+    async def _send(self, priority: int, seq: int, item: tuple, chat: _Chat):
+        future, chat_id, kwargs, attempt = item
+        if future.done():
+            # Отменено, пока сообщение ждало в очереди
+            self._finish()
+            return
+
+        delay = self._resume_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await self.global_limiter.acquire()
+        if future.done():
+            self._finish()
+            return
+
+        self._sending.add(future)
+        try:
+            message = await self.bot.send_message(chat_id=chat_id, **kwargs)
+        except RetryAfter as e:
+            retry_after = e.retry_after
+            retry_after = getattr(retry_after, "total_seconds", lambda: retry_after)()
+            self._resume_at = max(self._resume_at, time.monotonic() + retry_after)
+            if attempt < self.max_retries:
+                self.counters["retried"] += 1
+                logger.warning(f"Flood control, пауза {retry_after} с, сообщение в {chat_id} будет повторено")
+                # Сообщение возвращается в начало очереди чата и уйдет раньше следующих
+                chat.messages.appendleft((priority, seq, (future, chat_id, kwargs, attempt + 1)))
+                self.depth[priority] += 1
+                return
+            self._fail(future, e)
+        except Exception as e:
+            self._fail(future, e)
+        else:
+            self.counters["sent"] += 1
+            if not future.done():
+                future.set_result(message)
+            self._finish()
+        finally:
+            self._sending.discard(future)
+
+    def _finish(self):
+        """Сообщение завершено: отправлено, отменено или не отправлено"""
+        self._unfinished -= 1
+        if not self._unfinished:
+            self._idle.set()
+
+    def _fail(self, future: asyncio.Future, error: Exception):
+        self.counters["failed"] += 1
+        if not future.done():
+            future.set_exception(error)
+        self._finish()
@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+SQLite-хранилище записей и прогресса для MSK SK8COOL
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from database import BookingDatabase
+from progress import ProgressSystem
+from reminders import ReminderStore
+
+logger = logging.getLogger(__name__)
+
+
+def connect(db_file: str) -> sqlite3.Connection:
+    """
+    Открывает соединение в режиме WAL.
+
+    Все запросы параметризованы, поэтому sqlite3 берет подготовленные
+    выражения из своего кэша и не компилирует SQL повторно.
+    """
+    conn = sqlite3.connect(db_file, check_same_thread=False, cached_statements=256)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class SQLiteBookingDatabase(BookingDatabase):
+    """База записей в SQLite с индексами по user_id, status и (date, time)"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS bookings (
+            id TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            date TEXT,
+            time TEXT,
+            created_at TEXT NOT NULL,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_bookings_user ON bookings (user_id);
+        CREATE INDEX IF NOT EXISTS idx_bookings_status ON bookings (status);
+        CREATE INDEX IF NOT EXISTS idx_bookings_slot ON bookings (date, time);
+        CREATE INDEX IF NOT EXISTS idx_bookings_created ON bookings (created_at);
+    """
+
+    def __init__(self, db_file: str = "bookings.db"):
+        self.db_file = db_file
+        self.storage = None
+        self._lock = threading.Lock()
+        self.conn = connect(db_file)
+        self.conn.executescript(self.SCHEMA)
+
+    def load_bookings(self) -> Dict:
+        """Загружает все записи (для выгрузки и миграций)"""
+        return {booking['id']: booking for booking in self._select("SELECT data FROM bookings")}
+
+    def save_bookings(self):
+        """Фиксирует изменения: каждая мутация и так пишется сразу"""
+        with self._lock:
+            self.conn.commit()
+
+    def close(self):
+        """Закрывает соединение"""
+        with self._lock:
+            self.conn.close()
+
+    def _select(self, sql: str, params=()) -> List[Dict]:
+        with self._lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        return [json.loads(row['data']) for row in rows]
+
+    def _write(self, booking: Dict, replace: bool = True):
+        # Новая запись вставляется без REPLACE: совпавший ID - ошибка, а не перезапись
+        verb = "INSERT OR REPLACE" if replace else "INSERT"
+        with self._lock, self.conn:
+            self.conn.execute(
+                f"{verb} INTO bookings (id, user_id, status, date, time, created_at, data) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (booking['id'], booking['user_id'], booking['status'], booking.get('date'),
+                 booking.get('time'), booking['created_at'],
+                 json.dumps(booking, ensure_ascii=False))
+            )
+
+    def add_booking(self, user_id: int, user_name: str, booking_data: Dict) -> str:
+        """Добавляет новую запись"""
+        booking = self._new_booking(user_id, user_name, booking_data)
+        self._write(booking, replace=False)
+        return booking['id']
+
+    def get_booking(self, booking_id: str) -> Optional[Dict]:
+        """Получает запись по ID"""
+        rows = self._select("SELECT data FROM bookings WHERE id = ?", (booking_id,))
+        return rows[0] if rows else None
+
+    def get_user_bookings(self, user_id: int) -> List[Dict]:
+        """Получает все записи пользователя"""
+        return self._select("SELECT data FROM bookings WHERE user_id = ?", (user_id,))
+
+    def get_pending_bookings(self) -> List[Dict]:
+        """Получает все ожидающие подтверждения записи"""
+        return self._select("SELECT data FROM bookings WHERE status = ?", ('pending',))
+
+    def get_slot_bookings(self, date: str, time: str) -> List[Dict]:
+        """Получает все записи на указанные дату и время"""
+        return self._select("SELECT data FROM bookings WHERE date = ? AND time = ?", (date, time))
+
+    def iter_bookings(self, date: Optional[str] = None) -> Iterator[Dict]:
+        """Перебирает записи порциями по 500, не загружая всю таблицу"""
+        date_filter = " AND date = ?" if date is not None else ""
+        params = (date,) if date is not None else ()
+        last_rowid = 0
+        while True:
+            with self._lock:
+                rows = self.conn.execute(
+                    f"SELECT rowid, data FROM bookings WHERE rowid > ?{date_filter} ORDER BY rowid LIMIT 500",
+                    (last_rowid,) + params
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield json.loads(row['data'])
+            last_rowid = rows[-1]['rowid']
+
+    def _update_booking(self, booking_id: str, **changes):
+        """Применяет изменения к записи и сохраняет ее"""
+        booking = self.get_booking(booking_id)
+        if booking is not None:
+            booking.update(changes)
+            self._write(booking)
+
+    def delete_booking(self, booking_id: str):
+        """Удаляет запись"""
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM bookings WHERE id = ?", (booking_id,))
+
+    def get_upcoming_bookings(self, hours_ahead: int = 2) -> List[Dict]:
+        """Получает предстоящие записи через указанное количество часов"""
+        now = datetime.now()
+        target_time = now + timedelta(hours=hours_ahead)
+
+        # Индекс (date, time) сужает выборку до нужных дней
+        candidates = self._select(
+            "SELECT data FROM bookings WHERE date BETWEEN ? AND ? AND status = ?",
+            (now.strftime('%Y-%m-%d'), target_time.strftime('%Y-%m-%d'), 'confirmed')
+        )
+
+        upcoming = []
+        for booking in candidates:
+            try:
+                booking_datetime = datetime.fromisoformat(booking['date'] + 'T' + booking['time'])
+                if now <= booking_datetime <= target_time:
+                    upcoming.append(booking)
+            except:
+                continue
+
+        return upcoming
+
+    def delete_old_bookings(self, days: int = 30):
+        """Удаляет старые записи"""
+        cutoff_date = datetime.now() - timedelta(days=days)
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM bookings WHERE created_at < ?", (cutoff_date.isoformat(),))
+
+    def get_statistics(self) -> Dict:
+        """Получает статистику по записям"""
+        stats = {'total': 0, 'pending': 0, 'confirmed': 0, 'rejected': 0, 'cancelled': 0, 'expired': 0, 'completed': 0}
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT status, COUNT(*) AS count FROM bookings GROUP BY status"
+            ).fetchall()
+
+        for row in rows:
+            stats[row['status']] = row['count']
+            stats['total'] += row['count']
+        return stats
+
+
+class SQLiteProgressSystem(ProgressSystem):
+    """
+    Прогресс в SQLite: пользователи и тренировки в отдельных таблицах.
+
+    При сохранении пишется только строка изменившегося пользователя
+    и его новые тренировки, а не весь набор данных.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS users (
+            user_id TEXT PRIMARY KEY,
+            user_name TEXT,
+            username TEXT,
+            level TEXT NOT NULL,
+            total_sessions INTEGER NOT NULL,
+            first_session TEXT,
+            last_session TEXT,
+            achievements TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_users_total ON users (total_sessions);
+        CREATE TABLE IF NOT EXISTS sessions (
+            user_id TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            date TEXT,
+            time TEXT,
+            park TEXT,
+            timestamp TEXT,
+            PRIMARY KEY (user_id, seq)
+        );
+    """
+
+    def __init__(self, db_file: str = "progress.db"):
+        self._lock = threading.Lock()
+        self.conn = connect(db_file)
+        self.conn.executescript(self.SCHEMA)
+        super().__init__(db_file)
+
+    def _load_progress(self) -> Dict:
+        """Загружает данные прогресса из базы"""
+        progress_data = {}
+        with self._lock:
+            for row in self.conn.execute("SELECT * FROM users"):
+                progress_data[row['user_id']] = {
+                    "user_name": row['user_name'],
+                    "username": row['username'],
+                    "sessions": [],
+                    "achievements": json.loads(row['achievements']),
+                    "level": row['level'],
+                    "total_sessions": row['total_sessions'],
+                    "first_session": row['first_session'],
+                    "last_session": row['last_session']
+                }
+
+            for row in self.conn.execute("SELECT * FROM sessions ORDER BY user_id, seq"):
+                user_data = progress_data.get(row['user_id'])
+                if user_data is not None:
+                    user_data["sessions"].append({
+                        "date": row['date'],
+                        "time": row['time'],
+                        "park": row['park'],
+                        "timestamp": row['timestamp']
+                    })
+        return progress_data
+
+    def _save_progress(self, user_ids: Optional[Iterable[str]] = None):
+        """Ставит в очередь записи указанных пользователей (или всех)"""
+        with self._data_lock:
+            users = [
+                (uid, dict(self.progress_data[uid], sessions=list(self.progress_data[uid]["sessions"])))
+                for uid in (user_ids if user_ids is not None else list(self.progress_data))
+            ]
+            self.writer.submit(self._write_users, users)
+
+    def _write_users(self, users: List):
+        """Пишет пользователей в базу (выполняется в потоке записи)"""
+        try:
+            with self._lock, self.conn:
+                for uid, user_data in users:
+                    self._write_user(uid, user_data)
+        except Exception as e:
+            logger.error(f"Ошибка сохранения прогресса: {e}")
+
+    def close(self):
+        """Сохраняет несохраненные изменения и закрывает соединение"""
+        super().close()
+        with self._lock:
+            self.conn.close()
+
+    def _write_user(self, user_id_str: str, user_data: Dict):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO users (user_id, user_name, username, level, total_sessions, "
+            "first_session, last_session, achievements) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (user_id_str, user_data["user_name"], user_data["username"], user_data["level"],
+             user_data["total_sessions"], user_data["first_session"], user_data["last_session"],
+             json.dumps(user_data["achievements"]))
+        )
+
+        # Дописываем только тренировки, которых еще нет в базе
+        stored = self.conn.execute(
+            "SELECT COUNT(*) FROM sessions WHERE user_id = ?", (user_id_str,)
+        ).fetchone()[0]
+        self.conn.executemany(
+            "INSERT INTO sessions (user_id, seq, date, time, park, timestamp) VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (user_id_str, seq, session["date"], session["time"], session["park"], session["timestamp"])
+                for seq, session in enumerate(user_data["sessions"][stored:], stored)
+            ]
+        )
+
+
+class SQLiteReminderStore(ReminderStore):
+    """Запланированные напоминания в таблице SQLite"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS reminders (
+            id TEXT PRIMARY KEY,
+            fire_at TEXT NOT NULL,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_reminders_fire_at ON reminders (fire_at);
+    """
+
+    def __init__(self, db_file: str = "reminders.db"):
+        self._lock = threading.Lock()
+        self.conn = connect(db_file)
+        self.conn.executescript(self.SCHEMA)
+
+    def add(self, job_id: str, fire_at: datetime, booking_data: Dict):
+        """Сохраняет напоминание"""
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO reminders (id, fire_at, data) VALUES (?, ?, ?)",
+                (job_id, fire_at.isoformat(), json.dumps(booking_data, ensure_ascii=False))
+            )
+
+    def remove(self, job_id: str):
+        """Удаляет напоминание, если оно есть"""
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM reminders WHERE id = ?", (job_id,))
+
+    def all(self) -> Dict[str, Dict]:
+        """Все сохраненные напоминания в порядке времени отправки"""
+        with self._lock:
+            rows = self.conn.execute("SELECT * FROM reminders ORDER BY fire_at").fetchall()
+        return {
+            row['id']: {"fire_at": row['fire_at'], "booking": json.loads(row['data'])}
+            for row in rows
+        }
+
+    def close(self):
+        """Закрывает соединение"""
+        with self._lock:
+            self.conn.close()
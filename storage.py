@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Хранилища данных для MSK SK8COOL
+"""
+
+import asyncio
+import json
+import logging
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def atomic_write_bytes(path: str, content: bytes):
+    """Атомарно записывает файл: временный файл, fsync и os.replace"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def atomic_write_text(path: str, content: str):
+    """Атомарно записывает текстовый файл"""
+    atomic_write_bytes(path, content.encode('utf-8'))
+
+
+def atomic_write_json(path: str, data, indent: Optional[int] = 2):
+    """Атомарно записывает JSON"""
+    atomic_write_text(path, json.dumps(data, ensure_ascii=False, indent=indent))
+
+
+class BackgroundWriter:
+    """
+    Единственный поток записи на диск.
+
+    Задачи выполняются строго в порядке постановки, поэтому обработчикам
+    бота не нужно ждать диск, а порядок записей сохраняется.
+    flush() и aflush() дожидаются всех уже поставленных задач.
+    """
+
+    def __init__(self, name: str = "storage-writer"):
+        self.name = name
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, fn: Callable, *args) -> Future:
+        """Ставит задачу в очередь записи"""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((future, fn, args))
+        return future
+
+    def flush(self):
+        """Блокирующе ждет выполнения всех поставленных задач"""
+        self.submit(lambda: None).result()
+
+    async def aflush(self):
+        """Ждет выполнения всех поставленных задач, не блокируя event loop"""
+        await asyncio.wrap_future(self.submit(lambda: None))
+
+    def pending(self) -> int:
+        """Количество задач в очереди"""
+        return self._queue.qsize()
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            future, fn, args = self._queue.get()
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn(*args))
+                except Exception as e:
+                    logger.error(f"Ошибка фоновой записи: {e}")
+                    future.set_exception(e)
+
+
+# Общая очередь записи на весь процесс
+default_writer = BackgroundWriter()
+
+
+class JsonLogStorage:
+    """
+    Журнал изменений в формате JSON lines поверх JSON-снапшота.
+
+    Каждое изменение дописывает в журнал одну строку, поэтому стоимость
+    записи не зависит от количества хранимых записей. Строка сериализуется
+    в вызывающем потоке, а на диск попадает через BackgroundWriter.
+    fsync выполняется пачками: по достижении fsync_batch строк или раз
+    в fsync_interval секунд. При запуске снапшот загружается, а журнал
+    проигрывается поверх него. Когда в журнале набирается compact_after
+    строк, очередь записи сворачивает его в новый снапшот.
+    """
+
+    def __init__(self, snapshot_file: str, fsync_batch: int = 32,
+                 fsync_interval: float = 1.0, compact_after: int = 1000,
+                 writer: Optional[BackgroundWriter] = None):
+        self.snapshot_file = snapshot_file
+        self.log_file = f"{snapshot_file}.log"
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+        self.compact_after = compact_after
+        self.writer = writer or default_writer
+
+        # Снимок данных и постановка в очередь идут под одной блокировкой,
+        # чтобы порядок строк в журнале совпадал с порядком изменений
+        self._lock = threading.Lock()
+        self._log = None
+        self._log_records = 0
+        self._unsynced = 0
+        self._stop = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+
+    def load(self) -> Dict[str, Dict]:
+        """Загружает снапшот и проигрывает поверх него журнал"""
+        records = self._read_snapshot()
+        self._log_records = self._replay(self.log_file, records)
+
+        self._log = open(self.log_file, 'a', encoding='utf-8')
+        if self._log.tell() and not self._log_ends_with_newline():
+            # Не дописываем новую строку к оборванной
+            self._log.write("\n")
+
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+            self._flusher.start()
+        return records
+
+    def put(self, key: str, record: Dict):
+        """Записывает новое состояние записи"""
+        self._append({"op": "put", "key": key, "record": record})
+
+    def delete(self, key: str):
+        """Удаляет запись"""
+        self._append({"op": "del", "key": key})
+
+    def needs_compaction(self) -> bool:
+        """Пора ли свернуть журнал в снапшот"""
+        return self._log_records >= self.compact_after
+
+    def compact(self, records: Dict[str, Dict], background: bool = True):
+        """Сворачивает журнал в новый снапшот"""
+        with self._lock:
+            # Копия делается здесь, сериализация - уже в потоке записи
+            snapshot = {key: dict(record) for key, record in records.items()}
+            self._log_records = 0
+            future = self.writer.submit(self._write_snapshot, snapshot)
+
+        if not background:
+            future.result()
+
+    def flush(self):
+        """Сбрасывает журнал на диск"""
+        self.writer.submit(self._sync).result()
+
+    def close(self):
+        """Останавливает сброс по таймеру, дописывает журнал и закрывает его"""
+        self._stop.set()
+        if self._flusher is not None:
+            self._flusher.join()
+            self._flusher = None
+        self.writer.submit(self._close_log).result()
+
+    def _append(self, entry: Dict):
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._log_records += 1
+            self.writer.submit(self._write_line, line)
+
+    def _write_line(self, line: str):
+        self._log.write(line)
+        self._log.flush()
+        self._unsynced += 1
+        if self._unsynced >= self.fsync_batch:
+            self._sync()
+
+    def _sync(self):
+        if self._log is not None and self._unsynced:
+            os.fsync(self._log.fileno())
+            self._unsynced = 0
+
+    def _close_log(self):
+        if self._log is not None:
+            self._sync()
+            self._log.close()
+            self._log = None
+
+    def _write_snapshot(self, snapshot: Dict[str, Dict]):
+        """Пишет снапшот и очищает журнал (выполняется в потоке записи)"""
+        try:
+            atomic_write_json(self.snapshot_file, snapshot)
+        except Exception as e:
+            # Журнал не очищается и будет проигран при запуске
+            logger.error(f"Ошибка записи снапшота {self.snapshot_file}: {e}")
+            return
+
+        # Сбой между заменой снапшота и очисткой журнала безопасен:
+        # проигрывание журнала поверх нового снапшота ничего не меняет
+        self._log.truncate(0)
+        self._log.seek(0)
+        self._unsynced = 0
+
+    def _log_ends_with_newline(self) -> bool:
+        with open(self.log_file, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.fsync_interval):
+            self.writer.submit(self._sync)
+
+    def _read_snapshot(self) -> Dict[str, Dict]:
+        if not os.path.exists(self.snapshot_file):
+            return {}
+        try:
+            with open(self.snapshot_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.error(f"Ошибка чтения снапшота {self.snapshot_file}: {e}")
+            return {}
+
+    def _replay(self, path: str, records: Dict[str, Dict]) -> int:
+        """Применяет записи журнала, возвращает количество строк"""
+        if not os.path.exists(path):
+            return 0
+
+        count = 0
+        with open(path, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # Оборванная строка после сбоя во время записи
+                    logger.warning(f"Пропущена поврежденная строка {line_number} в {path}")
+                    continue
+
+                if entry["op"] == "put":
+                    records[entry["key"]] = entry["record"]
+                elif entry["op"] == "del":
+                    records.pop(entry["key"], None)
+                count += 1
+        return count
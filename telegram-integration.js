@@ -69,9 +69,21 @@ class TelegramGameIntegration {
         });
     }
     
-    // Отправка счета в бота
-    sendScore(score, gameData = {}) {
-        if (!this.isTelegram) return;
+    // Запрос к API бота; initData подтверждает, кто играет
+    async apiRequest(path, options = {}) {
+        const response = await fetch(path, {
+            ...options,
+            headers: {
+                'Content-Type': 'application/json',
+                'Authorization': `tma ${this.tg.initData}`
+            }
+        });
+        return response.json();
+    }
+    
+    // Отправка счета в бота (без закрытия Mini App)
+    async sendScore(score, gameData = {}) {
+        if (!this.isTelegram) return null;
         
         const data = {
             action: 'game_score',
@@ -81,8 +93,17 @@ class TelegramGameIntegration {
             ...gameData
         };
         
-        this.tg.sendData(JSON.stringify(data));
-        console.log('Score sent to bot:', data);
+        try {
+            const result = await this.apiRequest('/api/score', {
+                method: 'POST',
+                body: JSON.stringify(data)
+            });
+            console.log('Score sent to bot:', result);
+            return result;
+        } catch (error) {
+            console.error('Score submission failed:', error);
+            return null;
+        }
     }
     
     // Отправка события игры
@@ -97,15 +118,22 @@ class TelegramGameIntegration {
             ...data
         };
         
-        this.tg.sendData(JSON.stringify(eventData));
+        // sendData закрывает Mini App, поэтому события только логируются
+        console.log('Game event:', eventData);
     }
     
     // Показать таблицу лидеров
-    showLeaderboard() {
-        this.tg.sendData(JSON.stringify({
-            action: 'show_leaderboard',
-            game: 'dog_skate'
-        }));
+    async showLeaderboard() {
+        try {
+            const data = await this.apiRequest('/api/leaderboard?limit=10');
+            const lines = data.top.map((entry, i) => `${i + 1}. ${entry.user_name} — ${entry.score}`);
+            if (data.me && data.me.rank) {
+                lines.push('', `Твое место: ${data.me.rank} (рекорд ${data.me.best})`);
+            }
+            this.showAlert(lines.length ? lines.join('\n') : 'Пока никто не играл. Будь первым!');
+        } catch (error) {
+            console.error('Leaderboard request failed:', error);
+        }
     }
     
     // Поделиться результатом
@@ -173,6 +201,7 @@ class TelegramDogSkateGame extends DogSkateGame {
     
     startGame() {
         super.startGame();
+        this.gameStartTime = Date.now();
         this.telegram.sendGameEvent('game_started');
     }
     
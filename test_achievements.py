@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Тесты движка достижений
+"""
+
+from datetime import date, timedelta
+
+from achievements import COUNT, STREAK, WEEKLY, AchievementEngine
+from progress_snapshot import decode, encode
+
+# Четверг: три дня до него попадают в ту же неделю
+TODAY = date(2025, 3, 6)
+
+ACHIEVEMENTS = {
+    "first": {"rule": (COUNT, 1)},
+    "five": {"rule": (COUNT, 5)},
+    "fast": {"rule": (WEEKLY, 3)},
+    "weeks2": {"rule": (STREAK, 2)},
+    "weeks3": {"rule": (STREAK, 3)},
+}
+
+
+def play(engine: AchievementEngine, dates, today: date = TODAY) -> list:
+    """Добавляет тренировки по одной, как add_session, и возвращает полученные достижения"""
+    stats = engine.new_stats()
+    earned = []
+    for session_date in dates:
+        changed = engine.observe(stats, session_date)
+        earned.extend(engine.evaluate(stats, earned, changed, today))
+    return earned
+
+
+def test_consecutive_weeks():
+    """Серия считается только по неделям подряд, а пропуск между ними заполняется позже"""
+    engine = AchievementEngine(ACHIEVEMENTS)
+    stats = engine.new_stats()
+    # Понедельники 6, 13 и 27 января: две недели подряд, затем пропуск
+    for session_date in ("2025-01-06", "2025-01-13", "2025-01-27"):
+        engine.observe(stats, session_date)
+    assert stats.best_streak == 2
+    # Воскресенье той же недели, что и 13 января, серию не продлевает
+    assert STREAK not in engine.observe(stats, "2025-01-19")
+
+    # Неделя 20 января соединяет две серии в одну из четырех недель
+    assert STREAK in engine.observe(stats, "2025-01-20")
+    assert stats.best_streak == 4
+
+
+def test_incremental_rules():
+    """Достижения выдаются один раз, когда их метрика достигает порога"""
+    engine = AchievementEngine(ACHIEVEMENTS)
+    assert play(engine, ["2025-01-06"]) == ["first"]
+    assert play(engine, ["2025-01-06", "2025-01-13", "2025-01-20"]) == ["first", "weeks2", "weeks3"]
+
+    recent = [(TODAY - timedelta(days=days)).isoformat() for days in (3, 1, 0)]
+    assert play(engine, recent) == ["first", "fast"]
+    # Три тренировки за неделю, но неделя давно прошла
+    assert "fast" not in play(engine, recent, today=TODAY + timedelta(days=8))
+
+
+def test_bad_dates_count_only():
+    """Неразбираемая дата учитывается в количестве, но не в неделях"""
+    engine = AchievementEngine(ACHIEVEMENTS)
+    stats = engine.new_stats()
+    assert engine.observe(stats, "вчера") == {COUNT}
+    assert stats.count == 1
+    assert stats.best_streak == 0
+
+
+def generate(users: int) -> dict:
+    """Пользователи с разным числом тренировок и разрывами между неделями"""
+    progress_data = {}
+    start = TODAY.toordinal() - 60
+    for user in range(users):
+        # Тренировки добавляются по порядку дат
+        ordinals = sorted(start + (user * 3 + i * (user % 5 + 1) * 3) % 64 for i in range(user % 9))
+        dates = [date.fromordinal(ordinal).isoformat() for ordinal in ordinals]
+        if user % 7 == 0:
+            dates.append("не помню")
+        progress_data[str(user)] = {
+            "sessions": [{"date": value, "time": "18:00", "park": "Парк",
+                          "timestamp": "2025-01-01T00:00:00"} for value in dates],
+            "achievements": [],
+        }
+    return progress_data
+
+
+def test_incremental_matches_evaluate_all():
+    """Пакетный пересчет совпадает с пошаговым, в том числе по упакованному снапшоту"""
+    engine = AchievementEngine(ACHIEVEMENTS)
+    progress_data = generate(60)
+    incremental = {
+        user_id: sorted(play(engine, [s["date"] for s in user_data["sessions"]]))
+        for user_id, user_data in progress_data.items()
+    }
+
+    batch = engine.evaluate_all(progress_data, today=TODAY)
+    assert {user_id: sorted(ids) for user_id, ids in batch.items()} == incremental
+    packed = engine.evaluate_all(decode(encode(progress_data)), today=TODAY)
+    assert {user_id: sorted(ids) for user_id, ids in packed.items()} == incremental
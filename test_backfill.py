@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Тесты пересчета уровней и достижений
+"""
+
+import json
+import os
+
+import pytest
+
+import backfill
+
+
+def session(day: int) -> dict:
+    return {"date": f"2025-01-{day:02d}", "time": "18:00", "park": "Парк",
+            "timestamp": f"2025-01-{day:02d}T18:00:00"}
+
+
+def user(sessions: int, level: str, achievements: list) -> dict:
+    return {
+        "user_name": "Скейтер",
+        "username": "skater",
+        "sessions": [session(day) for day in range(1, sessions + 1)],
+        "achievements": achievements,
+        "level": level,
+        "total_sessions": sessions,
+    }
+
+
+@pytest.fixture
+def progress_file(tmp_path):
+    progress_data = {
+        # Устаревший уровень и недостающие достижения
+        "1": user(6, "novice", ["first_session"]),
+        # Достижение, которого больше нет в ACHIEVEMENTS, и невыполненное beginner
+        "2": user(2, "novice", ["first_session", "beginner", "removed_rule"]),
+        # Уже актуален
+        "3": user(1, "novice", ["first_session"]),
+    }
+    path = tmp_path / "progress.json"
+    path.write_text(json.dumps(progress_data, ensure_ascii=False, indent=2), encoding="utf-8")
+    return path, progress_data
+
+
+def test_iter_users_streams_small_chunks(progress_file, monkeypatch):
+    """Потоковое чтение совпадает с json.load при любом размере блока"""
+    path, progress_data = progress_file
+    monkeypatch.setattr(backfill, "_CHUNK_SIZE", 7)
+    assert dict(backfill.iter_users(str(path))) == progress_data
+
+    empty = path.parent / "empty.json"
+    empty.write_text("{ }", encoding="utf-8")
+    assert list(backfill.iter_users(str(empty))) == []
+
+
+def test_backfill_report_and_output(progress_file):
+    """Отчет описывает изменения, а файл совпадает с json.dump(indent=2) пересчитанных данных"""
+    path, progress_data = progress_file
+    report = backfill.backfill(str(path), workers=1)
+
+    assert report["users"] == 3
+    assert report["changed_users"] == 2
+    assert report["level_changes"] == {("novice", "amateur"): 1}
+    assert report["added"] == {"beginner": 1}
+    assert report["removed"] == {"removed_rule": 1}
+
+    expected = dict(progress_data)
+    expected["1"] = dict(progress_data["1"], level="amateur", achievements=["first_session", "beginner"])
+    expected["2"] = dict(progress_data["2"], achievements=["first_session", "beginner"])
+    assert path.read_text(encoding="utf-8") == json.dumps(expected, ensure_ascii=False, indent=2)
+    assert not os.path.exists(f"{path}.tmp")
+
+
+def test_revoke(progress_file):
+    """С --revoke снимаются достижения, условия которых больше не выполняются"""
+    path, _ = progress_file
+    report = backfill.backfill(str(path), revoke=True, workers=1)
+    assert report["removed"] == {"removed_rule": 1, "beginner": 1}
+    assert json.loads(path.read_text(encoding="utf-8"))["2"]["achievements"] == ["first_session"]
+
+
+def test_dry_run_keeps_file(progress_file):
+    """--dry-run только считает отчет"""
+    path, _ = progress_file
+    before = path.read_bytes()
+    assert backfill.backfill(str(path), dry_run=True, workers=1)["changed_users"] == 2
+    assert path.read_bytes() == before
+    assert not os.path.exists(f"{path}.tmp")
+
+
+def test_failure_keeps_original(progress_file):
+    """Если файл не дочитан до конца, исходный файл не меняется, а временный удаляется"""
+    path, _ = progress_file
+    broken = path.read_text(encoding="utf-8")[:-40]
+    path.write_text(broken, encoding="utf-8")
+
+    with pytest.raises(ValueError):
+        backfill.backfill(str(path), workers=1)
+    assert path.read_text(encoding="utf-8") == broken
+    assert not os.path.exists(f"{path}.tmp")
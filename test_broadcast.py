@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Тесты массовых рассылок
+"""
+
+import asyncio
+
+from telegram.error import Forbidden, NetworkError
+
+from broadcast import BLOCKED, DELIVERED, FAILED, BroadcastEngine
+from config import PARKS
+
+PARK = PARKS['park1']['name']
+
+
+class StubProgress:
+    def __init__(self, progress_data):
+        self.progress_data = progress_data
+
+
+class StubBookings:
+    def __init__(self, bookings):
+        self.bookings = bookings
+
+    def iter_bookings(self, date=None):
+        return (b for b in self.bookings if date is None or b.get('date') == date)
+
+
+class StubQueue:
+    """
+    Очередь, которая сразу отвечает результатом из errors
+    (ошибка или None - доставлено); чаты из hold остаются в очереди
+    """
+
+    def __init__(self, errors=None, hold=()):
+        self.errors = errors or {}
+        self.hold = set(hold)
+        self.submitted = []
+
+    def submit(self, chat_id, text, priority, **kwargs):
+        self.submitted.append(chat_id)
+        self.kwargs = kwargs
+        future = asyncio.get_running_loop().create_future()
+        if chat_id not in self.hold:
+            error = self.errors.get(chat_id)
+            if error is None:
+                future.set_result(text)
+            else:
+                future.set_exception(error)
+        return future
+
+    def is_sending(self, future) -> bool:
+        return False
+
+
+def progress_user(*sessions) -> dict:
+    return {"sessions": [{"date": date, "park": park} for date, park in sessions]}
+
+
+PROGRESS = {
+    "1": progress_user(("2030-01-01", PARK)),
+    "2": progress_user(("2030-01-02", "Другой парк")),
+    "3": progress_user(),
+}
+BOOKINGS = [
+    {"user_id": 2, "date": "2030-01-01", "park_name": PARK, "status": "pending"},
+    {"user_id": 4, "date": "2030-01-01", "park_name": PARK, "status": "confirmed"},
+    {"user_id": 5, "date": "2030-01-01", "park_name": PARK, "status": "rejected"},
+]
+
+
+def engine(tmp_path, queue: StubQueue, window: int = 100) -> BroadcastEngine:
+    return BroadcastEngine(queue, StubProgress(PROGRESS), StubBookings(BOOKINGS),
+                           directory=str(tmp_path / "broadcasts"), window=window)
+
+
+def test_recipients_are_unique_and_filtered(tmp_path):
+    """Получатели без повторов; фильтры по парку и дате учитывают и прогресс, и записи"""
+    broadcast = engine(tmp_path, StubQueue())
+    assert list(broadcast.iter_recipients()) == [1, 2, 3, 4]
+    assert list(broadcast.iter_recipients('park1', '2030-01-01')) == [1, 2, 4]
+    assert list(broadcast.iter_recipients(date='2030-01-02')) == [2]
+
+
+def test_rerun_skips_delivered_and_blocked(tmp_path):
+    """Повторный запуск отправляет только тем, кому доставить не удалось"""
+    queue = StubQueue(errors={2: Forbidden("blocked"), 3: NetworkError("timeout")})
+    report = asyncio.run(engine(tmp_path, queue).run("Привет"))
+    assert (report["recipients"], report[DELIVERED], report[BLOCKED], report[FAILED]) == (4, 2, 1, 1)
+
+    queue = StubQueue()
+    report = asyncio.run(engine(tmp_path, queue).run("Привет"))
+    assert queue.submitted == [3]
+    # Свободный текст админа уходит без разметки
+    assert "parse_mode" not in queue.kwargs
+    assert (report[DELIVERED], report["skipped"]) == (1, 3)
+
+
+def test_resume_after_stop(tmp_path):
+    """Рассылка, прерванная остановкой, продолжается с недоставленных получателей"""
+    queue = StubQueue(hold={3, 4})
+
+    async def interrupted():
+        # Окно в одно сообщение: каждая доставка попадает в журнал до следующей отправки
+        broadcast = engine(tmp_path, queue, window=1)
+        task = broadcast.start("Дождь, тренировки не будет", 'park1')
+        await asyncio.sleep(0.1)
+        await broadcast.stop()
+        return task
+
+    task = asyncio.run(interrupted())
+    assert task.cancelled()
+    assert queue.submitted == [1, 2, 4]
+
+    queue = StubQueue()
+
+    async def resumed():
+        broadcast = engine(tmp_path, queue)
+        assert [meta["text"] for meta in broadcast.unfinished()] == ["Дождь, тренировки не будет"]
+        reports = await asyncio.gather(*await broadcast.resume_unfinished())
+        return broadcast, reports
+
+    broadcast, reports = asyncio.run(resumed())
+    assert queue.submitted == [4]
+    assert (reports[0][DELIVERED], reports[0]["skipped"]) == (1, 2)
+    assert broadcast.unfinished() == []
+
+
+def test_stop_records_finished_deliveries(tmp_path):
+    """Доставки, завершенные к моменту остановки, попадают в журнал и не повторяются"""
+    queue = StubQueue(hold={4})
+
+    async def interrupted():
+        broadcast = engine(tmp_path, queue)
+        broadcast.start("Дождь, тренировки не будет")
+        await asyncio.sleep(0.1)
+        await broadcast.stop()
+
+    asyncio.run(interrupted())
+    assert queue.submitted == [1, 2, 3, 4]
+
+    queue = StubQueue()
+
+    async def resumed():
+        return await asyncio.gather(*await engine(tmp_path, queue).resume_unfinished())
+
+    reports = asyncio.run(resumed())
+    assert queue.submitted == [4]
+    assert (reports[0][DELIVERED], reports[0]["skipped"]) == (1, 3)
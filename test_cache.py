@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Тесты кэша готовых сообщений
+"""
+
+import cache
+from cache import RenderCache
+
+
+class Renderer:
+    """render(), который считает вызовы"""
+
+    def __init__(self, value: str = "текст"):
+        self.value = value
+        self.calls = 0
+
+    def __call__(self) -> str:
+        self.calls += 1
+        return f"{self.value} {self.calls}"
+
+
+def test_hit_and_version_invalidation():
+    """Тот же ключ берется из кэша, новая версия данных строится заново"""
+    render_cache = RenderCache()
+    render = Renderer()
+
+    assert render_cache.get_or_render(("progress", 1, 0), render) == "текст 1"
+    assert render_cache.get_or_render(("progress", 1, 0), render) == "текст 1"
+    assert render_cache.get_or_render(("progress", 1, 1), render) == "текст 2"
+    assert render.calls == 2
+    assert render_cache.stats()["hits"] == 1
+    assert render_cache.stats()["misses"] == 2
+
+
+def test_lru_eviction():
+    """Сверх maxsize вытесняется давно не использованный ключ"""
+    render_cache = RenderCache(maxsize=2)
+    render = Renderer()
+    render_cache.get_or_render("a", render)
+    render_cache.get_or_render("b", render)
+    render_cache.get_or_render("a", render)
+    render_cache.get_or_render("c", render)
+
+    assert render_cache.stats()["size"] == 2
+    render_cache.get_or_render("a", render)
+    assert render.calls == 3
+    render_cache.get_or_render("b", render)
+    assert render.calls == 4
+
+
+def test_ttl(monkeypatch):
+    """Значение старше ttl строится заново"""
+    now = [100.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    render_cache = RenderCache(ttl=10)
+    render = Renderer()
+
+    render_cache.get_or_render("a", render)
+    now[0] += 9
+    assert render_cache.get_or_render("a", render) == "текст 1"
+    now[0] += 2
+    assert render_cache.get_or_render("a", render) == "текст 2"
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Тесты разбора callback_data
+"""
+
+import pytest
+
+from callbacks import (MAX_CALLBACK_DATA, BookingRef, CallbackRouter, DateChoice,
+                       TimeChoice, callback_data)
+
+
+async def handler(update, context):
+    pass
+
+
+async def fallback(update, context):
+    pass
+
+
+@pytest.fixture
+def router():
+    router = CallbackRouter(fallback=fallback)
+    router.add("main_menu", handler)
+    router.add("date", handler, DateChoice)
+    router.add("time", handler, TimeChoice)
+    router.add("admin_approve", handler, BookingRef)
+    return router
+
+
+def test_fields_are_converted(router):
+    """Поля приводятся к типам из payload"""
+    route, payload = router.decode(callback_data("date", 3))
+    assert route.handler is handler
+    assert payload == DateChoice(3)
+    assert router.decode("main_menu") == (router._routes["main_menu"], None)
+
+
+def test_last_field_keeps_separator(router):
+    """Последнее поле забирает остаток строки вместе с двоеточиями"""
+    assert router.decode(callback_data("time", "12:00"))[1] == TimeChoice("12:00")
+    assert router.decode(callback_data("admin_approve", "a:b"))[1] == BookingRef("a:b")
+
+
+@pytest.mark.parametrize("data", [
+    "date:abc",         # не число
+    "date:",            # пустое поле
+    "date",             # нет поля
+    "main_menu:extra",  # лишнее поле
+    "unknown:1",        # неизвестное действие
+    "admin_approve",    # нет ID записи
+    "",
+])
+def test_bad_data_is_rejected(router, data):
+    """Неразбираемые данные не доходят до обработчика"""
+    assert router.decode(data) is None
+
+
+def test_callback_data_limit():
+    """callback_data длиннее 64 байт не создается (считаются байты, а не символы)"""
+    assert len(callback_data("x", "a" * (MAX_CALLBACK_DATA - 2))) == MAX_CALLBACK_DATA
+    with pytest.raises(ValueError):
+        callback_data("x", "a" * (MAX_CALLBACK_DATA - 1))
+    with pytest.raises(ValueError):
+        callback_data("x", "я" * 32)
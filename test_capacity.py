@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Тесты учета мест SlotCapacity
+"""
+
+import threading
+
+from capacity import SlotCapacity
+
+SLOT = ("park1", "2030-01-01", "18:00")
+OTHER = ("park1", "2030-01-01", "20:00")
+
+
+class Clock:
+    """Управляемые часы вместо time.monotonic"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_hold_book_unbook():
+    """Удержание превращается в место, а отмена его освобождает"""
+    capacity = SlotCapacity(capacity=2, clock=Clock())
+    assert capacity.hold(1, SLOT)
+    assert capacity.hold(2, SLOT)
+    assert not capacity.hold(3, SLOT)
+    assert capacity.free(SLOT) == 0
+
+    assert capacity.book(1, SLOT)
+    assert capacity.user_hold(1) is None
+    assert capacity.free(SLOT) == 0
+    capacity.unbook(SLOT)
+    assert capacity.free(SLOT) == 1
+    # Лишний unbook не уводит счетчик в минус
+    capacity.unbook(SLOT)
+    capacity.unbook(SLOT)
+    assert capacity.free(SLOT) == 1
+
+
+def test_hold_moves_and_expires():
+    """У пользователя одно удержание; истекшее удержание освобождает место"""
+    clock = Clock()
+    capacity = SlotCapacity(capacity=1, hold_ttl=60, clock=clock)
+    assert capacity.hold(1, SLOT)
+    assert capacity.hold(1, OTHER)
+    assert capacity.free(SLOT) == 1
+    assert not capacity.hold(2, OTHER)
+
+    # Продление: первая запись кучи не снимает продленное удержание
+    clock.now = 50
+    assert capacity.hold(1, OTHER)
+    clock.now = 70
+    assert capacity.user_hold(1) == OTHER
+    clock.now = 111
+    assert capacity.user_hold(1) is None
+    assert capacity.free(OTHER) == 1
+    assert capacity.stats()["expired"] == 1
+
+
+def test_book_after_expired_hold():
+    """После истечения удержания место занимается, только если оно еще свободно"""
+    clock = Clock()
+    capacity = SlotCapacity(capacity=1, hold_ttl=60, clock=clock)
+    assert capacity.hold(1, SLOT)
+    clock.now = 61
+    assert capacity.hold(2, SLOT)
+    assert not capacity.book(1, SLOT)
+    assert capacity.book(2, SLOT)
+
+
+def test_last_seat_is_sold_once():
+    """Одновременные попытки занять последнее место: успешна ровно одна"""
+    capacity = SlotCapacity(capacity=3, clock=Clock())
+    start = threading.Barrier(32)
+    results = []
+
+    def grab(user_id: int):
+        start.wait()
+        results.append(capacity.hold(user_id, SLOT) and capacity.book(user_id, SLOT))
+
+    threads = [threading.Thread(target=grab, args=(user_id,)) for user_id in range(32)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results.count(True) == 3
+    assert capacity.free(SLOT) == 0
+    assert (capacity.stats()["booked"], capacity.stats()["bookings"]) == (3, 3)
+
+
+def test_concurrent_unbook_and_book():
+    """Освобождение и занятие мест из разных потоков не теряют счетчики"""
+    capacity = SlotCapacity(capacity=100, clock=Clock())
+    for user_id in range(50):
+        assert capacity.book(user_id, SLOT)
+
+    def unbook():
+        for _ in range(50):
+            capacity.unbook(SLOT)
+
+    def book():
+        for user_id in range(50, 100):
+            capacity.book(user_id, SLOT)
+
+    threads = [threading.Thread(target=unbook), threading.Thread(target=book)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert capacity.free(SLOT) == 50
+
+
+def test_load_skips_past_and_free_bookings():
+    """При загрузке учитываются только действующие записи на сегодня и позже"""
+    capacity = SlotCapacity(capacity=5)
+    capacity.load([
+        {'park_id': 'park1', 'date': '2030-01-01', 'time': '18:00', 'status': 'pending'},
+        {'park_id': 'park1', 'date': '2030-01-01', 'time': '18:00', 'status': 'confirmed'},
+        {'park_id': 'park1', 'date': '2030-01-01', 'time': '18:00', 'status': 'rejected'},
+        {'park_id': 'park1', 'date': '2030-01-01', 'time': '18:00', 'status': 'cancelled'},
+        {'park_id': 'park1', 'date': '2030-01-01', 'time': '18:00', 'status': 'expired'},
+        {'park_id': 'park1', 'date': '2029-12-31', 'time': '18:00', 'status': 'confirmed'},
+        {'date': '2030-01-01', 'time': '18:00', 'status': 'pending'},
+    ], today='2030-01-01')
+    assert capacity.free(SLOT) == 3
+    assert capacity.free(OTHER) == 5
+    # Занятые места, а не число вызовов book()
+    assert capacity.stats()["booked"] == 2
+    assert capacity.stats()["bookings"] == 0
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Тесты выборок и статусов BookingDatabase
+"""
+
+import pytest
+
+from callbacks import callback_data
+from database import STATUS_TRANSITIONS, BookingDatabase
+from sqlite_backend import SQLiteBookingDatabase
+
+
+def booking(date: str = '2030-01-01', time: str = '18:00') -> dict:
+    return {'park_id': 'park1', 'date': date, 'time': time}
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def db_file(request, tmp_path):
+    return request.param, str(tmp_path / ("bookings.json" if request.param == "json" else "bookings.db"))
+
+
+def open_db(db_file):
+    backend, path = db_file
+    return BookingDatabase(path) if backend == "json" else SQLiteBookingDatabase(path)
+
+
+@pytest.fixture
+def db(db_file):
+    database = open_db(db_file)
+    yield database
+    database.close()
+
+
+def ids(bookings) -> set:
+    return {booking['id'] for booking in bookings}
+
+
+def test_lookups_by_user_status_and_slot(db):
+    """Выборки по пользователю, статусу и слоту возвращают ровно нужные записи"""
+    first = db.add_booking(1, "Аня", booking())
+    second = db.add_booking(2, "Боря", booking())
+    third = db.add_booking(3, "Вера", booking(time='20:00'))
+
+    assert ids(db.get_user_bookings(1)) == {first}
+    assert ids(db.get_user_bookings(4)) == set()
+    assert ids(db.get_slot_bookings('2030-01-01', '18:00')) == {first, second}
+    assert ids(db.get_pending_bookings()) == {first, second, third}
+
+
+def test_lookups_follow_updates(db):
+    """Смена статуса и удаление сразу видны в выборках и статистике"""
+    first = db.add_booking(1, "Аня", booking())
+    second = db.add_booking(2, "Боря", booking())
+    db.confirm_booking(first)
+    db.reject_booking(second, "нет мест")
+
+    assert ids(db.get_pending_bookings()) == set()
+    assert db.get_booking(second)['rejection_reason'] == "нет мест"
+    stats = db.get_statistics()
+    assert (stats['total'], stats['pending'], stats['confirmed'], stats['rejected']) == (2, 0, 1, 1)
+
+    db.delete_booking(first)
+    assert db.get_booking(first) is None
+    assert ids(db.get_user_bookings(1)) == set()
+    assert ids(db.get_slot_bookings('2030-01-01', '18:00')) == {second}
+
+
+def test_lookups_after_reopen(db_file):
+    """После перезапуска выборки строятся по сохраненным записям"""
+    database = open_db(db_file)
+    first = database.add_booking(1, "Аня", booking())
+    second = database.add_booking(2, "Боря", booking())
+    database.confirm_booking(second)
+    database.close()
+
+    database = open_db(db_file)
+    assert ids(database.get_pending_bookings()) == {first}
+    assert ids(database.get_user_bookings(2)) == {second}
+    assert database.get_statistics()['confirmed'] == 1
+    database.close()
+
+
+def test_pending_to_confirmed_to_completed(db):
+    """Обычный путь заявки: pending -> confirmed -> completed"""
+    booking_id = db.add_booking(1, "Аня", booking())
+    assert db.get_booking(booking_id)['status'] == 'pending'
+
+    confirmed = db.confirm_booking(booking_id)
+    assert confirmed['status'] == 'confirmed'
+    assert confirmed['confirmed_at']
+    assert db.complete_booking(booking_id)['status'] == 'completed'
+    assert db.get_statistics()['completed'] == 1
+
+
+@pytest.mark.parametrize("first, second", [
+    ('confirm_booking', 'confirm_booking'),
+    ('confirm_booking', 'reject_booking'),
+    ('confirm_booking', 'cancel_booking'),
+    ('confirm_booking', 'expire_booking'),
+    ('reject_booking', 'confirm_booking'),
+    ('cancel_booking', 'confirm_booking'),
+    ('expire_booking', 'confirm_booking'),
+])
+def test_rejected_transitions(db, first, second):
+    """Повторное или запоздалое решение по заявке не меняет ее статус"""
+    booking_id = db.add_booking(1, "Аня", booking())
+    status = getattr(db, first)(booking_id)['status']
+
+    assert getattr(db, second)(booking_id) is None
+    assert db.get_booking(booking_id)['status'] == status
+    assert db.get_statistics()[status] == 1
+
+
+def test_set_status_follows_table(db):
+    """set_status разрешает ровно переходы из STATUS_TRANSITIONS"""
+    booking_id = db.add_booking(1, "Аня", booking())
+    assert db.set_status(booking_id, 'completed') is None
+    assert db.set_status(booking_id, 'pending') is None
+    assert set(STATUS_TRANSITIONS['pending']) == {'confirmed', 'rejected', 'cancelled', 'expired'}
+    assert db.set_status(booking_id, 'rejected', rejection_reason='busy')['rejection_reason'] == 'busy'
+    assert db.set_status('missing', 'confirmed') is None
+
+
+def test_short_unique_ids(db):
+    """ID записи короткий и не совпадает у записей одного пользователя в одну секунду"""
+    booking_ids = {db.add_booking(1, "Аня", booking()) for _ in range(20)}
+    assert len(booking_ids) == 20
+    assert db.get_statistics()['total'] == 20
+    for booking_id in booking_ids:
+        assert len(booking_id) == 8
+        callback_data("admin_approve", booking_id)
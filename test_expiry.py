@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Тесты истечения заявок без решения тренера
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from capacity import SlotCapacity
+from database import BookingDatabase
+from expiry import BookingExpirer
+
+SLOT = ("park1", "2030-01-01", "18:00")
+CREATED = datetime(2029, 12, 30, 12, 0)
+
+
+class StubQueue:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append(chat_id)
+
+
+@pytest.fixture
+def db(tmp_path):
+    database = BookingDatabase(str(tmp_path / "bookings.json"))
+    yield database
+    database.close()
+
+
+def add_booking(db, capacity, user_id, created: datetime = CREATED):
+    """Создает заявку с известным временем создания и занимает под нее место"""
+    booking_id = db.add_booking(user_id, "Аня", {'park_id': SLOT[0], 'date': SLOT[1], 'time': SLOT[2]})
+    db.get_booking(booking_id)['created_at'] = created.isoformat()
+    assert capacity.hold(user_id, SLOT) and capacity.book(user_id, SLOT)
+    return booking_id
+
+
+def test_deadline_is_ttl_or_training_start():
+    """Заявка истекает через ttl после создания или к началу тренировки"""
+    expirer = BookingExpirer(None, SlotCapacity(), StubQueue(), ttl=timedelta(hours=24))
+    booking = {'created_at': CREATED.isoformat(), 'date': SLOT[1], 'time': SLOT[2]}
+    assert expirer.deadline(booking) == CREATED + timedelta(hours=24)
+
+    expirer.ttl = timedelta(hours=72)
+    assert expirer.deadline(booking) == datetime(2030, 1, 1, 18, 0)
+    assert expirer.deadline({'created_at': CREATED.isoformat()}) == CREATED + timedelta(hours=72)
+
+
+def test_expire_frees_seat(db):
+    """Истекшая заявка переходит в expired и освобождает место в группе"""
+    capacity = SlotCapacity(capacity=2)
+    booking_id = add_booking(db, capacity, 1)
+    expirer = BookingExpirer(db, capacity, StubQueue(), ttl=timedelta(hours=24))
+
+    assert expirer.expire(CREATED + timedelta(hours=23)) == []
+    assert capacity.free(SLOT) == 1
+
+    expired = expirer.expire(CREATED + timedelta(hours=24))
+    assert [booking['id'] for booking in expired] == [booking_id]
+    assert db.get_booking(booking_id)['status'] == 'expired'
+    assert capacity.free(SLOT) == 2
+    assert expirer.counters["expired"] == 1
+    assert expirer.expire(CREATED + timedelta(hours=25)) == []
+
+
+def test_answered_booking_is_kept(db):
+    """Заявка, на которую тренер уже ответил, не истекает и не освобождает место"""
+    capacity = SlotCapacity(capacity=2)
+    confirmed = add_booking(db, capacity, 1)
+    pending = add_booking(db, capacity, 2)
+    db.confirm_booking(confirmed)
+    expirer = BookingExpirer(db, capacity, StubQueue(), ttl=timedelta(hours=24))
+
+    expired = expirer.expire(CREATED + timedelta(days=1))
+    assert [booking['id'] for booking in expired] == [pending]
+    assert db.get_booking(confirmed)['status'] == 'confirmed'
+    assert capacity.free(SLOT) == 1
+
+
+def test_run_notifies_user(db):
+    """Фоновая проверка снимает заявку и уведомляет пользователя"""
+    capacity = SlotCapacity(capacity=2)
+    add_booking(db, capacity, 7, created=datetime.now() - timedelta(hours=2))
+    queue = StubQueue()
+    expirer = BookingExpirer(db, capacity, queue, ttl=timedelta(hours=1), interval=0.01)
+
+    async def run():
+        expirer.start()
+        await asyncio.sleep(0.05)
+        await expirer.stop()
+
+    asyncio.run(run())
+    assert queue.sent == [7]
+    assert capacity.free(SLOT) == 2
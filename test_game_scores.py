@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Тесты результатов игры
+"""
+
+import pytest
+
+import game_scores
+from game_scores import MAX_DURATION_MS, MAX_SCORE, GameScores, InvalidScore, validate_score
+
+
+def payload(score=100, duration=60_000, game="dog_skate") -> dict:
+    return {"game": game, "score": score, "game_duration": duration}
+
+
+def test_valid_score():
+    """Правдоподобный результат принимается, длительность приводится к int"""
+    assert validate_score(payload(duration=60_000.7)) == ("dog_skate", 100, 60_000)
+    assert validate_score(payload(score=0, duration=1))[1] == 0
+
+
+@pytest.mark.parametrize("data", [
+    payload(game="other_game"),
+    {"score": 100, "game_duration": 60_000},
+    payload(score=-1),
+    payload(score=MAX_SCORE + 1),
+    payload(score=12.5),
+    payload(score="100"),
+    payload(score=True),
+    payload(duration=0),
+    payload(duration=-5),
+    payload(duration=MAX_DURATION_MS + 1),
+    payload(duration=float("nan")),
+    payload(duration=None),
+    payload(duration=False),
+    # Больше, чем счетчик может набрать за 10 секунд
+    payload(score=5_000, duration=10_000),
+])
+def test_invalid_scores(data):
+    """Неизвестная игра, счет вне диапазона и невозможный за длительность счет отклоняются"""
+    with pytest.raises(InvalidScore):
+        validate_score(data)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(game_scores.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_best_score_and_rank(tmp_path, clock):
+    """Хранится лучший счет; место меняется только при новом рекорде"""
+    scores = GameScores(str(tmp_path / "scores.json"))
+    assert scores.submit(1, "Аня", "anya", payload(score=300))["rank"] == 1
+    clock[0] += 100
+    assert scores.submit(2, "Боря", "borya", payload(score=500))["rank"] == 1
+    clock[0] += 100
+    result = scores.submit(1, "Аня", "anya", payload(score=200))
+    assert (result["best"], result["new_best"], result["rank"], result["players"]) == (300, False, 2, 2)
+
+    assert [entry["score"] for entry in scores.top()] == [500, 300]
+    assert scores.records["1"]["games"] == 2
+    scores.close()
+
+    reopened = GameScores(str(tmp_path / "scores.json"))
+    assert (reopened.best(1), reopened.rank(1), reopened.rank(2)) == (300, 2, 1)
+    reopened.close()
+
+
+def test_overlapping_games_rejected(tmp_path, clock):
+    """Новая игра не может начаться раньше, чем пришел предыдущий результат"""
+    scores = GameScores(str(tmp_path / "scores.json"))
+    scores.submit(1, "Аня", "anya", payload(duration=60_000))
+    clock[0] += 30
+    with pytest.raises(InvalidScore):
+        scores.submit(1, "Аня", "anya", payload(duration=60_000))
+    # Другой игрок не мешает
+    scores.submit(2, "Боря", "borya", payload(duration=60_000))
+    assert scores.counters["rejected"] == 1
+    scores.close()
+
+
+def test_tie_keeps_order_after_reload(tmp_path, clock):
+    """При равном счете выше тот, кто набрал его раньше, и после перезапуска тоже"""
+    scores = GameScores(str(tmp_path / "scores.json"))
+    scores.submit(1, "Аня", "anya", payload(score=100))
+    clock[0] += 100
+    scores.submit(2, "Боря", "borya", payload(score=300))
+    clock[0] += 100
+    # Аня появилась раньше, но счет 300 набрала позже Бори
+    scores.submit(1, "Аня", "anya", payload(score=300))
+    assert (scores.rank(2), scores.rank(1)) == (1, 2)
+    scores.close()
+
+    reopened = GameScores(str(tmp_path / "scores.json"))
+    assert (reopened.rank(2), reopened.rank(1)) == (1, 2)
+    reopened.close()
@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+"""
+Тесты клавиатур записи
+"""
+
+from datetime import date, timedelta
+
+import pytest
+
+import keyboards
+from callbacks import callback_data
+
+
+def test_booking_day_matches_button():
+    """Кнопка date_<N> дает дату через N дней"""
+    markup = keyboards.get_date_selection_keyboard()
+    assert markup.inline_keyboard[0][0].callback_data == callback_data("date", 1)
+
+    for days_ahead in (1, keyboards.BOOKING_DAYS):
+        booking_day = keyboards.get_booking_day(days_ahead)
+        assert booking_day.date == (date.today() + timedelta(days=days_ahead)).isoformat()
+
+
+@pytest.mark.parametrize("days_ahead", [0, -1, keyboards.BOOKING_DAYS + 1, 10 ** 6])
+def test_booking_day_out_of_range(days_ahead):
+    """Номера дня, которого нет в клавиатуре, не подменяются другой датой"""
+    assert keyboards.get_booking_day(days_ahead) is None
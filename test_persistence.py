@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Тесты сохранения состояния пользователей
+"""
+
+import asyncio
+import sqlite3
+import threading
+
+from persistence import UserStatePersistence
+
+
+def rows(path: str) -> dict:
+    conn = sqlite3.connect(path)
+    try:
+        return dict(conn.execute("SELECT user_id, data FROM user_state").fetchall())
+    finally:
+        conn.close()
+
+
+def test_lazy_load(tmp_path):
+    """При запуске ничего не читается; данные пользователя подгружаются при первом обновлении"""
+    path = str(tmp_path / "state.db")
+
+    async def run():
+        persistence = UserStatePersistence(path, save_delay=60)
+        await persistence.update_user_data(1, {"park": "park1", "date": "2030-01-01"})
+        await persistence.update_user_data(2, {"park": "park2"})
+        await persistence.flush()
+
+        persistence = UserStatePersistence(path, save_delay=60)
+        assert await persistence.get_user_data() == {}
+        user_data = {"date": "2030-01-02"}
+        await persistence.refresh_user_data(1, user_data)
+        # Повторное обновление не читает базу снова
+        await persistence.refresh_user_data(1, user_data)
+        await persistence.refresh_user_data(3, {})
+        counters = dict(persistence.counters)
+        await persistence.flush()
+        return user_data, counters
+
+    user_data, counters = asyncio.run(run())
+    # Значение, уже записанное в памяти, не перетирается данными из базы
+    assert user_data == {"park": "park1", "date": "2030-01-02"}
+    assert counters["loaded"] == 1
+
+
+def test_only_changed_entries_are_written(tmp_path):
+    """В базу попадают только изменившиеся пользователи, одной пачкой"""
+    path = str(tmp_path / "state.db")
+
+    async def run():
+        persistence = UserStatePersistence(path, save_delay=60)
+        await persistence.update_user_data(1, {"park": "park1"})
+        await persistence.update_user_data(2, {"park": "park2"})
+        persistence.save()
+        assert persistence.counters["written"] == 2
+
+        # Тот же user_data (в другом порядке ключей) не пишется повторно
+        await persistence.update_user_data(1, {"park": "park1"})
+        await persistence.update_user_data(2, {"park": "park3"})
+        await persistence.drop_user_data(1)
+        persistence.save()
+        persistence.save()
+        counters = dict(persistence.counters)
+        await persistence.flush()
+        return counters
+
+    counters = asyncio.run(run())
+    assert counters["unchanged"] == 1
+    assert counters["written"] == 4
+    assert rows(path) == {2: '{"park": "park3"}'}
+
+
+def test_unserializable_data_is_skipped(tmp_path):
+    """user_data, которые не сериализуются в JSON, не ломают сохранение остальных"""
+    path = str(tmp_path / "state.db")
+
+    async def run():
+        persistence = UserStatePersistence(path, save_delay=60)
+        await persistence.update_user_data(1, {"bad": object()})
+        await persistence.update_user_data(2, {"park": "park2"})
+        await persistence.flush()
+
+    asyncio.run(run())
+    assert rows(path) == {2: '{"park": "park2"}'}
+
+
+class SlowConnection:
+    """Соединение, которое держит запись, пока тест ее не отпустит"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.writing = threading.Event()
+        self.release = threading.Event()
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+    def __enter__(self):
+        return self.conn.__enter__()
+
+    def __exit__(self, *exc_info):
+        return self.conn.__exit__(*exc_info)
+
+    def executemany(self, sql, rows):
+        self.writing.set()
+        assert self.release.wait(5)
+        return self.conn.executemany(sql, rows)
+
+
+def test_updates_do_not_wait_for_write(tmp_path):
+    """Изменения принимаются, пока идет запись в базу, и попадают в следующее сохранение"""
+    path = str(tmp_path / "state.db")
+    persistence = UserStatePersistence(path, save_delay=60)
+    conn = persistence.conn = SlowConnection(persistence.conn)
+    asyncio.run(persistence.update_user_data(1, {"park": "park1"}))
+
+    saving = threading.Thread(target=persistence.save)
+    saving.start()
+    assert conn.writing.wait(5)
+    asyncio.run(asyncio.wait_for(persistence.update_user_data(1, {"park": "park2"}), 1))
+    conn.release.set()
+    saving.join()
+    assert rows(path) == {1: '{"park": "park1"}'}
+
+    asyncio.run(persistence.flush())
+    assert rows(path) == {1: '{"park": "park2"}'}
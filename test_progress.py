@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Тесты прогресса и таблицы лидеров
+"""
+
+from progress import Leaderboard, ProgressSystem
+
+
+def test_leaderboard_rank_and_top():
+    """Топ-N и места считаются по количеству тренировок"""
+    board = Leaderboard()
+    for user_id, total in (("a", 3), ("b", 7), ("c", 5)):
+        board.update(user_id, total)
+
+    assert board.top(2) == ["b", "c"]
+    assert board.top(10) == ["b", "c", "a"]
+    assert [board.rank(user_id) for user_id in "abc"] == [3, 1, 2]
+    assert board.rank("missing") is None
+    assert len(board) == 3
+
+
+def test_leaderboard_ties_keep_arrival_order():
+    """При равенстве выше тот, кто появился в таблице раньше, и после обновлений тоже"""
+    board = Leaderboard()
+    for user_id in "abc":
+        board.update(user_id, 1)
+    assert board.top(3) == ["a", "b", "c"]
+
+    board.update("c", 2)
+    board.update("a", 2)
+    assert board.top(3) == ["a", "c", "b"]
+    assert board.rank("b") == 3
+
+
+def test_leaderboard_updates_move_users():
+    """Обновление переставляет пользователя и не создает дубликатов"""
+    board = Leaderboard()
+    board.update("a", 5)
+    board.update("b", 1)
+    for total in range(2, 8):
+        board.update("b", total)
+
+    assert board.top(5) == ["b", "a"]
+    assert board.rank("a") == 2
+    assert len(board) == 2
+
+
+def test_progress_system_leaderboard(tmp_path):
+    """get_leaderboard и get_user_rank следуют за add_session и переживают перезапуск"""
+    path = str(tmp_path / "progress.json")
+    progress = ProgressSystem(path)
+    for user_id, sessions in ((1, 2), (2, 3), (3, 2)):
+        for day in range(sessions):
+            progress.add_session(user_id, f"Скейтер {user_id}", f"skater{user_id}",
+                                 "Парк", f"2025-01-0{day + 1}", "18:00")
+
+    assert [user["user_name"] for user in progress.get_leaderboard(3)] == \
+        ["Скейтер 2", "Скейтер 1", "Скейтер 3"]
+    assert progress.get_user_rank(3) == 3
+    assert progress.get_user_rank(4) is None
+    progress.close()
+
+    reopened = ProgressSystem(path)
+    assert [reopened.get_user_rank(user_id) for user_id in (1, 2, 3)] == [2, 1, 3]
+    reopened.close()
+
+
+def test_rendered_messages_follow_data_version(tmp_path):
+    """Новая тренировка любого пользователя сбрасывает экраны прогресса и рейтинга"""
+    progress = ProgressSystem(str(tmp_path / "progress.json"))
+    progress.add_session(1, "Аня", "anya", "Парк", "2025-01-01", "18:00")
+    progress.add_session(2, "Боря", "borya", "Парк", "2025-01-01", "18:00")
+    progress.add_session(2, "Боря", "borya", "Парк", "2025-01-02", "18:00")
+
+    first = progress.format_progress_message(2)
+    assert progress.format_progress_message(2) is first
+    assert "Место в рейтинге: 1 из 2" in first
+    leaderboard = progress.format_leaderboard_message()
+    assert progress.render_cache.stats()["hits"] == 1
+
+    # Место Бори меняется из-за тренировки Ани
+    version = progress.data_version
+    progress.add_session(1, "Аня", "anya", "Парк", "2025-01-02", "18:00")
+    progress.add_session(1, "Аня", "anya", "Парк", "2025-01-03", "18:00")
+    assert progress.data_version == version + 2
+    assert progress.format_progress_message(2) != first
+    assert "Место в рейтинге: 2 из 2" in progress.format_progress_message(2)
+    assert progress.format_leaderboard_message() != leaderboard
+    progress.close()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Тесты бинарного снапшота прогресса
+"""
+
+import json
+
+import pytest
+
+import progress_snapshot
+from progress import ProgressSystem
+from progress_snapshot import PackedSessions, _generate, decode, encode
+
+
+def as_json(progress_data) -> dict:
+    """Данные в том виде, в каком они попадают в JSON-файл"""
+    return json.loads(json.dumps(progress_data, ensure_ascii=False, default=list))
+
+
+def test_round_trip():
+    """decode(encode(x)) совпадает с исходными данными, включая порядок полей"""
+    progress_data = _generate(50, 12)
+    decoded = decode(encode(progress_data))
+
+    assert as_json(decoded) == progress_data
+    user_id = next(iter(progress_data))
+    assert list(decoded[user_id]) == list(progress_data[user_id])
+    assert isinstance(decoded[user_id]["sessions"], PackedSessions)
+
+
+def test_nonstandard_values_round_trip():
+    """Значения не в стандартном формате сохраняются как строки"""
+    progress_data = {
+        "1": {
+            "user_name": "Аня",
+            "sessions": [
+                {"date": "вчера", "time": "утром", "park": "Новый парк", "timestamp": "не помню"},
+                {"date": "2025-03-01", "time": "18:30", "park": "Новый парк",
+                 "timestamp": "2025-03-01T18:30:00"},
+            ],
+            "achievements": [],
+        },
+        "2": {"user_name": "Без тренировок", "sessions": [], "achievements": ["first_session"]},
+    }
+    assert as_json(decode(encode(progress_data))) == progress_data
+
+
+def test_reencode_packed_sessions():
+    """Упакованные и измененные после загрузки тренировки перекодируются без потерь"""
+    progress_data = _generate(5, 4)
+    decoded = decode(encode(progress_data))
+    session = {"date": "2026-01-02", "time": "14:00", "park": "Другой парк",
+               "timestamp": "2026-01-02T14:05:00"}
+    decoded["100000001"]["sessions"].append(session)
+    progress_data["100000001"]["sessions"].append(session)
+
+    assert as_json(decode(encode(decoded))) == progress_data
+
+
+def test_bad_magic():
+    """Чужой файл не принимается за снапшот"""
+    with pytest.raises(ValueError):
+        decode(b"NOPE" + encode({})[4:])
+
+
+def test_convert(tmp_path):
+    """JSON -> бинарный -> JSON возвращает те же данные"""
+    progress_data = _generate(3, 5)
+    source = tmp_path / "progress.json"
+    source.write_text(json.dumps(progress_data, ensure_ascii=False), encoding="utf-8")
+
+    progress_snapshot.convert(str(source), str(tmp_path / "progress.bin"))
+    progress_snapshot.convert(str(tmp_path / "progress.bin"), str(tmp_path / "back.json"))
+    assert json.loads((tmp_path / "back.json").read_text(encoding="utf-8")) == progress_data
+
+
+def test_save_keeps_untouched_users_packed(tmp_path):
+    """Сохранение ProgressSystem не распаковывает тренировки нетронутых пользователей"""
+    path = tmp_path / "progress.bin"
+    path.write_bytes(encode(_generate(20, 5)))
+    progress = ProgressSystem(str(path))
+    progress.add_session(100000003, "Скейтер 3", "skater3", "Новый парк", "2026-01-02", "14:00")
+    progress.flush()
+    progress.add_session(100000004, "Скейтер 4", "skater4", "Новый парк", "2026-01-03", "14:00")
+    progress.flush()
+
+    packed = [user_id for user_id, user_data in progress.progress_data.items()
+              if user_data["sessions"].packed]
+    assert len(packed) == 18
+    assert "100000003" not in packed and "100000004" not in packed
+
+    reloaded = ProgressSystem(str(path))
+    assert as_json(reloaded.progress_data) == as_json(progress.progress_data)
+    assert len(reloaded.progress_data["100000004"]["sessions"]) == 6
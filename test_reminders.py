@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Тесты напоминаний
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from config import ADMIN_ID
+from reminders import REMINDER_ADVANCE, ReminderDispatcher, ReminderStore, ReminderSystem
+from sqlite_backend import SQLiteReminderStore
+
+NOW = datetime(2030, 1, 1, 12, 0)
+
+
+class StubBot:
+    """Бот, который запоминает отправленные сообщения"""
+
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append((chat_id, text))
+
+
+async def no_send(batch):
+    pass
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def store_file(request, tmp_path):
+    return request.param, str(tmp_path / ("reminders.json" if request.param == "json" else "reminders.db"))
+
+
+def open_store(store_file):
+    backend, path = store_file
+    return ReminderStore(path) if backend == "json" else SQLiteReminderStore(path)
+
+
+def booking(hour: int) -> dict:
+    return {"user_id": 1, "date": "2030-01-01", "time": f"{hour:02d}:00", "park_name": "Парк"}
+
+
+def test_store_survives_restart(store_file):
+    """Сохраненные напоминания читаются после перезапуска, удаленные - нет"""
+    store = open_store(store_file)
+    store.add("a", NOW, booking(14))
+    store.add("b", NOW + timedelta(hours=1), booking(15))
+    store.remove("a")
+    store.remove("missing")
+    store.close()
+
+    store = open_store(store_file)
+    assert store.all() == {"b": {"fire_at": (NOW + timedelta(hours=1)).isoformat(), "booking": booking(15)}}
+    store.close()
+
+
+def test_rehydrate_catchup_send(store_file):
+    """Будущие напоминания ставятся заново, пропущенные до начала тренировки отправляются сразу"""
+    store = open_store(store_file)
+    store.add("future", NOW + timedelta(hours=1), booking(15))
+    store.add("missed", NOW - timedelta(minutes=30), booking(14))
+    store.add("started", NOW - REMINDER_ADVANCE - timedelta(minutes=1), booking(11))
+    reminder_system = ReminderSystem(None, store, catchup="send")
+
+    counts = reminder_system.rehydrate(now=NOW)
+    assert counts == {"scheduled": 1, "caught_up": 1, "dropped": 1}
+    dispatcher = reminder_system.dispatcher
+    assert dispatcher.pop_due(NOW) == [("missed", booking(14))]
+    assert dispatcher.pop_due(NOW + timedelta(hours=1)) == [("future", booking(15))]
+    assert set(store.all()) == {"future", "missed"}
+    store.close()
+
+
+def test_rehydrate_catchup_skip(store_file):
+    """При политике skip пропущенные напоминания удаляются"""
+    store = open_store(store_file)
+    store.add("future", NOW + timedelta(hours=1), booking(15))
+    store.add("missed", NOW - timedelta(minutes=30), booking(14))
+    reminder_system = ReminderSystem(None, store, catchup="skip")
+
+    counts = reminder_system.rehydrate(now=NOW)
+    assert counts == {"scheduled": 1, "caught_up": 0, "dropped": 1}
+    assert reminder_system.dispatcher.pop_due(NOW + timedelta(days=1)) == [("future", booking(15))]
+    assert set(store.all()) == {"future"}
+    store.close()
+
+
+def test_pop_due_in_time_order():
+    """pop_due забирает все наступившие напоминания по времени, остальные ждут"""
+    dispatcher = ReminderDispatcher(no_send)
+    dispatcher.push("c", NOW + timedelta(minutes=3), booking(15))
+    dispatcher.push_many([("b", NOW + timedelta(minutes=2), booking(14)),
+                          ("a", NOW + timedelta(minutes=1), booking(13))])
+
+    assert dispatcher.pop_due(NOW) == []
+    assert dispatcher.pop_due(NOW + timedelta(minutes=2)) == [("a", booking(13)), ("b", booking(14))]
+    assert len(dispatcher) == 1
+    assert dispatcher.pop_due(NOW + timedelta(minutes=5)) == [("c", booking(15))]
+    assert len(dispatcher) == 0
+
+
+def test_cancel_and_reschedule():
+    """Отмененное напоминание не приходит, перенесенное приходит один раз в новое время"""
+    dispatcher = ReminderDispatcher(no_send)
+    dispatcher.push("a", NOW, booking(14))
+    dispatcher.push("b", NOW, booking(14))
+    assert dispatcher.cancel("a")
+    assert not dispatcher.cancel("a")
+    dispatcher.push("b", NOW + timedelta(minutes=10), booking(15))
+    # Повторное добавление с тем же временем не создает второе напоминание
+    dispatcher.push("b", NOW + timedelta(minutes=10), booking(15))
+
+    assert dispatcher.pop_due(NOW) == []
+    assert dispatcher.pop_due(NOW + timedelta(minutes=10)) == [("b", booking(15))]
+    assert dispatcher.pop_due(NOW + timedelta(days=1)) == []
+
+
+def test_batch_sends_users_and_one_digest(store_file):
+    """Пачка: каждому пользователю по сообщению, админу одна сводка, хранилище очищается"""
+    store = open_store(store_file)
+    bot = StubBot()
+    reminder_system = ReminderSystem(bot, store)
+    batch = [(f"r{user_id}", dict(booking(14), user_id=user_id)) for user_id in (1, 2, 3)]
+    for job_id, booking_data in batch:
+        store.add(job_id, NOW, booking_data)
+
+    asyncio.run(reminder_system._send_batch(batch))
+    assert sorted(chat_id for chat_id, _ in bot.sent) == sorted([1, 2, 3, ADMIN_ID])
+    assert store.all() == {}
+    store.close()
+
+
+def test_long_digest_is_split():
+    """Сводка длиннее лимита Telegram делится на несколько сообщений"""
+    bot = StubBot()
+    reminder_system = ReminderSystem(bot)
+    bookings = [dict(booking(14), user_id=user_id, park_name="Парк " * 20) for user_id in range(60)]
+
+    asyncio.run(reminder_system._send_admin_digest(bookings))
+    assert len(bot.sent) > 1
+    assert all(len(text) <= ReminderSystem.DIGEST_LIMIT for _, text in bot.sent)
+    assert sum(text.count("👤") for _, text in bot.sent) == 60
+
+
+def upcoming(user_id, hour: int = 18, days: int = 2) -> dict:
+    training_date = (datetime.now() + timedelta(days=days)).date().isoformat()
+    return {"user_id": user_id, "date": training_date, "time": f"{hour:02d}:00", "park_name": "Парк"}
+
+
+def test_schedule_is_idempotent(store_file):
+    """Повторное планирование той же тренировки не создает дубль, в том числе для user_id строкой"""
+    store = open_store(store_file)
+    reminder_system = ReminderSystem(None, store)
+
+    assert reminder_system.schedule_reminder(upcoming(7))
+    assert not reminder_system.schedule_reminder(upcoming(7))
+    assert not reminder_system.schedule_reminder(upcoming("7"))
+    assert reminder_system.schedule_reminder(upcoming(7, hour=20))
+
+    stats = reminder_system.stats()
+    assert (stats["live"], stats["scheduled"], stats["duplicates"]) == (2, 2, 2)
+    assert len(store.all()) == 2
+    store.close()
+
+
+def test_cancel_and_reschedule_reminder(store_file):
+    """Отмена удаляет напоминание из очереди и хранилища, перенос ставит новое"""
+    store = open_store(store_file)
+    reminder_system = ReminderSystem(None, store)
+    booking_data = upcoming(7)
+    reminder_system.schedule_reminder(booking_data)
+
+    moved = upcoming(7, hour=20, days=3)
+    assert reminder_system.reschedule_reminder(7, booking_data["date"], booking_data["time"], moved)
+    assert not reminder_system.cancel_reminder(7, booking_data["date"], booking_data["time"])
+    assert list(store.all()) == [ReminderSystem.reminder_id(7, moved["date"], moved["time"])]
+
+    assert reminder_system.cancel_reminder("7", moved["date"], moved["time"])
+    stats = reminder_system.stats()
+    assert (stats["live"], stats["next_fire"], stats["rescheduled"], stats["cancelled"]) == (0, None, 1, 2)
+    assert store.all() == {}
+    store.close()
+
+
+def test_stale_entries_are_compacted():
+    """Отмены не раздувают кучу: она пересобирается, когда устаревших записей больше половины"""
+    dispatcher = ReminderDispatcher(no_send)
+    for i in range(100):
+        dispatcher.push(f"r{i}", NOW + timedelta(minutes=i), booking(14))
+    for i in range(90):
+        dispatcher.cancel(f"r{i}")
+
+    assert len(dispatcher) == 10
+    assert dispatcher.heap_size < 30
+    assert dispatcher.next_fire() == NOW + timedelta(minutes=90)
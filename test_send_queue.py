@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Тесты очереди исходящих сообщений
+"""
+
+import asyncio
+
+from telegram.error import RetryAfter
+
+from send_queue import ADMIN, BULK, USER, SendQueue
+
+
+class StubBot:
+    """Бот, который запоминает отправленные сообщения"""
+
+    def __init__(self, retry_after: set = ()):
+        self.sent = []
+        # Тексты, на которые первая попытка получит flood control
+        self.retry_after = set(retry_after)
+
+    async def send_message(self, chat_id: int, text: str, **kwargs):
+        await asyncio.sleep(0)
+        if text in self.retry_after:
+            self.retry_after.discard(text)
+            raise RetryAfter(0)
+        self.sent.append((chat_id, text))
+        return text
+
+
+def fast_queue(bot: StubBot, workers: int = 8) -> SendQueue:
+    return SendQueue(bot, workers=workers, global_rate=10_000, chat_rate=10_000,
+                     group_rate=10_000, chat_burst=100)
+
+
+def test_order_within_chat():
+    """Сообщения одного чата уходят в порядке постановки, независимо от приоритета"""
+    bot = StubBot()
+
+    async def run():
+        queue = fast_queue(bot)
+        futures = [
+            queue.submit(1, f"m{i}", priority=(BULK, USER, ADMIN)[i % 3]) for i in range(30)
+        ]
+        results = await asyncio.gather(*futures)
+        await queue.stop()
+        return results
+
+    results = asyncio.run(run())
+    assert results == [f"m{i}" for i in range(30)]
+    assert [text for _, text in bot.sent] == [f"m{i}" for i in range(30)]
+
+
+def test_priority_order():
+    """Из уже поставленных сообщений разных чатов первыми уходят более приоритетные"""
+    bot = StubBot()
+
+    async def run():
+        queue = fast_queue(bot, workers=1)
+        futures = [queue.submit(-100, "bulk", priority=BULK), queue.submit(2, "user", priority=USER),
+                   queue.submit(1, "admin", priority=ADMIN)]
+        await asyncio.gather(*futures)
+        await queue.stop()
+        return queue.stats()
+
+    stats = asyncio.run(run())
+    assert [text for _, text in bot.sent] == ["admin", "user", "bulk"]
+    assert stats["sent"] == 3
+    assert stats["depth"] == {"admin": 0, "user": 0, "bulk": 0}
+
+
+def test_retry_after_keeps_order():
+    """Сообщение, получившее RetryAfter, уходит раньше следующих сообщений чата"""
+    bot = StubBot(retry_after={"a1", "b0"})
+
+    async def run():
+        queue = fast_queue(bot)
+        futures = [queue.submit(chat_id, f"{name}{i}")
+                   for i in range(5) for chat_id, name in ((1, "a"), (2, "b"))]
+        await asyncio.gather(*futures)
+        await queue.stop()
+        return queue.stats()
+
+    stats = asyncio.run(run())
+    assert [text for chat_id, text in bot.sent if chat_id == 1] == [f"a{i}" for i in range(5)]
+    assert [text for chat_id, text in bot.sent if chat_id == 2] == [f"b{i}" for i in range(5)]
+    assert stats["retried"] == 2
+    assert stats["sent"] == 10
+    assert stats["depth"] == {"admin": 0, "user": 0, "bulk": 0}
+
+
+def test_busy_chat_does_not_block_others():
+    """Сообщения в чат без токенов не задерживают другие чаты"""
+    bot = StubBot()
+
+    async def run():
+        queue = SendQueue(bot, global_rate=10_000, chat_rate=0.5, chat_burst=1)
+        admin = [queue.submit(1, f"admin{i}", priority=ADMIN) for i in range(3)]
+        await asyncio.wait_for(queue.send_message(2, "user"), timeout=1)
+        pending = sum(not future.done() for future in admin)
+        for future in admin:
+            future.cancel()
+        await queue.stop(timeout=1)
+        return pending
+
+    assert asyncio.run(run()) == 2
+    assert (2, "user") in bot.sent
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Тесты журнала JsonLogStorage
+"""
+
+import json
+
+from storage import JsonLogStorage
+
+
+def test_log_is_replayed_over_snapshot(tmp_path):
+    """Журнал проигрывается поверх снапшота: put заменяет запись, del удаляет"""
+    path = str(tmp_path / "data.json")
+    storage = JsonLogStorage(path)
+    storage.load()
+    storage.put("a", {"v": 1})
+    storage.put("b", {"v": 2})
+    storage.compact({"a": {"v": 1}, "b": {"v": 2}}, background=False)
+    storage.put("a", {"v": 3})
+    storage.delete("b")
+    storage.put("c", {"v": 4})
+    storage.close()
+
+    reopened = JsonLogStorage(path)
+    assert reopened.load() == {"a": {"v": 3}, "c": {"v": 4}}
+    reopened.close()
+
+
+def test_truncated_tail_is_skipped(tmp_path):
+    """Оборванная последняя строка пропускается, а новые строки пишутся с новой строки"""
+    path = str(tmp_path / "data.json")
+    with open(f"{path}.log", "w", encoding="utf-8") as f:
+        f.write(json.dumps({"op": "put", "key": "a", "record": {"v": 1}}) + "\n")
+        f.write('{"op": "put", "key": "b", "rec')
+
+    storage = JsonLogStorage(path)
+    assert storage.load() == {"a": {"v": 1}}
+    storage.put("c", {"v": 2})
+    storage.close()
+
+    reopened = JsonLogStorage(path)
+    assert reopened.load() == {"a": {"v": 1}, "c": {"v": 2}}
+    reopened.close()
+
+
+def test_compaction_clears_log(tmp_path):
+    """После сворачивания журнал пуст, а данные берутся из снапшота"""
+    path = str(tmp_path / "data.json")
+    storage = JsonLogStorage(path, compact_after=2)
+    records = storage.load()
+    for key in ("a", "b"):
+        records[key] = {"v": key}
+        storage.put(key, records[key])
+    assert storage.needs_compaction()
+    storage.compact(records, background=False)
+    assert not storage.needs_compaction()
+    storage.close()
+
+    with open(f"{path}.log", encoding="utf-8") as f:
+        assert f.read() == ""
+    reopened = JsonLogStorage(path)
+    assert reopened.load() == {"a": {"v": "a"}, "b": {"v": "b"}}
+    reopened.close()
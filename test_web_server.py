@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Тесты веб-сервера игры и API результатов
+"""
+
+import asyncio
+import gzip
+import hashlib
+import hmac
+import json
+import time
+from urllib.parse import urlencode
+
+import pytest
+
+from web_server import (INIT_DATA_MAX_AGE, Request, Response, StaticAssets, WebServer,
+                        parse_accept_encoding, verify_init_data)
+
+INDEX = '<link href="style.css"><script src="game.js"></script>'
+SCRIPT = "const game = {};\n" * 200
+STYLE = "body { margin: 0; }\n" * 200
+
+
+@pytest.fixture
+def assets(tmp_path):
+    for name, text in (("index.html", INDEX), ("game.js", SCRIPT), ("style.css", STYLE)):
+        (tmp_path / name).write_text(text, encoding="utf-8")
+    return StaticAssets(str(tmp_path), ("index.html", "game.js", "style.css"))
+
+
+def get(assets: StaticAssets, name: str, **headers):
+    headers = {key.replace("_", "-"): value for key, value in headers.items()}
+    return assets.response(name, Request("GET", f"/{name}", {}, headers, b"", None))
+
+
+def test_hashed_urls(assets):
+    """index.html ссылается на адреса с хешем, которые кешируются навсегда"""
+    index = get(assets, "index.html")
+    assert index.headers["Cache-Control"] == StaticAssets.REVALIDATE
+    html = index.body.decode("utf-8")
+    assert 'src="game.js"' not in html
+    for name in ("game.js", "style.css"):
+        hashed = assets.hashed[name]
+        assert hashed in html
+        assert get(assets, hashed).headers["Cache-Control"] == StaticAssets.IMMUTABLE
+        assert get(assets, name).headers["Cache-Control"] == StaticAssets.REVALIDATE
+        assert get(assets, hashed).body == get(assets, name).body
+    assert get(assets, "missing.js").status == 404
+
+
+def test_accept_encoding(assets):
+    """Сжатый вариант отдается только клиентам, которые его принимают"""
+    plain = get(assets, "game.js")
+    assert plain.body == SCRIPT.encode("utf-8")
+    assert "Content-Encoding" not in plain.headers
+    assert plain.headers["Vary"] == "Accept-Encoding"
+
+    compressed = get(assets, "game.js", accept_encoding="deflate, gzip")
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(compressed.body) == plain.body
+    assert compressed.headers["ETag"] != plain.headers["ETag"]
+
+    refused = get(assets, "game.js", accept_encoding="gzip;q=0, identity")
+    assert "Content-Encoding" not in refused.headers
+
+
+@pytest.mark.parametrize("accept_encoding", [
+    "gzip;q=0", "gzip;q=0.0", "gzip; q=0.000", "gzip;Q=0, identity", "gzip;q=abc", "gzip;q=2",
+    "*;q=0", "identity",
+])
+def test_refused_encoding(assets, accept_encoding):
+    """Вес 0 в любой записи, а также неразбираемый вес - отказ от кодировки"""
+    assert "Content-Encoding" not in get(assets, "game.js", accept_encoding=accept_encoding).headers
+
+
+@pytest.mark.parametrize("accept_encoding", ["gzip;q=0.001", "gzip;q=1.0", "br;q=0, *", "br;q=0, *;q=0.5"])
+def test_accepted_encoding(assets, accept_encoding):
+    """Любой положительный вес, в том числе через *, разрешает кодировку"""
+    assert get(assets, "game.js", accept_encoding=accept_encoding).headers["Content-Encoding"] == "gzip"
+
+
+def test_parse_accept_encoding():
+    """Веса разбираются числом; кодировка без q получает вес 1"""
+    assert parse_accept_encoding("gzip;q=0.8, br, deflate;q=0.000, ") == {"gzip": 0.8, "br": 1.0, "deflate": 0.0}
+
+
+def test_not_modified(assets):
+    """Совпадающий ETag варианта дает 304 без тела"""
+    etag = get(assets, "game.js", accept_encoding="gzip").headers["ETag"]
+
+    cached = get(assets, "game.js", accept_encoding="gzip", if_none_match=f'"other", {etag}')
+    assert (cached.status, cached.body) == (304, b"")
+    assert cached.headers["ETag"] == etag
+    assert get(assets, "game.js", accept_encoding="gzip", if_none_match=f"W/{etag}").status == 304
+    # ETag сжатого варианта не подходит к несжатому
+    assert get(assets, "game.js", if_none_match=etag).status == 200
+
+BOT_TOKEN = "123456:TEST-TOKEN"
+USER = {"id": 42, "first_name": "Аня", "username": "anya"}
+
+
+def sign(fields: dict, bot_token: str = BOT_TOKEN) -> str:
+    """initData, подписанные так же, как это делает Telegram"""
+    data_check_string = "\n".join(f"{key}={value}" for key, value in sorted(fields.items()))
+    secret_key = hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+    fields = dict(fields, hash=hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest())
+    return urlencode(fields)
+
+
+def fields(auth_date: int = None) -> dict:
+    return {
+        "query_id": "AAHdF6IQAAAAAN0XohDhrOrc",
+        "user": json.dumps(USER, ensure_ascii=False, separators=(",", ":")),
+        "auth_date": str(auth_date or int(time.time())),
+    }
+
+
+def test_valid_init_data():
+    """Правильно подписанные initData возвращают пользователя"""
+    assert verify_init_data(sign(fields()), BOT_TOKEN) == USER
+
+
+def test_tampered_init_data():
+    """Измененное поле, чужой токен или отсутствие подписи не проходят проверку"""
+    init_data = sign(fields())
+    assert verify_init_data(init_data.replace("%3A42", "%3A43"), BOT_TOKEN) is None
+    assert verify_init_data(sign(fields(), "654321:OTHER"), BOT_TOKEN) is None
+    assert verify_init_data(urlencode(fields()), BOT_TOKEN) is None
+    assert verify_init_data("", BOT_TOKEN) is None
+
+
+def test_expired_init_data():
+    """initData старше max_age не принимаются"""
+    old = sign(fields(int(time.time()) - INIT_DATA_MAX_AGE - 60))
+    assert verify_init_data(old, BOT_TOKEN) is None
+    assert verify_init_data(old, BOT_TOKEN, max_age=2 * INIT_DATA_MAX_AGE) == USER
+
+
+def test_signed_init_data_without_user():
+    """Подписанные initData без пользователя не принимаются"""
+    data = fields()
+    del data["user"]
+    assert verify_init_data(sign(data), BOT_TOKEN) is None
+
+
+async def exchange(server: WebServer, *chunks: bytes) -> bytes:
+    """Отправляет серверу куски запроса и читает ответ до закрытия соединения"""
+    await server.start()
+    port = server._server.sockets[0].getsockname()[1]
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        for chunk in chunks:
+            writer.write(chunk)
+            await writer.drain()
+        return await asyncio.wait_for(reader.read(), 5)
+    finally:
+        writer.close()
+        await server.stop()
+
+
+def slow_server() -> WebServer:
+    server = WebServer(port=0, host="127.0.0.1")
+    server.REQUEST_TIMEOUT = 0.2
+
+    async def ok(request):
+        return Response.json({"ok": True, "body": request.body.decode()})
+
+    server.add_route("POST", "/api", ok)
+    return server
+
+
+def test_request_served():
+    """Запрос, пришедший целиком, обрабатывается"""
+    request = b"POST /api HTTP/1.1\r\nContent-Length: 2\r\nConnection: close\r\n\r\nhi"
+    response = asyncio.run(exchange(slow_server(), request))
+    assert response.startswith(b"HTTP/1.1 200 ")
+    assert b'"body": "hi"' in response
+
+
+@pytest.mark.parametrize("request_start", [
+    # Заголовки не закончены
+    b"POST /api HTTP/1.1\r\nContent-Length: 2\r\n",
+    # Тело не пришло
+    b"POST /api HTTP/1.1\r\nContent-Length: 2\r\n\r\n",
+])
+def test_slow_request_gets_408(request_start):
+    """Клиент, который не прислал заголовки и тело за REQUEST_TIMEOUT, получает 408"""
+    response = asyncio.run(exchange(slow_server(), request_start))
+    assert response.startswith(b"HTTP/1.1 408 ")
@@ -1,62 +1,505 @@
 #!/usr/bin/env python3
 """
-Простой веб-сервер для игры "Собака на Скейте"
+Веб-сервер бота: игра "Собака на Скейте", webhook Telegram и API
+
+Один asyncio-сервер на порту PORT работает в event loop бота, без
+отдельного потока. Маршруты добавляются через add_route().
 """
 
-import os
-import threading
-from http.server import HTTPServer, SimpleHTTPRequestHandler
-from urllib.parse import urlparse
+import asyncio
+import gzip
+import hashlib
+import hmac
+import json
 import logging
+import mimetypes
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+from game_scores import GameScores, InvalidScore
+
+try:
+    import brotli
+except ImportError:  # brotli есть в requirements.txt, но без него отдаются gzip и несжатые файлы
+    brotli = None
 
 logger = logging.getLogger(__name__)
 
-class GameHandler(SimpleHTTPRequestHandler):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, directory=os.path.dirname(os.path.abspath(__file__)), **kwargs)
-    
-    def do_GET(self):
-        # Обрабатываем запросы к игре
-        if self.path == '/game' or self.path == '/game/':
-            self.path = '/index.html'
-        elif self.path.startswith('/game/'):
-            # Убираем /game/ из пути
-            self.path = self.path[5:]
-        
-        return super().do_GET()
-    
-    def end_headers(self):
-        # Добавляем CORS заголовки для Telegram Web App
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-        super().end_headers()
-
-def start_web_server(port=8080):
-    """Запускает веб-сервер в отдельном потоке"""
-    server_address = ('', port)
-    httpd = HTTPServer(server_address, GameHandler)
-    
-    def run_server():
-        logger.info(f"🌐 Веб-сервер запущен на http://localhost:{port}")
-        logger.info(f"🎮 Игра доступна по адресу: http://localhost:{port}/game")
+# Файлы игры, которые отдает сервер (остальные файлы каталога закрыты)
+GAME_DIR = os.path.dirname(os.path.abspath(__file__))
+GAME_FILES = ("index.html", "game.js", "style.css", "telegram-integration.js")
+
+_REASONS = {
+    200: "OK", 204: "No Content", 304: "Not Modified", 400: "Bad Request",
+    401: "Unauthorized", 403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed",
+    408: "Request Timeout", 411: "Length Required", 413: "Payload Too Large", 422: "Unprocessable Entity",
+    429: "Too Many Requests",
+    500: "Internal Server Error", 503: "Service Unavailable"
+}
+
+CORS_HEADERS = {
+    # CORS заголовки для Telegram Web App
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+    "Access-Control-Allow-Headers": "Content-Type, Authorization"
+}
+
+
+class Request:
+    """Разобранный HTTP-запрос"""
+
+    __slots__ = ("method", "path", "query", "headers", "body", "remote")
+
+    def __init__(self, method: str, path: str, query: Dict[str, str],
+                 headers: Dict[str, str], body: bytes, remote):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers
+        self.body = body
+        self.remote = remote
+
+    def json(self):
+        """Тело запроса как JSON"""
+        return json.loads(self.body.decode("utf-8"))
+
+
+class Response:
+    """HTTP-ответ"""
+
+    __slots__ = ("status", "body", "headers")
+
+    def __init__(self, status: int = 200, body: bytes = b"",
+                 content_type: Optional[str] = None, headers: Optional[Dict[str, str]] = None):
+        self.status = status
+        self.body = body
+        self.headers = dict(headers or {})
+        if content_type:
+            self.headers["Content-Type"] = content_type
+
+    @classmethod
+    def json(cls, data, status: int = 200) -> "Response":
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        return cls(status, body, "application/json; charset=utf-8")
+
+    @classmethod
+    def error(cls, status: int, message: Optional[str] = None) -> "Response":
+        return cls.json({"ok": False, "error": message or _REASONS.get(status, "Error")}, status)
+
+
+Handler = Callable[[Request], Awaitable[Response]]
+
+
+class RequestTimeout(Exception):
+    """Клиент начал запрос, но не прислал заголовки и тело вовремя"""
+
+
+class WebServer:
+    """
+    Небольшой HTTP/1.1-сервер на asyncio.start_server.
+
+    Каждое соединение обслуживается своей корутиной, поэтому медленный
+    клиент не задерживает остальных. Поддерживаются keep-alive, HEAD
+    и ограничения на размер заголовков и тела. Между запросами соединение
+    ждет KEEPALIVE_TIMEOUT, а заголовки и тело начатого запроса должны
+    прийти за REQUEST_TIMEOUT, иначе клиент получает 408.
+    """
+
+    MAX_BODY = 1 << 20
+    MAX_HEADERS = 100
+    KEEPALIVE_TIMEOUT = 30.0
+    REQUEST_TIMEOUT = 10.0
+
+    def __init__(self, port: int = 8080, host: str = ""):
+        self.port = port
+        self.host = host
+        self._routes: Dict[Tuple[str, str], Handler] = {}
+        self._prefix_routes = []
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    def add_route(self, method: str, path: str, handler: Handler):
+        """Маршрут для точного пути"""
+        self._routes[(method, path)] = handler
+
+    def add_prefix_route(self, method: str, prefix: str, handler: Handler):
+        """Маршрут для всех путей, начинающихся с prefix"""
+        self._prefix_routes.append((method, prefix, handler))
+
+    async def start(self):
+        """Начинает принимать соединения в текущем event loop"""
+        if self._server is None:
+            self._server = await asyncio.start_server(self._serve, self.host or None, self.port)
+            logger.info(f"🌐 Веб-сервер запущен на http://localhost:{self.port}")
+            logger.info(f"🎮 Игра доступна по адресу: http://localhost:{self.port}/game")
+
+    async def stop(self):
+        """Перестает принимать соединения"""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def _find_handler(self, method: str, path: str) -> Optional[Handler]:
+        handler = self._routes.get((method, path))
+        if handler is not None:
+            return handler
+        for route_method, prefix, handler in self._prefix_routes:
+            if route_method == method and path.startswith(prefix):
+                return handler
+        return None
+
+    async def _dispatch(self, request: Request) -> Response:
+        if request.method == "OPTIONS":
+            return Response(204)
+
+        method = "GET" if request.method == "HEAD" else request.method
+        handler = self._find_handler(method, request.path)
+        if handler is None:
+            allowed = any(self._find_handler(m, request.path) for m in ("GET", "POST"))
+            return Response.error(405 if allowed else 404)
+
+        try:
+            return await handler(request)
+        except Exception as e:
+            logger.error(f"Ошибка обработки {request.method} {request.path}: {e}")
+            return Response.error(500)
+
+    async def _read_request(self, reader: asyncio.StreamReader, remote) -> Optional[Request]:
+        """Читает запрос; None - клиент закрыл соединение"""
+        request_line = await asyncio.wait_for(reader.readline(), self.KEEPALIVE_TIMEOUT)
+        if not request_line.strip():
+            return None
+
+        method, target, version = request_line.decode("latin-1").split()
+        try:
+            # Один срок на все заголовки и тело: медленный клиент не держит соединение
+            headers, body = await asyncio.wait_for(self._read_headers_and_body(reader),
+                                                   self.REQUEST_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise RequestTimeout() from None
+        headers[":version"] = version
+
+        url = urlsplit(target)
+        return Request(method.upper(), url.path, dict(parse_qsl(url.query)), headers, body, remote)
+
+    async def _read_headers_and_body(self, reader: asyncio.StreamReader) -> Tuple[Dict[str, str], bytes]:
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            if len(headers) >= self.MAX_HEADERS:
+                raise ValueError("слишком много заголовков")
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        body = b""
+        if "transfer-encoding" in headers:
+            raise ValueError("chunked не поддерживается")
+        length = int(headers.get("content-length", 0))
+        if length > self.MAX_BODY:
+            raise OverflowError(length)
+        if length:
+            body = await reader.readexactly(length)
+        return headers, body
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        remote = writer.get_extra_info("peername")
         try:
-            httpd.serve_forever()
-        except KeyboardInterrupt:
-            logger.info("Веб-сервер остановлен")
-            httpd.shutdown()
-    
-    # Запускаем сервер в отдельном потоке
-    server_thread = threading.Thread(target=run_server, daemon=True)
-    server_thread.start()
-    
-    return httpd
+            while True:
+                try:
+                    request = await self._read_request(reader, remote)
+                except OverflowError:
+                    await self._write(writer, "HEAD", Response.error(413), keep_alive=False)
+                    return
+                except RequestTimeout:
+                    await self._write(writer, "HEAD", Response.error(408), keep_alive=False)
+                    return
+                except (ValueError, UnicodeDecodeError):
+                    await self._write(writer, "HEAD", Response.error(400), keep_alive=False)
+                    return
+                if request is None:
+                    return
+
+                response = await self._dispatch(request)
+                keep_alive = (request.headers[":version"] == "HTTP/1.1"
+                              and request.headers.get("connection", "").lower() != "close")
+                await self._write(writer, request.method, response, keep_alive)
+                if not keep_alive:
+                    return
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _write(self, writer: asyncio.StreamWriter, method: str,
+                     response: Response, keep_alive: bool):
+        headers = {**CORS_HEADERS, **response.headers}
+        if response.status not in (204, 304):
+            headers["Content-Length"] = str(len(response.body))
+        headers["Connection"] = "keep-alive" if keep_alive else "close"
+
+        head = f"HTTP/1.1 {response.status} {_REASONS.get(response.status, 'OK')}\r\n"
+        head += "".join(f"{name}: {value}\r\n" for name, value in headers.items())
+        writer.write(head.encode("latin-1") + b"\r\n")
+        if method != "HEAD" and response.status not in (204, 304):
+            writer.write(response.body)
+        await writer.drain()
+
+
+def parse_accept_encoding(accept_encoding: str) -> Dict[str, float]:
+    """
+    Кодировки из Accept-Encoding и их веса q. Вес 0 (q=0, q=0.0, q=0.000)
+    означает отказ; неразбираемый или вне диапазона 0..1 вес тоже считается отказом
+    """
+    weights = {}
+    for token in accept_encoding.lower().split(","):
+        coding, *params = token.split(";")
+        coding = coding.strip()
+        if not coding:
+            continue
+        weight = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+                if not 0.0 <= weight <= 1.0:
+                    weight = 0.0
+        weights[coding] = weight
+    return weights
+
+
+class StaticAsset:
+    """Файл игры в памяти: тело, сжатые варианты и ETag каждого варианта"""
+
+    __slots__ = ("content_type", "digest", "variants")
+
+    def __init__(self, name: str, body: bytes):
+        content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        if content_type.startswith("text/") or content_type.endswith("javascript"):
+            content_type += "; charset=utf-8"
+        self.content_type = content_type
+        self.digest = hashlib.sha256(body).hexdigest()[:12]
+
+        # Кодировка -> (тело, ETag); сжатый вариант хранится, только если он меньше
+        self.variants = {"identity": (body, f'"{self.digest}"')}
+        compressed = {"gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            compressed["br"] = brotli.compress(body, quality=11)
+        for encoding, data in compressed.items():
+            if len(data) < len(body):
+                self.variants[encoding] = (data, f'"{self.digest}-{encoding}"')
+
+    def choose(self, accept_encoding: str) -> str:
+        """Сжатый вариант с наибольшим весом у клиента (при равенстве br) или identity"""
+        weights = parse_accept_encoding(accept_encoding)
+        best, best_weight = "identity", 0.0
+        for encoding in ("br", "gzip"):
+            weight = weights.get(encoding, weights.get("*", 0.0))
+            if encoding in self.variants and weight > best_weight:
+                best, best_weight = encoding, weight
+        return best
+
+
+class StaticAssets:
+    """
+    Файлы игры, загруженные в память при запуске.
+
+    Для каждого файла заранее готовятся gzip- и brotli-варианты (brotli -
+    если установлен модуль brotli из requirements.txt). Ассеты доступны по адресу с хешем
+    содержимого (style.<хеш>.css), который index.html получает вместо
+    исходного имени: такие ответы кешируются браузером на год, а после
+    изменения файла меняется и адрес. index.html и адреса без хеша
+    кешируются с обязательной проверкой по ETag (ответ 304).
+    """
+
+    ENTRY = "index.html"
+    IMMUTABLE = "public, max-age=31536000, immutable"
+    REVALIDATE = "no-cache"
+
+    def __init__(self, directory: str = GAME_DIR, names=GAME_FILES):
+        sources = {}
+        for name in names:
+            with open(os.path.join(directory, name), "rb") as f:
+                sources[name] = f.read()
+
+        # Адреса с хешем содержимого для всего, кроме index.html
+        self.hashed: Dict[str, str] = {}
+        for name, body in sources.items():
+            if name != self.ENTRY:
+                root, ext = os.path.splitext(name)
+                digest = hashlib.sha256(body).hexdigest()[:12]
+                self.hashed[name] = f"{root}.{digest}{ext}"
+
+        if self.ENTRY in sources:
+            sources[self.ENTRY] = self._rewrite_entry(sources[self.ENTRY].decode("utf-8"))
+
+        # Путь -> (ассет, Cache-Control)
+        self._files: Dict[str, Tuple[StaticAsset, str]] = {}
+        for name, body in sources.items():
+            asset = StaticAsset(name, body)
+            self._files[name] = (asset, self.REVALIDATE)
+            if name in self.hashed:
+                self._files[self.hashed[name]] = (asset, self.IMMUTABLE)
+
+    def _rewrite_entry(self, html: str) -> bytes:
+        for name, hashed in self.hashed.items():
+            for attr in ("src", "href"):
+                html = html.replace(f'{attr}="{name}"', f'{attr}="{hashed}"')
+        return html.encode("utf-8")
+
+    def names(self):
+        """Все пути, по которым доступны файлы"""
+        return list(self._files)
+
+    def response(self, name: str, request: Request) -> Response:
+        entry = self._files.get(name)
+        if entry is None:
+            return Response.error(404)
+        asset, cache_control = entry
+
+        encoding = asset.choose(request.headers.get("accept-encoding", ""))
+        body, etag = asset.variants[encoding]
+        headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+
+        if_none_match = request.headers.get("if-none-match", "")
+        if if_none_match == "*" or etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")):
+            return Response(304, headers=headers)
+        return Response(200, body, asset.content_type, headers)
+
+
+def add_game_routes(server: WebServer, assets: Optional[StaticAssets] = None):
+    """Маршруты игры: /game -> index.html, /game/<файл> и /<файл> для ассетов"""
+    assets = assets or StaticAssets()
+
+    async def serve_file(request: Request) -> Response:
+        path = request.path
+        if path in ("/game", "/game/"):
+            name = StaticAssets.ENTRY
+        else:
+            name = path[len("/game/"):] if path.startswith("/game/") else path.lstrip("/")
+        return assets.response(name, request)
+
+    server.add_route("GET", "/game", serve_file)
+    server.add_prefix_route("GET", "/game/", serve_file)
+    for name in assets.names():
+        server.add_route("GET", f"/{name}", serve_file)
+
+
+# initData старше суток не принимается
+INIT_DATA_MAX_AGE = 24 * 60 * 60
+
+
+def verify_init_data(init_data: str, bot_token: str,
+                     max_age: int = INIT_DATA_MAX_AGE) -> Optional[Dict]:
+    """
+    Проверяет подпись Telegram.WebApp.initData и возвращает пользователя
+    или None. Ключ - HMAC-SHA256 токена бота с ключом "WebAppData", подпись -
+    HMAC-SHA256 отсортированных пар key=value (кроме hash), по одной на строку.
+    """
+    fields = dict(parse_qsl(init_data, keep_blank_values=True))
+    received_hash = fields.pop("hash", "")
+    data_check_string = "\n".join(f"{key}={value}" for key, value in sorted(fields.items()))
+
+    secret_key = hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+    expected_hash = hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(expected_hash, received_hash):
+        return None
+
+    try:
+        if time.time() - int(fields.get("auth_date", 0)) > max_age:
+            return None
+        user = json.loads(fields["user"])
+        int(user["id"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    return user
+
+
+def add_score_routes(server: WebServer, game_scores: GameScores, bot_token: str):
+    """
+    API результатов игры для Mini App:
+
+    POST /api/score        - отправить результат {game, score, game_duration}
+    GET  /api/leaderboard  - топ (?limit=N, до 100) и место игрока
+
+    Игрок определяется по initData в заголовке "Authorization: tma <initData>".
+    Все данные берутся из памяти GameScores, поэтому обработчики не ждут диска.
+    """
+    # Тело ответа с топом кешируется до следующего рекорда
+    top_cache: Dict[int, Tuple[int, list]] = {}
+
+    def authenticate(request: Request) -> Optional[Dict]:
+        scheme, _, init_data = request.headers.get("authorization", "").partition(" ")
+        if scheme.lower() != "tma" or not init_data:
+            return None
+        return verify_init_data(init_data.strip(), bot_token)
+
+    async def submit_score(request: Request) -> Response:
+        user = authenticate(request)
+        if user is None:
+            return Response.error(401)
+        try:
+            payload = request.json()
+            if not isinstance(payload, dict):
+                raise ValueError(payload)
+        except ValueError:
+            return Response.error(400)
+
+        try:
+            result = game_scores.submit(int(user["id"]), user.get("first_name", ""),
+                                        user.get("username") or "Не указан", payload)
+        except InvalidScore as e:
+            logger.warning(f"Результат игры от {user['id']} отклонен: {e}")
+            return Response.error(422, str(e))
+        return Response.json({"ok": True, **result})
+
+    async def leaderboard(request: Request) -> Response:
+        try:
+            limit = min(max(int(request.query.get("limit", 10)), 1), 100)
+        except ValueError:
+            return Response.error(400)
+
+        cached = top_cache.get(limit)
+        if cached is None or cached[0] != game_scores.version:
+            top = [{"user_name": entry["user_name"], "score": entry["score"]}
+                   for entry in game_scores.top(limit)]
+            cached = top_cache[limit] = (game_scores.version, top)
+
+        data = {"ok": True, "top": cached[1], "players": len(game_scores.leaderboard)}
+        user = authenticate(request)
+        if user is not None:
+            data["me"] = {"rank": game_scores.rank(int(user["id"])), "best": game_scores.best(int(user["id"]))}
+        return Response.json(data)
+
+    server.add_route("POST", "/api/score", submit_score)
+    server.add_route("GET", "/api/leaderboard", leaderboard)
+
+
+def create_web_server(port: int = 8080) -> WebServer:
+    """Создает сервер с маршрутами игры"""
+    server = WebServer(port)
+    add_game_routes(server)
+    return server
+
 
 if __name__ == "__main__":
     # Тестовый запуск сервера
-    start_web_server()
-    
+    logging.basicConfig(level=logging.INFO)
+
+    async def serve():
+        server = create_web_server(int(os.getenv('PORT', 8080)))
+        await server.start()
+        await asyncio.Event().wait()
+
     try:
-        input("Нажмите Enter для остановки сервера...\n")
+        asyncio.run(serve())
     except KeyboardInterrupt:
         pass